@@ -0,0 +1,439 @@
+"""
+Benchmarks for the save and restore stages on synthetic process tables.
+
+Runs headless on any OS: the process table is generated, the data directory is a
+temporary one and restore uses a fake launcher instead of `subprocess.Popen`.
+
+For every table size and stage it reports the best wall time, the peak traced memory
+and the number of memory blocks the stage retained, i.e. still allocated when it
+returns, not the number of allocations it made. `watch_poll_synthetic` polls the
+generated table through in-memory `list_pids` and `fetch`, so it measures the
+watcher's own work; `watch_poll` under the `live` size polls the real process table
+of this machine through psutil, which is what the agent costs. Both are also reported
+as a share of one core at the shortest poll interval, and `agent_list` is the
+localhost round trip of a command served by the agent. Results can be written as
+JSON and compared with the JSON of another commit.
+
+Usage:-
+    python doc/test/bench.py
+    python doc/test/bench.py --sizes 200,2000 --json before.json
+    python doc/test/bench.py --compare before.json --threshold 1.25
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import typing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.agent import AgentClient, AgentServer  # noqa: E402
+from res.ignored_process_list import IGNORE_LIST  # noqa: E402
+from res.path_resolver import PathResolver  # noqa: E402
+from res.process_snapshot import ProcessSnapshot  # noqa: E402
+from res.process_tree import ProcessTree  # noqa: E402
+from res.restore_engine import LaunchEntry  # noqa: E402
+from res.session_format import PersistApplicationType  # noqa: E402
+from res.watcher import ProcessWatcher  # noqa: E402
+from weorcanjan import Weorcanjan  # noqa: E402
+
+DEFAULT_SIZES = (200, 2000, 20000, 100000)
+SEED = 20231018
+
+# share of a table that are system processes from IGNORE_LIST and browser helpers,
+# the rest are distinct applications
+SYSTEM_SHARE = 0.6
+HELPER_SHARE = 0.2
+
+# processes that exit and start between two watch polls
+WATCH_CHURN = 5
+
+# real files the restore entries of path_resolve point at
+RESOLVE_FILES = 50
+
+
+def synthetic_table(
+    size: int,
+    seed: int = SEED
+) -> typing.List[dict]:
+    """
+    Builds a process table shaped like a busy Windows workstation.
+    """
+    rng = random.Random(seed)
+    rows = []
+    browser = None
+    for pid in range(size):
+        roll = rng.random()
+        ppid = 0
+        if roll < SYSTEM_SHARE:
+            name = rng.choice(IGNORE_LIST)
+            exe = f"C:\\Windows\\System32\\{name}"
+            cmdline = [exe]
+        elif roll < SYSTEM_SHARE + HELPER_SHARE:
+            name = "chrome.exe"
+            exe = "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe"
+            cmdline = [
+                exe,
+                "--type=renderer",
+                f"--renderer-client-id={pid}",
+                f"--field-trial-handle={rng.getrandbits(32)}"
+            ]
+            # the first one is the browser the others are children of
+            if browser is None:
+                browser = pid
+                cmdline = [exe]
+            else:
+                ppid = browser
+        else:
+            app = rng.randrange(max(1, size // 4))
+            name = f"app{app}.exe"
+            exe = f"C:\\Program Files\\App{app}\\{name}"
+            cmdline = [exe, f"--profile={rng.randrange(4)}"]
+        rows.append({
+            "pid": pid,
+            "ppid": ppid,
+            "name": name,
+            "exe": exe,
+            "cmdline": cmdline
+        })
+    return rows
+
+
+def user_ignore_rules(
+    size: int
+) -> typing.List[str]:
+    """
+    A user ignore file with a mix of names, directories and globs.
+    """
+    rules = []
+    for index in range(max(10, size // 100)):
+        kind = index % 3
+        if kind == 0:
+            rules.append(f"app{index}.exe")
+        elif kind == 1:
+            rules.append(f"C:\\Program Files\\App{index}\\")
+        else:
+            rules.append(f"*helper{index}*.exe")
+    return rules
+
+
+def fake_launcher(
+    cmdline: typing.Any,
+    **kwargs: typing.Any
+) -> object:
+    return object()
+
+
+def measure(
+    stage: typing.Callable[[], typing.Any],
+    repeat: int
+) -> dict:
+    """
+    Runs a stage `repeat` times for the best time, then once more under tracemalloc.
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        stage()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    gc.disable()
+    try:
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks_after = sys.getallocatedblocks()
+    finally:
+        gc.enable()
+
+    return {
+        "seconds": best,
+        "peak_bytes": peak,
+        "retained_blocks": blocks_after - blocks_before
+    }
+
+
+def start_agent(
+    watcher: ProcessWatcher
+) -> AgentServer:
+    """
+    Serves requests like `Weorcanjan.agent_session` from a thread, without polling.
+    """
+    server = AgentServer(Weorcanjan.get_data_path(AgentServer.FILENAME), time.time())
+    server.publish()
+    Weorcanjan.AGENT = server
+    Weorcanjan.AGENT_WATCHER = watcher
+    parser = Weorcanjan.build_parser()
+
+    def serve() -> None:
+        while True:
+            try:
+                request = server.accept(None)
+            except OSError:
+                # closed
+                return
+            if request is not None:
+                conn, argv, context = request
+                with AgentServer.caller_context(context["cwd"], context["env"]):
+                    reply = Weorcanjan.serve_agent_request(parser, argv)
+                server.reply(conn, *reply)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+def run_size(
+    size: int,
+    repeat: int
+) -> typing.Dict[str, dict]:
+    rows = synthetic_table(size)
+    snapshot = ProcessSnapshot(rows)
+
+    ignore_path = Weorcanjan.get_data_path(
+        Weorcanjan.SESSION_DIR_SEGMENT,
+        Weorcanjan.MYIGNORE_FILENAME
+    )
+    with open(ignore_path, "w") as f:
+        f.write("\n".join(user_ignore_rules(size)))
+
+    session_name = f"bench-{size}"
+    Weorcanjan.get_store().save(session_name, [
+        PersistApplicationType(
+            name=PersistApplicationType.name_from_cmdline(row["cmdline"]),
+            path=row["exe"],
+            args=row["cmdline"][1:]
+        )
+        for row in rows
+    ])
+
+    def save_filter() -> None:
+        Weorcanjan.SNAPSHOT = snapshot
+        Weorcanjan.get_open_applications()
+
+    def merge_user_ignore() -> None:
+        Weorcanjan.IGNORE_MATCHER = None
+        Weorcanjan.merge_user_ignore()
+
+    def tree_build() -> None:
+        ProcessTree.build(rows)
+
+    recording_path = Weorcanjan.get_data_path(
+        f"bench-{size}{ProcessSnapshot.RECORD_EXTENSION}"
+    )
+    ProcessSnapshot.write(recording_path, (
+        [row.get(field) for field in ProcessSnapshot.RECORD_FIELDS] for row in rows
+    ))
+
+    def replay() -> None:
+        ProcessSnapshot.replay(recording_path).tree.roots()
+
+    def ignore_match() -> None:
+        Weorcanjan.get_ignore_matcher().classify(rows)
+
+    def restore_dispatch() -> None:
+        # nothing of the session is running, so every entry is launched
+        Weorcanjan.SNAPSHOT = ProcessSnapshot([])
+        Weorcanjan.restore_session(
+            session_name,
+            launcher=fake_launcher,
+            resolve_paths=False
+        )
+
+    bin_dir = Weorcanjan.get_data_path("bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    executables = []
+    for index in range(RESOLVE_FILES):
+        executable = os.path.join(bin_dir, f"app{index}.exe")
+        with open(executable, "w"):
+            pass
+        os.chmod(executable, 0o755)
+        executables.append(executable)
+    cache_path = Weorcanjan.get_data_path(PathResolver.FILENAME)
+
+    def path_resolve() -> None:
+        # warm after the first run, every entry is one stat
+        resolver = PathResolver(cache_path)
+        resolver.resolve([
+            LaunchEntry([executables[index % RESOLVE_FILES], f"--{index}"])
+            for index in range(size)
+        ])
+        resolver.save()
+
+    live = {row["pid"]: row for row in rows}
+    watcher = ProcessWatcher(
+        Weorcanjan.application_of,
+        list_pids=live.keys,
+        fetch=live.get
+    )
+    watcher.seed(rows)
+    next_pid = size
+
+    def watch_poll_synthetic() -> None:
+        nonlocal next_pid
+        for _ in range(WATCH_CHURN):
+            row = live.pop(next(iter(live)))
+            live[next_pid] = {**row, "pid": next_pid}
+            next_pid += 1
+        watcher.poll()
+
+    server = start_agent(watcher)
+
+    def agent_list() -> None:
+        response = AgentClient.request(server.info_path, ["list"])
+        assert response is not None and response["exit"] == 0, response
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["save_filter"] = measure(save_filter, repeat)
+        results["merge_user_ignore"] = measure(merge_user_ignore, repeat)
+        results["tree_build"] = measure(tree_build, repeat)
+        results["replay"] = measure(replay, repeat)
+        results["ignore_match"] = measure(ignore_match, repeat)
+        results["restore_dispatch"] = measure(restore_dispatch, repeat)
+        path_resolve()
+        results["path_resolve"] = measure(path_resolve, repeat)
+        results["watch_poll_synthetic"] = measure(watch_poll_synthetic, repeat)
+        # the full round trip of a command the agent serves
+        results["agent_list"] = measure(agent_list, repeat)
+
+    server.close()
+    Weorcanjan.AGENT = None
+    Weorcanjan.AGENT_WATCHER = None
+    return results
+
+
+def run_live(
+    repeat: int
+) -> typing.Dict[str, dict]:
+    """
+    Polls the process table of this machine through psutil, like the agent does.
+    """
+    Weorcanjan.IGNORE_MATCHER = None
+    watcher = ProcessWatcher(Weorcanjan.application_of)
+    # the first poll fetches every pid, the next ones only the new pids
+    watcher.poll()
+    return {"watch_poll": measure(watcher.poll, repeat)}
+
+
+def print_stages(
+    size: str,
+    stages: typing.Dict[str, dict]
+) -> None:
+    for stage, measured in stages.items():
+        print(
+            f"{size:>8} {stage:<20} {measured['seconds'] * 1000:>10.2f} "
+            f"{measured['peak_bytes'] / 1024:>10.1f} "
+            f"{measured['retained_blocks']:>9}"
+        )
+    for stage in ("watch_poll", "watch_poll_synthetic"):
+        if stage in stages:
+            print(
+                f"{size:>8} {stage} every {ProcessWatcher.MIN_INTERVAL:g} s is "
+                f"{stages[stage]['seconds'] / ProcessWatcher.MIN_INTERVAL:.4%} "
+                "of one core"
+            )
+
+
+def git_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    threshold: float
+) -> int:
+    """
+    Prints the stages slower than `threshold` times the baseline.
+
+    Returns:
+        int: The number of regressions.
+    """
+    regressions = 0
+    for size, stages in results["sizes"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("sizes", {}).get(size, {}).get(stage)
+            if not previous or not previous["seconds"]:
+                continue
+            ratio = current["seconds"] / previous["seconds"]
+            if ratio > threshold:
+                regressions += 1
+                print(
+                    f"REGRESSION {size} {stage}: {ratio:.2f}x slower "
+                    f"({previous['seconds'] * 1000:.2f} ms -> "
+                    f"{current['seconds'] * 1000:.2f} ms)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Weorcanjan stage benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma separated process table sizes."
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="Write the results here.")
+    parser.add_argument("--compare", help="JSON results of a previous run.")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["APPDATA"] = data_dir
+        Weorcanjan.ARGS = Weorcanjan.build_parser().parse_args(["save"])
+        Weorcanjan.ensure_data_dir()
+
+        results = {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "sizes": {}
+        }
+        print(f"{'size':>8} {'stage':<20} {'ms':>10} {'peak KiB':>10} {'retained':>9}")
+        for size in (int(size) for size in args.sizes.split(",")):
+            stages = run_size(size, args.repeat)
+            results["sizes"][str(size)] = stages
+            print_stages(str(size), stages)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stages = run_live(args.repeat)
+        results["sizes"]["live"] = stages
+        print_stages("live", stages)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
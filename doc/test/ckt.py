@@ -1,4 +1,39 @@
-import customtkinter as ctk
+"""
+CustomTkinter prototype of the save dialog.
+
+The window opens before the process table is walked. A `ProcessLoader` thread walks
+it and hands rows to the UI in batches through a queue, which the UI drains between
+events. The running programs list only has widgets for the rows that fit in it and
+rebinds them to other rows as it scrolls, so it stays responsive with thousands of
+processes, and the filter only searches the rows the previous filter kept while it is
+being typed.
+
+Usage:-
+    python doc/test/ckt.py
+    python doc/test/ckt.py --replay snapshot.json.gz
+    python doc/test/ckt.py --synthetic 5000
+"""
+import time
+
+# the window open time is measured from here
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import bisect  # noqa: E402
+import os  # noqa: E402
+import queue  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import tkinter  # noqa: E402
+import typing  # noqa: E402
+
+import customtkinter as ctk  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.process_snapshot import ProcessRow, ProcessSnapshot  # noqa: E402
+from weorcanjan import Weorcanjan  # noqa: E402
 
 # Modes: system (default), light, dark
 ctk.set_appearance_mode("System")
@@ -6,45 +41,381 @@ ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
 
-# app = ctk.CTk()  # create CTk window like you do with the Tk window
-# app.geometry("800x600")
+class ProgramRow:
+    """
+    One running program, as shown in the list.
+    """
 
-class RunningProgramsFrame(ctk.CTkScrollableFrame):
+    __slots__ = ("pid", "name", "cmdline", "label", "search", "sort_key")
+
+    def __init__(
+        self,
+        process: dict
+    ) -> None:
+        self.pid = process["pid"]
+        self.name = process["name"] or os.path.basename(process["cmdline"][0])
+        self.cmdline = process["cmdline"]
+        self.label = f"{self.name}  ({self.pid})"
+        # what the filter searches, the name and the executable
+        self.search = f"{self.name}\n{process['exe'] or self.cmdline[0]}".casefold()
+        self.sort_key = (self.name.casefold(), self.pid)
+
+    def __lt__(
+        self,
+        other: "ProgramRow"
+    ) -> bool:
+        return self.sort_key < other.sort_key
+
+
+class ProgramList:
+    """
+    The rows of the running programs list, the ones the filter keeps and the
+    selection, independent of the widgets showing them.
+    """
+
+    def __init__(self) -> None:
+        # every row and the ones the filter keeps, both sorted
+        self.rows = []
+        self.visible = []
+        self.text = ""
+        # pid -> indexes of the arguments kept, for the checked programs
+        self.checked = {}
+
+    def __len__(self) -> int:
+        return len(self.visible)
+
+    def extend(
+        self,
+        rows: typing.List[ProgramRow]
+    ) -> None:
+        for row in rows:
+            bisect.insort(self.rows, row)
+            if self.text in row.search:
+                bisect.insort(self.visible, row)
+
+    def set_filter(
+        self,
+        text: str
+    ) -> None:
+        """
+        Keeps the rows whose name or executable contains `text`.
+
+        A filter that extends the previous one only searches the rows it kept.
+        """
+        text = text.casefold()
+        source = self.visible if text.startswith(self.text) else self.rows
+        self.visible = [row for row in source if text in row.search]
+        self.text = text
+
+    def toggle(
+        self,
+        row: ProgramRow
+    ) -> None:
+        if row.pid in self.checked:
+            del self.checked[row.pid]
+        else:
+            self.checked[row.pid] = set(range(1, len(row.cmdline)))
+
+    def selection(self) -> typing.List[typing.List[str]]:
+        """
+        The command lines of the checked programs, with the arguments kept.
+        """
+        return [
+            [row.cmdline[0]] + [
+                arg for index, arg in enumerate(row.cmdline)
+                if index in self.checked[row.pid]
+            ]
+            for row in self.rows
+            if row.pid in self.checked
+        ]
+
+
+class ProcessLoader(threading.Thread):
+    """
+    Walks the process table off the UI thread and queues the programs in batches.
+
+    `None` is queued once the walk is done.
+    """
+
+    BATCH = 64
+
+    def __init__(
+        self,
+        rows_queue: "queue.SimpleQueue",
+        replay: typing.Optional[str] = None,
+        synthetic: typing.Optional[int] = None
+    ) -> None:
+        super().__init__(daemon=True)
+        self.rows_queue = rows_queue
+        self.replay = replay
+        self.synthetic = synthetic
+
+    def processes(self) -> typing.Iterator[dict]:
+        if self.replay:
+            yield from ProcessSnapshot.replay(self.replay)
+        elif self.synthetic:
+            from bench import synthetic_table
+
+            yield from synthetic_table(self.synthetic)
+        else:
+            import psutil
+
+            # the command line is only fetched for the programs the filter keeps
+            for process in psutil.process_iter(
+                ProcessSnapshot.CHEAP_ATTRS,
+                ad_value=None
+            ):
+                try:
+                    yield ProcessRow.from_info(process.info, process)
+                except psutil.Error:
+                    pass
+
+    def run(self) -> None:
+        batch = []
+        for process in self.processes():
+            # the programs a save would ask about
+            if Weorcanjan.application_of(process) is None:
+                continue
+            batch.append(ProgramRow(process))
+            if len(batch) == ProcessLoader.BATCH:
+                self.rows_queue.put(batch)
+                batch = []
+        if batch:
+            self.rows_queue.put(batch)
+        self.rows_queue.put(None)
+
+
+class RunningProgramsFrame(ctk.CTkFrame):
     """
     If the user clicks on the check box it will appear in the list with save these
     args. In the sister frame.
+
+    Only the rows that fit are widgets, scrolling rebinds them to other rows.
     """
+
+    ROW_HEIGHT = 28
+    # rows moved by one mouse wheel notch
+    WHEEL_ROWS = 3
+
     def __init__(
         self,
         master,
+        model: ProgramList,
+        on_select: typing.Callable[[ProgramRow], None],
         **kwargs
     ):
         super().__init__(master, **kwargs)
 
-        self.grid_columnconfigure(0, weight=0)
+        self.model = model
+        self.on_select = on_select
+        # index in model.visible of the first row shown
+        self.top = 0
+        # the row widgets and the rows they show
+        self.slots = []
+        self.bound = []
+
+        self.grid_rowconfigure(2, weight=1)
+        self.grid_columnconfigure(0, weight=1)
 
         # add widgets onto the frame...
         self.label = ctk.CTkLabel(self, text="Running Programs")
-        self.label.grid(row=0, column=0, padx=20, pady=20)
+        self.label.grid(row=0, column=0, columnspan=2, padx=20, pady=(20, 10))
+
+        self.filter_entry = ctk.CTkEntry(self, placeholder_text="Filter")
+        self.filter_entry.grid(row=1, column=0, columnspan=2, padx=10, sticky="ew")
+        self.filter_entry.bind("<KeyRelease>", self._on_filter)
+
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=2, column=0, padx=(10, 0), pady=10, sticky="nsew")
+        self.viewport.bind("<Configure>", self._on_resize)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scroll)
+        self.scrollbar.grid(row=2, column=1, pady=10, sticky="ns")
+
+        for widget in (self.viewport, self.scrollbar):
+            self._bind_wheel(widget)
+
+    def _bind_wheel(
+        self,
+        widget: tkinter.Misc
+    ) -> None:
+        widget.bind("<MouseWheel>", self._on_wheel)
+        # X11 reports the wheel as buttons
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
+
+    @property
+    def page(self) -> int:
+        """
+        The number of rows that fit.
+        """
+        return max(1, self.viewport.winfo_height() // RunningProgramsFrame.ROW_HEIGHT)
+
+    def _on_resize(
+        self,
+        event: tkinter.Event
+    ) -> None:
+        # one more, a partly visible last row
+        needed = event.height // RunningProgramsFrame.ROW_HEIGHT + 1
+        while len(self.slots) < needed:
+            slot = len(self.slots)
+            checkbox = ctk.CTkCheckBox(
+                self.viewport,
+                text="",
+                command=lambda slot=slot: self._on_toggle(slot)
+            )
+            # a right or double click shows the arguments without checking
+            for sequence in ("<Button-3>", "<Double-Button-1>"):
+                checkbox.bind(sequence, lambda _, slot=slot: self._on_click(slot))
+            self._bind_wheel(checkbox)
+            self.slots.append(checkbox)
+            self.bound.append(None)
+        self.refresh()
+
+    def _on_toggle(
+        self,
+        slot: int
+    ) -> None:
+        row = self.bound[slot]
+        if row is not None:
+            self.model.toggle(row)
+            self.on_select(row)
+
+    def _on_click(
+        self,
+        slot: int
+    ) -> None:
+        row = self.bound[slot]
+        if row is not None:
+            self.on_select(row)
+
+    def _on_filter(
+        self,
+        event: tkinter.Event
+    ) -> None:
+        self.model.set_filter(self.filter_entry.get())
+        self.top = 0
+        self.refresh()
+
+    def _on_wheel(
+        self,
+        event: tkinter.Event
+    ) -> None:
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - RunningProgramsFrame.WHEEL_ROWS)
+        else:
+            self.scroll_to(self.top + RunningProgramsFrame.WHEEL_ROWS)
+
+    def _on_scroll(
+        self,
+        action: str,
+        amount: str,
+        unit: typing.Optional[str] = None
+    ) -> None:
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self.model)))
+        elif unit == "pages":
+            self.scroll_to(self.top + int(amount) * self.page)
+        else:
+            self.scroll_to(self.top + int(amount))
+
+    def scroll_to(
+        self,
+        top: int
+    ) -> None:
+        top = max(0, min(top, len(self.model) - self.page))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Binds the row widgets to the rows from `top`, after a scroll, a filter or
+        rows added.
+        """
+        self.top = max(0, min(self.top, len(self.model) - self.page))
+        rows = self.model.visible[self.top:self.top + len(self.slots)]
+        for slot, checkbox in enumerate(self.slots):
+            row = rows[slot] if slot < len(rows) else None
+            if row is None:
+                if self.bound[slot] is not None:
+                    checkbox.place_forget()
+                    self.bound[slot] = None
+                continue
+            if self.bound[slot] is None:
+                checkbox.place(x=0, y=slot * RunningProgramsFrame.ROW_HEIGHT)
+            if self.bound[slot] is not row:
+                checkbox.configure(text=row.label)
+                self.bound[slot] = row
+            # a rebound widget keeps the state of the row it showed before
+            checked = row.pid in self.model.checked
+            if checked != bool(checkbox.get()):
+                if checked:
+                    checkbox.select()
+                else:
+                    checkbox.deselect()
+
+        total = len(self.model)
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + self.page) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
 
 
 class ArgumentsCheckListFrame(ctk.CTkScrollableFrame):
+    """
+    The arguments of the selected program, unchecked ones are not saved.
+    """
+
     def __init__(
         self,
         master,
+        model: ProgramList,
         **kwargs
     ):
         super().__init__(master, **kwargs)
 
+        self.model = model
+        self.row = None
+        self.checkbox_list = []
+
         self.grid_columnconfigure(1, weight=1)
 
         # add widgets onto the frame...
         self.label = ctk.CTkLabel(self, text="Arguments")
         self.label.grid(row=0, column=1, padx=20, pady=20)
 
-        # self.checkbox_list = []
-        # for i, item in enumerate(item_list):
-        #     self.populate_program_list(item)
+    def show(
+        self,
+        row: ProgramRow
+    ) -> None:
+        # a handful of arguments, rebuilt for every program
+        for checkbox in self.checkbox_list:
+            checkbox.destroy()
+        self.checkbox_list = []
+        self.row = row
+
+        kept = self.model.checked.get(row.pid)
+        self.label.configure(text=f"Arguments of {row.name}")
+        for index, arg in enumerate(row.cmdline[1:], start=1):
+            checkbox = ctk.CTkCheckBox(
+                self,
+                text=arg,
+                state="normal" if kept is not None else "disabled",
+                command=lambda index=index: self._on_toggle(index)
+            )
+            if kept is not None and index in kept:
+                checkbox.select()
+            checkbox.grid(row=index, column=1, padx=20, pady=2, sticky="w")
+            self.checkbox_list.append(checkbox)
+
+    def _on_toggle(
+        self,
+        index: int
+    ) -> None:
+        kept = self.model.checked.get(self.row.pid)
+        if kept is not None:
+            kept.symmetric_difference_update({index})
 
 
 class ControlPanelFrame(ctk.CTkFrame):
@@ -55,29 +426,38 @@ class ControlPanelFrame(ctk.CTkFrame):
     ):
         super().__init__(master, **kwargs)
 
-        self.grid_columnconfigure(2, weight=0)
+        self.grid_columnconfigure(1, weight=1)
 
         self.label = ctk.CTkLabel(self, text="Control Panel")
-        self.label.grid(row=1, column=0, padx=20, pady=20)
+        self.label.grid(row=0, column=0, padx=20, pady=20)
 
-        # self.done_button = ctk.CTkButton(
-        #     app,
-        #     text="Done",
-        #     command=button_event
-        # )
+        self.status_label = ctk.CTkLabel(self, text="")
+        self.status_label.grid(row=0, column=1, padx=20, pady=20, sticky="w")
 
-        # self.cancel_button = customkinter.CTkButton(
-        # )
 
-    # def exit_event(self):
-    #     print("exit!!!")
+class App(ctk.CTk):
+    """
+    The save dialog, filled by a `ProcessLoader` while it is open.
+    """
 
+    # how often the queue is drained while loading, and for how long at most, so
+    # input is handled between batches
+    DRAIN_INTERVAL_MS = 30
+    DRAIN_BUDGET = 0.012
 
-class App(ctk.CTk):
-    def __init__(self):
+    def __init__(
+        self,
+        replay: typing.Optional[str] = None,
+        synthetic: typing.Optional[int] = None
+    ):
         super().__init__()
 
         self.title("Weorcanjan")
+        self.geometry("800x600")
+
+        self.model = ProgramList()
+        self.rows_queue = queue.SimpleQueue()
+        self.loading = True
 
         # https://stackoverflow.com/questions/45847313/what-does-weight-do-in-tkinter
         # In the simplest terms possible, a non-zero weight causes a row or column to
@@ -94,15 +474,18 @@ class App(ctk.CTk):
         self.grid_columnconfigure(0, weight=0)
         self.grid_columnconfigure(1, weight=1)
 
-        self.running_programs_frame = RunningProgramsFrame(
+        self.arguments_checkbox_frame = ArgumentsCheckListFrame(
             master=self,
+            model=self.model,
             corner_radius=0,
-            width=300,
+            width=500
         )
-        self.arguments_checkbox_frame = ArgumentsCheckListFrame(
+        self.running_programs_frame = RunningProgramsFrame(
             master=self,
+            model=self.model,
+            on_select=self.arguments_checkbox_frame.show,
             corner_radius=0,
-            width=500
+            width=300,
         )
         self.control_panel_frame = ControlPanelFrame(
             master=self,
@@ -113,18 +496,75 @@ class App(ctk.CTk):
 
         self.running_programs_frame.grid(row=0, column=0, sticky="nsew")
         self.arguments_checkbox_frame.grid(row=0, column=1, sticky="nsew")
-        self.control_panel_frame.grid(row=1, column=0, sticky="nsew", columnspan="2")
+        self.control_panel_frame.grid(row=1, column=0, sticky="nsew", columnspan=2)
 
         # add controls here to reference the subcomponents
         self.btn_checkbox = ctk.CTkButton(
             self.control_panel_frame,
             text="Done",
-            command=self._on_done()
+            command=self._on_done
         )
+        self.btn_checkbox.grid(row=0, column=2, padx=20, pady=20)
+
+        self.after_idle(self._on_open)
+        ProcessLoader(self.rows_queue, replay=replay, synthetic=synthetic).start()
+        self.after(App.DRAIN_INTERVAL_MS, self._drain)
+
+    def _on_open(self) -> None:
+        print(f"Window open in {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+
+    def _drain(self) -> None:
+        """
+        Adds the batches the loader queued, for at most `DRAIN_BUDGET` seconds.
+        """
+        deadline = time.perf_counter() + App.DRAIN_BUDGET
+        added = False
+        while time.perf_counter() < deadline:
+            try:
+                batch = self.rows_queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                self.loading = False
+                print(
+                    f"Loaded {len(self.model.rows)} programs in "
+                    f"{(time.perf_counter() - STARTED) * 1000:.0f} ms"
+                )
+                break
+            self.model.extend(batch)
+            added = True
+
+        if added or not self.loading:
+            self.running_programs_frame.refresh()
+            self.control_panel_frame.status_label.configure(
+                text=f"{len(self.model.rows)} programs"
+                + (", loading..." if self.loading else "")
+            )
+        if self.loading:
+            self.after(App.DRAIN_INTERVAL_MS, self._drain)
 
     def _on_done(self):
-        pass
+        for cmdline in self.model.selection():
+            print(cmdline)
+        self.destroy()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prototype of the save dialog.")
+    parser.add_argument(
+        "--replay",
+        help="A process table recorded with snapshot-record instead of the live one."
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        help="A generated process table of this many processes, see bench.py."
+    )
+    args = parser.parse_args()
+
+    app = App(replay=args.replay, synthetic=args.synthetic)
+    app.mainloop()
 
 
-app = App()
-app.mainloop()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Start-up budget for the CLI, checked with `python -X importtime`.
+
+Weorcanjan runs at every login, so the imports paid before and during a restore
+matter. Each scenario runs in a fresh interpreter against a temporary data directory
+and fails when its imports cost more than its budget, or pull in a module that only
+the slower commands should load:-
+
+* `start-up`: what every command loads before it runs, the import of the module,
+  `forward_to_agent` finding no agent, and the argument parser. `list` and `show`
+  load nothing else.
+* `restore`: a whole `restore` in process, of a session whose only application does
+  not exist so nothing is launched. It takes a process snapshot, so psutil is
+  allowed here.
+
+Usage:-
+    python doc/test/importtime_budget.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import typing
+
+RUNS = 5
+
+# only the commands that enumerate processes or prompt may import these
+FORBIDDEN = (
+    "psutil",
+    "questionary",
+    "prompt_toolkit",
+    "customtkinter",
+    "concurrent.futures",
+    "platform",
+    "pprint",
+)
+
+SESSION = "budget"
+
+# writes the session the restore scenario reads
+SETUP = f"""
+from res.session_format import PersistApplicationType
+from weorcanjan import Weorcanjan
+Weorcanjan.ARGS = Weorcanjan.build_parser().parse_args(["save"])
+Weorcanjan.ensure_data_dir()
+Weorcanjan.get_store().save({SESSION!r}, [
+    PersistApplicationType(name="missing.exe", path="/nonexistent/missing.exe", args=[])
+])
+"""
+
+STARTUP = """
+from weorcanjan import Weorcanjan
+argv = {argv!r}
+assert Weorcanjan.forward_to_agent(argv) is None
+Weorcanjan.ARGS = Weorcanjan.build_parser().parse_args(argv)
+"""
+
+# name -> (code, best of `RUNS` cumulative import time budget in microseconds,
+# modules it must not import)
+SCENARIOS = {
+    "start-up": (
+        STARTUP.format(argv=["list"]),
+        75000,
+        FORBIDDEN
+    ),
+    "restore": (
+        STARTUP.format(argv=["restore", "--name", SESSION])
+        + f"Weorcanjan.restore_session({SESSION!r})\n",
+        100000,
+        tuple(name for name in FORBIDDEN if name != "psutil")
+    ),
+}
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_times(
+    code: str,
+    env: dict
+) -> dict:
+    """
+    Runs code in a fresh interpreter and returns the cumulative import time in
+    microseconds of every top level import.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def check(
+    name: str,
+    code: str,
+    budget: int,
+    forbidden: typing.Tuple[str, ...],
+    env: dict
+) -> bool:
+    """
+    Runs a scenario `RUNS` times and prints its best import time.
+
+    Returns:
+        bool: True when it is within budget and imports nothing forbidden.
+    """
+    startup = set(import_times("pass", env))
+
+    best = None
+    imported = set()
+    for _ in range(RUNS):
+        times = import_times(code, env)
+        imported = {name.strip() for name in times}
+        total = sum(
+            cumulative
+            for name, cumulative in times.items()
+            if not name.startswith(" ") and name not in startup
+        )
+        best = total if best is None else min(best, total)
+
+    passed = True
+    print(f"{name} import time: {best} us (budget {budget} us)")
+    if best > budget:
+        print(f"FAIL: {name} import time is over budget")
+        passed = False
+
+    for module in forbidden:
+        if module in imported:
+            print(f"FAIL: {module} is imported by {name}")
+            passed = False
+
+    return passed
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {**os.environ, "APPDATA": data_dir}
+        subprocess.run(
+            [sys.executable, "-c", SETUP],
+            cwd=REPO_ROOT,
+            env=env,
+            check=True
+        )
+        failed = False
+        for name, (code, budget, forbidden) in SCENARIOS.items():
+            if not check(name, code, budget, forbidden, env):
+                failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Unit tests of `res/argv_canonicalizer.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.argv_canonicalizer import ArgvCanonicalizer, ArgvTrie  # noqa: E402
+
+CHROME = "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe"
+
+
+class ArgvCanonicalizerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.canonicalizer = ArgvCanonicalizer()
+        self.canonicalizer.temp_dirs = ("c:/users/me/appdata/local/temp/",)
+
+    def test_strip_volatile_arguments(self) -> None:
+        self.assertEqual(
+            self.canonicalizer.strip(CHROME, [
+                "--profile-directory=Default",
+                "--field-trial-handle=1234",
+                "--no-startup-window",
+                "--remote-debugging-port",
+                "9222",
+                "--session=6f1c2a7e-1b2c-4d5e-8f90-a1b2c3d4e5f6",
+                "C:\\Users\\me\\AppData\\Local\\Temp\\page.html",
+            ]),
+            ["--profile-directory=Default"]
+        )
+
+    def test_profile_without_arguments(self) -> None:
+        self.assertEqual(
+            self.canonicalizer.strip("C:\\Apps\\ms-teams.exe", ["msteams:start"]),
+            []
+        )
+
+    def test_profile_is_per_application(self) -> None:
+        # --no-startup-window is only dropped for the chromium profiles
+        self.assertEqual(
+            self.canonicalizer.strip("C:\\tool.exe", ["--no-startup-window"]),
+            ["--no-startup-window"]
+        )
+
+    def test_key(self) -> None:
+        self.assertEqual(
+            self.canonicalizer.key([CHROME, "--type=renderer", "--Incognito"]),
+            (self.canonicalizer.normalize(CHROME), "--incognito")
+        )
+        self.assertEqual(
+            self.canonicalizer.key('"C:\\A B\\a.exe" --X'),
+            ("c:/a b/a.exe", "--x")
+        )
+        self.assertEqual(self.canonicalizer.key("C:\\a.exe"), ("c:/a.exe",))
+
+    def test_dedupe(self) -> None:
+        cmdlines = [
+            [CHROME, "--field-trial-handle=1"],
+            [CHROME.upper(), "--field-trial-handle=2"],
+            [CHROME, "--incognito"],
+        ]
+        kept, dropped = self.canonicalizer.dedupe(cmdlines, lambda cmdline: cmdline)
+        self.assertEqual(kept, [cmdlines[0], cmdlines[2]])
+        self.assertEqual(dropped, [cmdlines[1]])
+
+
+class ArgvTrieTest(unittest.TestCase):
+
+    def test_insert_and_prefix(self) -> None:
+        trie = ArgvTrie()
+        self.assertIsNone(trie.insert(("a.exe", "--x"), "first"))
+        self.assertEqual(trie.insert(("a.exe", "--x"), "second"), "first")
+        self.assertEqual(len(trie), 1)
+        self.assertIn(("a.exe", "--x"), trie)
+        self.assertNotIn(("a.exe",), trie)
+        self.assertTrue(trie.has_prefix(("a.exe",)))
+        self.assertFalse(trie.has_prefix(("b.exe",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests of `res/ignore_matcher.py` and `res/ignore_index.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.ignore_index import IgnoreIndex, IgnoreLayer  # noqa: E402
+from res.ignore_matcher import IgnoreMatcher  # noqa: E402
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+
+    def test_names_and_paths_ignore_case(self) -> None:
+        matcher = IgnoreMatcher(["svchost.exe", "C:\\Tools\\foo.exe"])
+        self.assertTrue(matcher.matches("SVCHOST.EXE"))
+        self.assertTrue(matcher.matches("other.exe", "C:\\Windows\\svchost.exe"))
+        self.assertTrue(matcher.matches("foo.exe", "c:/tools/FOO.exe"))
+        self.assertFalse(matcher.matches("foo.exe", "C:\\Other\\foo.exe"))
+
+    def test_directory(self) -> None:
+        matcher = IgnoreMatcher(["C:\\Windows\\System32\\"])
+        self.assertTrue(matcher.matches("a.exe", "C:\\Windows\\System32\\a.exe"))
+        self.assertTrue(matcher.matches("b.exe", "C:\\Windows\\System32\\x\\b.exe"))
+        self.assertFalse(matcher.matches("c.exe", "C:\\Windows\\c.exe"))
+
+    def test_globs_and_regexes(self) -> None:
+        matcher = IgnoreMatcher([
+            "*Helper*.exe",
+            "C:\\Games\\*\\launcher.exe",
+            "re:/jetbrains/.*64\\.exe$"
+        ])
+        self.assertTrue(matcher.matches("GPUHelper2.exe"))
+        self.assertTrue(matcher.matches("launcher.exe", "C:\\Games\\x\\launcher.exe"))
+        self.assertTrue(
+            matcher.matches("idea64.exe", "C:\\Program Files\\JetBrains\\idea64.exe")
+        )
+        self.assertFalse(matcher.matches("idea.exe", "C:\\JetBrains\\idea.exe"))
+
+    def test_invalid_regex_is_skipped(self) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            matcher = IgnoreMatcher(["re:(", "a.exe"])
+        self.assertEqual(matcher.rules, ["a.exe"])
+
+    def test_classify(self) -> None:
+        matcher = IgnoreMatcher(["a.exe"])
+        kept, ignored = matcher.classify([{"name": "a.exe"}, {"name": "b.exe"}])
+        self.assertEqual(kept, [{"name": "b.exe"}])
+        self.assertEqual(ignored, [{"name": "a.exe"}])
+
+
+class IgnoreIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.data_dir.name, IgnoreIndex.FILENAME)
+        self.user_path = os.path.join(self.data_dir.name, "my_ignore.txt")
+
+    def tearDown(self) -> None:
+        self.data_dir.cleanup()
+
+    def write_user(
+        self,
+        *rules: str
+    ) -> None:
+        with open(self.user_path, "w") as f:
+            f.write("\n".join(rules))
+
+    def index(
+        self,
+        *command_line: str
+    ) -> IgnoreIndex:
+        return IgnoreIndex(self.cache_path, [
+            IgnoreLayer("built-in", rules=["a.exe", "b.exe"]),
+            IgnoreLayer("user", path=self.user_path),
+            IgnoreLayer("command line", rules=list(command_line))
+        ])
+
+    def test_negation_takes_back_an_earlier_rule(self) -> None:
+        self.write_user("!A.EXE", "c.exe")
+        matcher = self.index().load()
+        self.assertFalse(matcher.matches("a.exe"))
+        self.assertTrue(matcher.matches("b.exe"))
+        self.assertTrue(matcher.matches("c.exe"))
+
+    def test_later_layer_adds_back_a_negated_rule(self) -> None:
+        self.write_user("!a.exe")
+        matcher = self.index("a.exe").load()
+        self.assertTrue(matcher.matches("a.exe"))
+
+    def test_negation_of_a_later_rule_has_no_effect(self) -> None:
+        self.write_user("c.exe")
+        matcher = self.index("!d.exe").load()
+        self.assertTrue(matcher.matches("c.exe"))
+        self.assertFalse(matcher.matches("d.exe"))
+
+    def test_cache(self) -> None:
+        self.write_user("c.exe")
+        index = self.index()
+        index.load()
+        self.assertFalse(index.cached)
+
+        index = self.index()
+        self.assertTrue(index.load().matches("c.exe"))
+        self.assertTrue(index.cached)
+        self.assertEqual(index.counts, {"built-in": 2, "user": 1, "command line": 0})
+
+        # a different size is read again
+        self.write_user("!c.exe", "d.exe")
+        index = self.index()
+        matcher = index.load()
+        self.assertFalse(index.cached)
+        self.assertFalse(matcher.matches("c.exe"))
+        self.assertTrue(matcher.matches("d.exe"))
+
+
+if __name__ == "__main__":
+    unittest.main()
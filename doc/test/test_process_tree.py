@@ -0,0 +1,95 @@
+"""
+Unit tests of `res/process_tree.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.process_tree import ProcessTree  # noqa: E402
+
+
+def row(
+    pid: int,
+    ppid: int,
+    exe: str,
+    cmdline: tuple = ()
+) -> dict:
+    return {
+        "pid": pid,
+        "ppid": ppid,
+        "name": exe.rsplit("/", 1)[-1],
+        "exe": exe,
+        "cmdline": [exe, *cmdline]
+    }
+
+
+SIGNATURES = {"chrome.exe": {"names": ("crashpad.exe",), "args": ("--type=",)}}
+
+
+class ProcessTreeTest(unittest.TestCase):
+
+    def roots(
+        self,
+        tree: ProcessTree
+    ) -> list:
+        return sorted(process["pid"] for process in tree.roots())
+
+    def test_same_executable_folds(self) -> None:
+        tree = ProcessTree.build([
+            row(1, 0, "C:/a.exe"),
+            row(2, 1, "C:/A.EXE"),
+            row(3, 2, "C:/b.exe"),
+        ])
+        self.assertEqual(self.roots(tree), [1, 3])
+        self.assertEqual(tree.root_of[2], 1)
+
+    def test_helpers_fold_into_their_application(self) -> None:
+        tree = ProcessTree(SIGNATURES)
+        tree.extend([
+            row(10, 0, "C:/chrome.exe"),
+            row(11, 10, "C:/crashpad.exe"),
+            row(12, 10, "C:/renderer.exe", ("--type=renderer",)),
+            row(13, 10, "C:/notepad.exe"),
+        ])
+        self.assertEqual(self.roots(tree), [10, 13])
+
+    def test_child_before_parent(self) -> None:
+        tree = ProcessTree()
+        tree.extend([row(2, 1, "C:/a.exe"), row(1, 0, "C:/a.exe")])
+        self.assertEqual(self.roots(tree), [1])
+
+    def test_ppid_cycle(self) -> None:
+        tree = ProcessTree.build([row(1, 2, "C:/a.exe"), row(2, 1, "C:/a.exe")])
+        self.assertEqual(len(tree.roots()), 1)
+
+    def test_remove_root_promotes_its_descendants(self) -> None:
+        # a launcher stub that starts the real application and exits
+        tree = ProcessTree.build([
+            row(1, 0, "C:/a.exe"),
+            row(2, 1, "C:/a.exe"),
+            row(4, 2, "C:/a.exe"),
+        ])
+        self.assertEqual(tree.remove(1), [2])
+        self.assertEqual(self.roots(tree), [2])
+        self.assertEqual(tree.root_of[4], 2)
+
+    def test_remove_root_then_extend_child(self) -> None:
+        tree = ProcessTree.build([row(1, 0, "C:/a.exe"), row(2, 1, "C:/a.exe")])
+        tree.remove(1)
+        self.assertEqual(tree.extend([row(3, 2, "C:/b.exe")]), [3])
+        self.assertEqual(self.roots(tree), [2, 3])
+
+    def test_remove_helper_keeps_root(self) -> None:
+        tree = ProcessTree.build([row(1, 0, "C:/a.exe"), row(2, 1, "C:/a.exe")])
+        self.assertEqual(tree.remove(2), [])
+        self.assertEqual(self.roots(tree), [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
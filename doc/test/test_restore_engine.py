@@ -0,0 +1,119 @@
+"""
+Unit tests of `res/restore_engine.py` with a launcher that starts nothing.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import contextlib
+import io
+import os
+import sys
+import threading
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.restore_engine import LaunchEntry, RestoreEngine  # noqa: E402
+
+
+class RestoreEngineTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.launched = []
+        self.lock = threading.Lock()
+        # executable names whose launch raises
+        self.failing = set()
+
+    def launcher(
+        self,
+        cmdline: list,
+        **kwargs: dict
+    ) -> object:
+        name = os.path.basename(cmdline[0])
+        if name in self.failing:
+            raise OSError(f"cannot start {name}")
+        with self.lock:
+            self.launched.append(name)
+        return object()
+
+    def run_engine(
+        self,
+        entries: list,
+        jobs: int = 4
+    ) -> list:
+        engine = RestoreEngine(entries, jobs=jobs, launcher=self.launcher)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            results = engine.run()
+        self.output = output.getvalue()
+        return results
+
+    def test_dependencies_launch_first(self) -> None:
+        results = self.run_engine([
+            LaunchEntry(["C:/code.exe"], after=["docker.exe", "db.exe"]),
+            LaunchEntry(["C:/db.exe"], after=["DOCKER.EXE"]),
+            LaunchEntry(["C:/docker.exe"]),
+        ])
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.launched, ["docker.exe", "db.exe", "code.exe"])
+
+    def test_cycle_is_reported_without_launching(self) -> None:
+        results = self.run_engine([
+            LaunchEntry(["C:/a.exe"], after=["b.exe"]),
+            LaunchEntry(["C:/b.exe"], after=["a.exe"]),
+            LaunchEntry(["C:/c.exe"], after=["b.exe"]),
+            LaunchEntry(["C:/d.exe"]),
+        ])
+        self.assertEqual(
+            [result.error for result in results],
+            ["dependency cycle", "dependency cycle", "dependency cycle", None]
+        )
+        self.assertEqual(self.launched, ["d.exe"])
+
+    def test_failed_dependency_skips_its_dependents(self) -> None:
+        self.failing.add("docker.exe")
+        results = self.run_engine([
+            LaunchEntry(["C:/docker.exe"]),
+            LaunchEntry(["C:/db.exe"], after=["docker.exe"]),
+            LaunchEntry(["C:/code.exe"], after=["db.exe"]),
+        ])
+        self.assertEqual(results[0].error, "cannot start docker.exe")
+        self.assertEqual(results[1].error, "dependency docker.exe failed")
+        self.assertEqual(results[2].error, "dependency db.exe failed")
+        self.assertEqual(self.launched, [])
+
+    def test_unknown_and_self_dependencies_are_ignored(self) -> None:
+        results = self.run_engine([
+            LaunchEntry(["C:/a.exe"], after=["missing.exe", "a.exe"]),
+        ])
+        self.assertTrue(results[0].ok)
+        self.assertIn("Unknown dependency 'missing.exe' of a.exe", self.output)
+
+    def test_running_and_invalid_entries(self) -> None:
+        running = LaunchEntry(["C:/a.exe"])
+        running.running = True
+        invalid = LaunchEntry(["C:/b.exe"])
+        invalid.invalid = "not found"
+        results = self.run_engine([
+            running,
+            invalid,
+            LaunchEntry(["C:/c.exe"], after=["a.exe"]),
+            LaunchEntry(["C:/d.exe"], after=["b.exe"]),
+        ])
+        self.assertEqual(results[0].skipped, "already running")
+        self.assertEqual(results[1].error, "not found")
+        self.assertTrue(results[2].ok)
+        self.assertEqual(results[3].error, "dependency b.exe failed")
+        self.assertEqual(self.launched, ["c.exe"])
+
+    def test_single_worker_launches_every_entry(self) -> None:
+        results = self.run_engine(
+            [LaunchEntry([f"C:/app{index}.exe"]) for index in range(10)],
+            jobs=1
+        )
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.launched), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
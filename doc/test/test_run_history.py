@@ -0,0 +1,81 @@
+"""
+Unit tests of `res/run_history.py` on an in-memory database.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.restore_engine import LaunchEntry, LaunchResult  # noqa: E402
+from res.run_history import RunHistory  # noqa: E402
+
+
+class RunHistoryTest(unittest.TestCase):
+
+    def test_percentile_is_nearest_rank(self) -> None:
+        values = [5.0, 1.0, 4.0, 2.0, 3.0]
+        self.assertEqual(RunHistory.percentile(values, 50), 3.0)
+        self.assertEqual(RunHistory.percentile(values, 95), 5.0)
+        self.assertEqual(RunHistory.percentile(values, 1), 1.0)
+        self.assertEqual(RunHistory.percentile(values, 0), 1.0)
+        self.assertEqual(RunHistory.percentile([7.0], 99), 7.0)
+        # 10 values, p90 is the 9th
+        self.assertEqual(RunHistory.percentile(list(range(1, 11)), 90), 9)
+
+    def test_slow_runs_compare_with_the_runs_before(self) -> None:
+        seconds = [1.0] * RunHistory.MIN_BASELINE_RUNS + [2.0, 1.2, 3.0]
+        runs = [
+            {"id": index, "seconds": value}
+            for index, value in enumerate(seconds)
+        ]
+        slow = RunHistory.slow_runs(runs, factor=1.5)
+        self.assertEqual(
+            [(run["id"], ratio) for run, ratio in slow],
+            [(5, 2.0), (7, 3.0)]
+        )
+
+    def test_slow_runs_need_a_baseline(self) -> None:
+        runs = [{"id": 0, "seconds": 1.0}, {"id": 1, "seconds": 10.0}]
+        self.assertEqual(RunHistory.slow_runs(runs), [])
+
+    def test_record_and_read_back(self) -> None:
+        history = RunHistory(":memory:")
+        self.addCleanup(history.close)
+
+        launched = LaunchResult(LaunchEntry(["C:/a.exe"]), latency=0.25)
+        launched.settle = 1.5
+        failed = LaunchResult(LaunchEntry(["C:/b.exe"]), error="not found")
+        skipped = LaunchResult(LaunchEntry(["C:/c.exe"]), latency=0.0)
+        skipped.skipped = "already running"
+
+        history.record("save", "work", 0.5, {"snapshot": 0.2, "filter": 0.1})
+        history.record(
+            "restore",
+            "work",
+            2.0,
+            {"launch": 1.0},
+            applications=3,
+            errors=1,
+            launches=[launched, failed, skipped]
+        )
+        history.record("restore", "home", 3.0, {"launch": 2.0})
+
+        runs = history.runs("restore")
+        self.assertEqual([run["session"] for run in runs], ["work", "home"])
+        self.assertEqual(runs[0]["errors"], 1)
+        self.assertEqual(len(history.runs("restore", window=1)), 1)
+        self.assertEqual(len(history.runs("restore", session="work")), 1)
+
+        self.assertEqual(history.phases(runs), {"launch": [1.0, 2.0]})
+        # failed and skipped launches are left out
+        self.assertEqual(history.launches(runs), {"a.exe": [0.25]})
+        self.assertEqual(history.phases([]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
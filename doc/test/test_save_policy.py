@@ -0,0 +1,157 @@
+"""
+Unit tests of `res/save_policy.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import sys
+import time
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.save_policy import SavePolicy  # noqa: E402
+
+
+def row(
+    pid: int,
+    exe: str,
+    *args: str,
+    ppid: int = 0,
+    **fields: object
+) -> dict:
+    name = exe.replace("\\", "/").rsplit("/", 1)[-1]
+    return {
+        "pid": pid,
+        "ppid": ppid,
+        "name": name,
+        "exe": exe,
+        "cmdline": [exe, *args],
+        **fields
+    }
+
+
+def application_of(
+    process: dict
+) -> str:
+    return process["exe"]
+
+
+class SavePolicyTest(unittest.TestCase):
+
+    def decide(
+        self,
+        spec: dict,
+        roots: list,
+        rows: list = ()
+    ) -> dict:
+        decisions = SavePolicy(spec).evaluate(roots, rows or roots, application_of)
+        return {
+            decision.application: (decision.included, decision.rule)
+            for decision in decisions
+        }
+
+    def test_first_matching_rule_decides(self) -> None:
+        spec = {
+            "rules": [
+                {"id": "no-updaters", "action": "exclude", "name": "*update*.exe"},
+                {"id": "jetbrains", "action": "include", "exe": "C:\\JetBrains\\*"},
+            ]
+        }
+        self.assertEqual(
+            self.decide(spec, [
+                row(1, "C:\\JetBrains\\idea64.exe"),
+                row(2, "C:\\JetBrains\\update.exe"),
+                row(3, "C:\\notepad.exe"),
+            ]),
+            {
+                "C:\\JetBrains\\idea64.exe": (True, "jetbrains"),
+                "C:\\JetBrains\\update.exe": (False, "no-updaters"),
+                "C:\\notepad.exe": (False, None),
+            }
+        )
+
+    def test_default_include_and_rule_names(self) -> None:
+        spec = {"default": "include", "rules": [{"action": "exclude", "argv": "re:-q"}]}
+        self.assertEqual(
+            self.decide(spec, [row(1, "C:\\a.exe", "-q"), row(2, "C:\\b.exe", "-v")]),
+            {"C:\\a.exe": (False, "rule 1"), "C:\\b.exe": (True, None)}
+        )
+
+    def test_thresholds(self) -> None:
+        now = time.time()
+        spec = {
+            "rules": [
+                {
+                    "id": "settled",
+                    "action": "include",
+                    "min_uptime": 60,
+                    "max_rss_mb": 100
+                }
+            ]
+        }
+        self.assertEqual(
+            self.decide(spec, [
+                row(1, "C:\\old.exe", create_time=now - 600, memory=50 * 1024 ** 2),
+                row(2, "C:\\new.exe", create_time=now, memory=50 * 1024 ** 2),
+                row(3, "C:\\big.exe", create_time=now - 600, memory=500 * 1024 ** 2),
+                # access denied
+                row(4, "C:\\denied.exe", create_time=None, memory=None),
+            ]),
+            {
+                "C:\\old.exe": (True, "settled"),
+                "C:\\new.exe": (False, None),
+                "C:\\big.exe": (False, None),
+                "C:\\denied.exe": (False, None),
+            }
+        )
+
+    def test_console(self) -> None:
+        spec = {"rules": [{"id": "consoles", "action": "include", "console": True}]}
+        shell = row(1, "C:\\pwsh.exe")
+        gui = row(2, "C:\\gui.exe")
+        host = row(3, "conhost.exe", ppid=1)
+        self.assertEqual(
+            self.decide(spec, [shell, gui], [shell, gui, host]),
+            {"C:\\pwsh.exe": (True, "consoles"), "C:\\gui.exe": (False, None)}
+        )
+
+    def test_application_is_included_when_any_process_is(self) -> None:
+        spec = {"rules": [{"id": "profile", "action": "include", "argv": "--work"}]}
+        self.assertEqual(
+            self.decide(spec, [
+                row(1, "C:\\chrome.exe", "--home"),
+                row(2, "C:\\chrome.exe", "--work"),
+                row(3, "C:\\chrome.exe", "--other"),
+            ]),
+            {"C:\\chrome.exe": (True, "profile")}
+        )
+
+    def test_ignored_processes_are_left_out(self) -> None:
+        decisions = SavePolicy({"default": "include", "rules": []}).evaluate(
+            [row(1, "C:\\a.exe")],
+            [],
+            lambda process: None
+        )
+        self.assertEqual(decisions, [])
+
+    def test_malformed_policies(self) -> None:
+        for spec in (
+            {},
+            {"rules": [], "default": "maybe"},
+            {"rules": ["exe"]},
+            {"rules": [{"action": "keep"}]},
+            {"rules": [{"action": "include", "colour": "red"}]},
+            {"rules": [{"action": "include", "min_uptime": True}]},
+            {"rules": [{"action": "include", "console": "yes"}]},
+            {"rules": [{"action": "include", "name": 1}]},
+            {"rules": [{"action": "include", "exe": "re:("}]},
+        ):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                SavePolicy(spec)
+
+
+if __name__ == "__main__":
+    unittest.main()
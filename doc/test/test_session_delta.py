@@ -0,0 +1,87 @@
+"""
+Unit tests of `res/session_delta.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.session_delta import SessionDelta  # noqa: E402
+from res.session_format import PersistApplicationType  # noqa: E402
+
+
+def app(
+    path: str,
+    *args: str
+) -> PersistApplicationType:
+    return PersistApplicationType(
+        name=PersistApplicationType.name_from_cmdline([path]),
+        path=path,
+        args=list(args)
+    )
+
+
+class SessionDeltaTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.previous = [app("C:\\a.exe", "--x"), app("C:\\b.exe"), app("C:\\c.exe")]
+
+    def test_new_and_vanished(self) -> None:
+        delta = SessionDelta(
+            self.previous,
+            running=["c:/A.EXE", "C:\\d.exe", "C:\\e.exe"],
+            # c.exe was saved but not running at the previous save, e.exe was
+            # running but not saved
+            seen=["C:\\a.exe", "C:\\b.exe", "C:\\e.exe"]
+        )
+        self.assertTrue(delta.changed)
+        self.assertEqual(delta.new, ["C:\\d.exe"])
+        self.assertEqual(delta.vanished, ["C:\\b.exe"])
+
+    def test_unchanged(self) -> None:
+        delta = SessionDelta(
+            self.previous,
+            running=["C:\\a.exe", "C:\\b.exe", "C:\\c.exe"],
+            seen=[]
+        )
+        self.assertFalse(delta.changed)
+
+    def test_without_seen_the_saved_applications_were_running(self) -> None:
+        delta = SessionDelta(self.previous, running=["C:\\a.exe"], seen=[])
+        self.assertEqual(delta.vanished, ["C:\\b.exe", "C:\\c.exe"])
+
+    def test_apply(self) -> None:
+        delta = SessionDelta(
+            self.previous,
+            running=["C:\\a.exe", "C:\\d.exe", "C:\\e.exe"],
+            seen=[]
+        )
+        apps = delta.apply(
+            added=["C:\\d.exe", "C:\\e.exe"],
+            kept=["c:/C.exe"],
+            application_args={"C:\\d.exe": [["--one"], ["--two"]]}
+        )
+        self.assertEqual(
+            [app.cmdline for app in apps],
+            [
+                ["C:\\a.exe", "--x"],
+                ["C:\\c.exe"],
+                ["C:\\d.exe", "--one"],
+                ["C:\\d.exe", "--two"],
+                ["C:\\e.exe"],
+            ]
+        )
+
+    def test_apply_does_not_add_a_saved_application_twice(self) -> None:
+        delta = SessionDelta(self.previous, running=["C:\\a.exe"], seen=[])
+        apps = delta.apply(added=["C:\\A.exe"], kept=["C:\\b.exe", "C:\\c.exe"])
+        self.assertEqual(len(apps), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
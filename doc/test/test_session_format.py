@@ -0,0 +1,117 @@
+"""
+Unit tests of `res/session_format.py`.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.session_format import (  # noqa: E402
+    LegacySessionReader,
+    PersistApplicationType,
+    SessionFormat,
+    SessionReader
+)
+
+
+class SessionFormatTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.data_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.data_dir.cleanup()
+
+    def path(
+        self,
+        name: str
+    ) -> str:
+        return os.path.join(self.data_dir.name, name)
+
+    def test_round_trip(self) -> None:
+        entries = [
+            PersistApplicationType(
+                name="code.exe",
+                path="C:\\VS Code\\code.exe",
+                args=["--new-window", "C:\\work"],
+                cwd="C:\\work",
+                env={"LANG": "en"},
+                after=["docker.exe"]
+            ),
+            PersistApplicationType(name="notepad.exe", path="notepad.exe", args=[]),
+            # legacy entry, a raw command line
+            PersistApplicationType(name="a.exe", path='"C:\\a b\\a.exe" --x'),
+        ]
+        path = self.path("work" + SessionFormat.EXTENSION)
+        size = SessionFormat.write(path, entries)
+        self.assertEqual(size, os.path.getsize(path))
+
+        with SessionFormat.open(path) as reader:
+            self.assertIsInstance(reader, SessionReader)
+            self.assertEqual(len(reader), 3)
+            self.assertEqual(
+                [entry.to_dict() for entry in reader],
+                [entry.to_dict() for entry in entries]
+            )
+            # entries are decoded on their own
+            self.assertEqual(reader[1].cmdline, ["notepad.exe"])
+            self.assertEqual(reader[2].cmdline, '"C:\\a b\\a.exe" --x')
+            with self.assertRaises(IndexError):
+                reader.raw(3)
+
+    def test_empty_session(self) -> None:
+        path = self.path("empty" + SessionFormat.EXTENSION)
+        SessionFormat.write(path, [])
+        with SessionFormat.open(path) as reader:
+            self.assertEqual(list(reader), [])
+
+    def test_invalid_files(self) -> None:
+        path = self.path("bad" + SessionFormat.EXTENSION)
+        with open(path, "wb") as f:
+            f.write(b"WJ")
+        with self.assertRaises(ValueError):
+            SessionReader(path)
+
+        with open(path, "wb") as f:
+            f.write(SessionFormat.HEADER.pack(SessionFormat.MAGIC, 99, 0, 0))
+        with self.assertRaises(ValueError):
+            SessionReader(path)
+
+        with open(path, "wb") as f:
+            f.write(struct.pack("<4sHHI", b"NOPE", 1, 0, 0))
+        with self.assertRaises(ValueError):
+            SessionReader(path)
+
+    def test_legacy_session(self) -> None:
+        path = self.path("old" + SessionFormat.LEGACY_EXTENSION)
+        with open(path, "w") as f:
+            f.write(
+                "C:\\Docker\\docker.exe\n"
+                "\n"
+                '"C:\\VS Code\\code.exe" --new-window\n'
+                "after: docker.exe, db.exe\n"
+            )
+        with SessionFormat.open(path) as reader:
+            self.assertIsInstance(reader, LegacySessionReader)
+            entries = list(reader)
+        self.assertEqual([entry.name for entry in entries], ["docker.exe", "code.exe"])
+        self.assertIsNone(entries[1].args)
+        self.assertEqual(entries[1].after, ["docker.exe", "db.exe"])
+
+    def test_name_from_cmdline(self) -> None:
+        name_from_cmdline = PersistApplicationType.name_from_cmdline
+        self.assertEqual(name_from_cmdline(["C:\\a\\b.exe", "--x"]), "b.exe")
+        self.assertEqual(name_from_cmdline('"C:\\a b\\c.exe" --x'), "c.exe")
+        self.assertEqual(name_from_cmdline("C:\\Program Files\\d.EXE --x"), "d.EXE")
+        self.assertEqual(name_from_cmdline([]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
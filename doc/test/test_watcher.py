@@ -0,0 +1,83 @@
+"""
+Unit tests of `res/watcher.py` on an in-memory process table.
+
+Usage:-
+    python -m unittest discover -s doc/test
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from res.watcher import ProcessWatcher  # noqa: E402
+
+
+class ProcessWatcherTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # pid -> (create time, row)
+        self.table = {}
+        self.watcher = ProcessWatcher(
+            lambda row: row["exe"],
+            list_pids=lambda: list(self.table),
+            fetch=lambda pid: self.table[pid][1] if pid in self.table else None,
+            create_time=lambda pid: self.table[pid][0] if pid in self.table else None
+        )
+
+    def start(
+        self,
+        pid: int,
+        exe: str,
+        ppid: int = 0,
+        created: float = 0.0
+    ) -> None:
+        self.table[pid] = (
+            created,
+            {"pid": pid, "ppid": ppid, "name": exe, "exe": exe}
+        )
+
+    def test_new_and_exited(self) -> None:
+        self.start(1, "a.exe")
+        self.assertTrue(self.watcher.poll())
+        self.assertEqual(self.watcher.applications, {"a.exe"})
+        del self.table[1]
+        self.assertTrue(self.watcher.poll())
+        self.assertEqual(self.watcher.applications, set())
+
+    def test_reused_pid(self) -> None:
+        self.start(1, "a.exe", created=1.0)
+        self.watcher.poll()
+        self.start(1, "b.exe", created=2.0)
+        self.assertTrue(self.watcher.poll())
+        self.assertEqual(self.watcher.applications, {"b.exe"})
+
+    def test_launcher_exits(self) -> None:
+        self.start(1, "a.exe")
+        self.start(2, "a.exe", ppid=1)
+        self.watcher.poll()
+        del self.table[1]
+        self.assertFalse(self.watcher.poll())
+        self.assertEqual(self.watcher.candidates, {2: "a.exe"})
+
+    def test_failed_poll_is_retried(self) -> None:
+        self.start(1, "a.exe")
+        fetch = self.watcher.fetch
+
+        def failing_fetch(pid: int) -> dict:
+            raise OSError("access denied")
+
+        self.watcher.fetch = failing_fetch
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertFalse(self.watcher.try_poll())
+        self.assertEqual(self.watcher.errors, 1)
+        self.watcher.fetch = fetch
+        self.assertTrue(self.watcher.try_poll())
+        self.assertEqual(self.watcher.applications, {"a.exe"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Load adaptive admission control for restores, so a laptop is not saturated by a
+whole session starting at once.
+
+Before each launch the system CPU, disk I/O and available memory are sampled. The
+next application is only admitted while CPU and disk stay under their targets. While
+the machine is busy the wait between two checks doubles, and once it is idle again
+launches go out back to back. Every launch carries an estimated memory cost, from the
+restore history, and is deferred while it would leave less than the reserve free.
+An application that still does not fit after `max_wait` is refused, since starting
+it would push the machine into swap.
+"""
+import threading
+import time
+import typing
+
+from res.tracer import Tracer
+
+
+class AdmissionController:
+    """
+    Gate that launches pass through one at a time, safe to use from the workers.
+    """
+
+    DEFAULT_CPU_TARGET = 75.0
+    # MiB read and written per second
+    DEFAULT_DISK_TARGET = 60.0
+    # MiB left free after a launch
+    DEFAULT_MEMORY_RESERVE = 512.0
+    DEFAULT_MAX_WAIT = 60.0
+    # MiB assumed for an application the history knows nothing about
+    DEFAULT_MEMORY_COST = 150.0
+
+    # shortest window a sample is measured over, shorter ones are noise
+    SAMPLE_WINDOW = 0.1
+    MIN_DELAY = 0.05
+    MAX_DELAY = 2.0
+    # load below this share of the targets counts as idle
+    IDLE_SHARE = 0.5
+    # memory of an admitted launch stays reserved until it shows in the samples
+    RESERVE_SECONDS = 10.0
+
+    MIB = 1024 * 1024
+
+    def __init__(
+        self,
+        cpu_target: float = DEFAULT_CPU_TARGET,
+        disk_target: float = DEFAULT_DISK_TARGET,
+        memory_reserve: float = DEFAULT_MEMORY_RESERVE,
+        max_wait: float = DEFAULT_MAX_WAIT
+    ) -> None:
+        """
+        Args:
+            cpu_target: System CPU percent to stay under.
+            disk_target: Disk read plus write MiB per second to stay under.
+            memory_reserve: MiB of memory to keep available.
+            max_wait: Seconds a launch waits for the machine before it is admitted
+            anyway, or refused when it does not fit in memory.
+        """
+        import psutil
+
+        self.psutil = psutil
+        self.cpu_target = cpu_target
+        self.disk_target = disk_target
+        self.memory_reserve = memory_reserve * AdmissionController.MIB
+        self.max_wait = max_wait
+        self.total_memory = psutil.virtual_memory().total
+        self.delay = 0.0
+        self.deferred = 0
+        self._lock = threading.Lock()
+        # (until, bytes) of recently admitted launches
+        self._reserved = []
+
+        # prime the counters, the first sample is measured from here
+        psutil.cpu_percent(None)
+        self._disk_bytes = self._read_disk_bytes()
+        self._sampled = time.monotonic()
+
+    def _read_disk_bytes(self) -> typing.Optional[int]:
+        counters = self.psutil.disk_io_counters()
+        if counters is None:
+            return None
+        return counters.read_bytes + counters.write_bytes
+
+    def sample(self) -> typing.Tuple[float, float, float]:
+        """
+        Measures the load since the previous sample.
+
+        Returns:
+            tuple: System CPU percent, disk MiB per second and available bytes
+            minus the memory reserved for recent launches.
+        """
+        now = time.monotonic()
+        if now - self._sampled < AdmissionController.SAMPLE_WINDOW:
+            time.sleep(AdmissionController.SAMPLE_WINDOW - (now - self._sampled))
+            now = time.monotonic()
+        elapsed = now - self._sampled
+        cpu = self.psutil.cpu_percent(None)
+
+        disk_bytes = self._read_disk_bytes()
+        disk = 0.0
+        if disk_bytes is not None and self._disk_bytes is not None:
+            disk = (disk_bytes - self._disk_bytes) / elapsed / AdmissionController.MIB
+        self._disk_bytes = disk_bytes
+        self._sampled = now
+
+        self._reserved = [
+            (until, cost) for until, cost in self._reserved if until > now
+        ]
+        available = self.psutil.virtual_memory().available - sum(
+            cost for _, cost in self._reserved
+        )
+        return cpu, disk, available
+
+    def admit(
+        self,
+        name: str,
+        memory_cost: float = 0.0
+    ) -> typing.Optional[str]:
+        """
+        Waits until the machine has room for the next launch.
+
+        Args:
+            name: The application, for the messages.
+            memory_cost: Estimated bytes the application uses once started.
+
+        Returns:
+            str: Why the launch is refused, or `None` when it may go ahead.
+        """
+        if memory_cost > self.total_memory - self.memory_reserve:
+            return (
+                f"not enough memory, needs {memory_cost / self.MIB:.0f} MiB of "
+                f"{self.total_memory / self.MIB:.0f} MiB"
+            )
+
+        with self._lock, Tracer.span("admission", name=name) as span:
+            started = time.monotonic()
+            waited = False
+            while True:
+                if self.delay:
+                    time.sleep(self.delay)
+                cpu, disk, available = self.sample()
+                fits = available - memory_cost >= self.memory_reserve
+                busy = cpu > self.cpu_target or disk > self.disk_target
+
+                if fits and not busy:
+                    break
+                if time.monotonic() - started >= self.max_wait:
+                    if not fits:
+                        span.set(refused=True)
+                        return (
+                            f"not enough memory, needs {memory_cost / self.MIB:.0f} "
+                            f"MiB with {max(available, 0) / self.MIB:.0f} MiB "
+                            "available"
+                        )
+                    # busy for too long, the restore has to finish eventually
+                    break
+
+                if not waited:
+                    waited = True
+                    self.deferred += 1
+                self.delay = min(
+                    max(self.delay * 2, AdmissionController.MIN_DELAY),
+                    AdmissionController.MAX_DELAY
+                )
+
+            # speed back up once the machine is idle
+            if (
+                cpu < self.cpu_target * AdmissionController.IDLE_SHARE
+                and disk < self.disk_target * AdmissionController.IDLE_SHARE
+            ):
+                self.delay /= 2
+                if self.delay < AdmissionController.MIN_DELAY:
+                    self.delay = 0.0
+
+            if memory_cost:
+                self._reserved.append((
+                    time.monotonic() + AdmissionController.RESERVE_SECONDS,
+                    memory_cost
+                ))
+            span.set(cpu=cpu, disk=disk, waited=time.monotonic() - started)
+            return None
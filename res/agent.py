@@ -0,0 +1,271 @@
+"""
+Resident agent that keeps the process table, the compiled ignore rules and the session
+catalog warm, so the commands it serves answer in milliseconds instead of walking
+psutil and reading the data directory again.
+
+The agent listens on a localhost TCP port, which works on every Windows version
+without pywin32 for named pipes. The port and a random token are written to
+`agent.json` in the data directory, which only the user can read, and a request
+without the token is dropped.
+
+Every connection carries one request and one response, each a JSON line:-
+
+    -> {"version": 2, "token": "...", "argv": ["save", "--name", "work"],
+        "cwd": "C:\\Users\\matt", "env": {"PATH": "...", ...}}
+    <- {"accepted": true}
+    <- {"exit": 0, "output": "..."}
+
+The agent runs the command in the working directory and environment of the CLI, so
+executables are resolved against its PATH and restored applications start with them,
+as if the CLI had run the command itself.
+
+The acknowledgement comes straight away, the result once the command is done, which
+for a restore can take as long as its launches. `exit` is `AgentClient.FALLBACK` when
+the agent does not serve the command, e.g. a save that has to ask something, and the
+CLI then runs it in process.
+
+Only `socket` and `json` are imported here, the client runs before anything else.
+"""
+import contextlib
+import json
+import os
+import socket
+import typing
+
+
+def _read_line(
+    reader: typing.BinaryIO,
+    limit: int
+) -> bytes:
+    """
+    Reads one line from the buffered reader of a connection.
+
+    Raises:
+        ValueError: When the peer closed first or the line is longer than `limit`.
+    """
+    line = reader.readline(limit + 1)
+    if not line.endswith(b"\n"):
+        raise ValueError("line too long" if len(line) > limit else "connection closed")
+    return line
+
+
+def _send_line(
+    conn: socket.socket,
+    message: dict
+) -> None:
+    conn.sendall(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+
+
+class AgentClient:
+    """
+    Forwards a command line to the running agent.
+    """
+
+    VERSION = 2
+    HOST = "127.0.0.1"
+    # exit code of a command the agent leaves to the CLI, EX_TEMPFAIL
+    FALLBACK = 75
+    # a live agent on localhost accepts well within this
+    CONNECT_TIMEOUT = 0.5
+    MAX_RESPONSE = 64 * 1024 * 1024
+
+    @staticmethod
+    def request(
+        info_path: str,
+        argv: typing.List[str]
+    ) -> typing.Optional[dict]:
+        """
+        Runs a command line in the agent.
+
+        Args:
+            info_path: The `agent.json` the agent published.
+            argv: The command line, without the program.
+
+        Returns:
+            dict: The `exit` code and the `output` of the command, or `None` when no
+            agent answered.
+        """
+        try:
+            with open(info_path, "r") as f:
+                info = json.load(f)
+            with socket.create_connection(
+                (AgentClient.HOST, info["port"]),
+                timeout=AgentClient.CONNECT_TIMEOUT
+            ) as conn, conn.makefile("rb") as reader:
+                _send_line(conn, {
+                    "version": AgentClient.VERSION,
+                    "token": info["token"],
+                    "argv": list(argv),
+                    "cwd": os.getcwd(),
+                    "env": dict(os.environ)
+                })
+                # anything that took the port since the agent died stays silent
+                if not json.loads(_read_line(reader, 1024)).get("accepted"):
+                    return None
+                conn.settimeout(None)
+                response = json.loads(_read_line(reader, AgentClient.MAX_RESPONSE))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+        if (
+            not isinstance(response, dict)
+            or not isinstance(response.get("exit"), int)
+            or not isinstance(response.get("output"), str)
+        ):
+            return None
+        return response
+
+
+class AgentServer:
+    """
+    The listening side, serving one connection at a time between watch polls.
+    """
+
+    FILENAME = "agent.json"
+    MAX_REQUEST = 64 * 1024
+    # a client that connected has its request sent within this
+    REQUEST_TIMEOUT = 2.0
+    BACKLOG = 8
+
+    def __init__(
+        self,
+        info_path: str,
+        started: float
+    ) -> None:
+        """
+        Args:
+            info_path: Where the port and token are published.
+            started: Create time of the agent process, tells a live agent from a
+            reused pid.
+        """
+        import secrets
+
+        self.info_path = info_path
+        self.started = started
+        self.token = secrets.token_hex(16)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind((AgentClient.HOST, 0))
+        self.socket.listen(AgentServer.BACKLOG)
+        self.port = self.socket.getsockname()[1]
+        self.requests = 0
+        # seconds spent serving requests
+        self.busy = 0.0
+
+    def publish(self) -> None:
+        temp_path = self.info_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {
+                    "version": AgentClient.VERSION,
+                    "pid": os.getpid(),
+                    "started": self.started,
+                    "port": self.port,
+                    "token": self.token
+                },
+                f
+            )
+        os.replace(temp_path, self.info_path)
+
+    def close(self) -> None:
+        self.socket.close()
+        try:
+            with open(self.info_path, "r") as f:
+                ours = json.load(f).get("token") == self.token
+        except (OSError, ValueError):
+            return
+        # a second agent may have published since
+        if ours:
+            os.remove(self.info_path)
+
+    def accept(
+        self,
+        timeout: float
+    ) -> typing.Optional[typing.Tuple[socket.socket, typing.List[str], dict]]:
+        """
+        Waits for the next request.
+
+        Args:
+            timeout: Seconds to wait, the watch polls when nothing came.
+
+        Returns:
+            tuple: The connection to reply on, the command line and the request
+            with the `cwd` and `env` of the CLI, or `None` on timeout or an invalid
+            request.
+        """
+        import hmac
+
+        self.socket.settimeout(timeout)
+        try:
+            conn, _ = self.socket.accept()
+        except socket.timeout:
+            return None
+
+        try:
+            conn.settimeout(AgentServer.REQUEST_TIMEOUT)
+            with conn.makefile("rb") as reader:
+                request = json.loads(_read_line(reader, AgentServer.MAX_REQUEST))
+            argv = request["argv"]
+            if (
+                not hmac.compare_digest(str(request["token"]), self.token)
+                or not isinstance(argv, list)
+                or not all(isinstance(arg, str) for arg in argv)
+            ):
+                raise ValueError("invalid request")
+            # a client of another version runs the command itself
+            if request.get("version") != AgentClient.VERSION or not (
+                isinstance(request.get("cwd"), str)
+                and isinstance(request.get("env"), dict)
+                and all(
+                    isinstance(name, str) and isinstance(value, str)
+                    for name, value in request["env"].items()
+                )
+            ):
+                _send_line(conn, {"accepted": True})
+                self.reply(conn, AgentClient.FALLBACK, "")
+                return None
+            _send_line(conn, {"accepted": True})
+        except (OSError, ValueError, KeyError, TypeError):
+            conn.close()
+            return None
+
+        conn.settimeout(None)
+        return conn, argv, request
+
+    @staticmethod
+    @contextlib.contextmanager
+    def caller_context(
+        cwd: str,
+        env: typing.Dict[str, str]
+    ) -> typing.Iterator[None]:
+        """
+        Runs a request in the working directory and environment of the CLI that
+        sent it, and puts back the agent's own afterwards.
+
+        Raises:
+            OSError: When the working directory does not exist for the agent.
+        """
+        agent_cwd = os.getcwd()
+        agent_env = dict(os.environ)
+        os.chdir(cwd)
+        try:
+            os.environ.clear()
+            os.environ.update(env)
+            yield
+        finally:
+            os.environ.clear()
+            os.environ.update(agent_env)
+            os.chdir(agent_cwd)
+
+    def reply(
+        self,
+        conn: socket.socket,
+        exit_code: int,
+        output: str
+    ) -> None:
+        try:
+            _send_line(conn, {"exit": exit_code, "output": output})
+        except OSError:
+            # the client gave up, e.g. Ctrl+C
+            pass
+        finally:
+            conn.close()
@@ -0,0 +1,223 @@
+"""
+Canonical command lines, so that cosmetic differences between two runs of the same
+application do not make it two applications.
+
+Arguments are stripped with the per-application profiles of `res/argv_profiles.py`.
+The canonical key of a command line is its case folded executable path followed by
+the kept arguments, normalized the same way. Keys are indexed in an `ArgvTrie`, where
+a duplicate collapses on insert and "any process of this executable" is a prefix
+lookup.
+"""
+import fnmatch
+import os
+import re
+import typing
+
+from res.argv_profiles import ARGV_PROFILES, VOLATILE_ARGS
+from res.session_format import PersistApplicationType
+
+
+class ArgvTrie:
+    """
+    Trie of canonical keys, one level per key part.
+    """
+
+    # a key ends at the node that holds a value under this, parts are strings
+    _END = None
+
+    def __init__(self) -> None:
+        self.root = {}
+        self.size = 0
+
+    def insert(
+        self,
+        key: typing.Sequence[str],
+        value: typing.Any = True
+    ) -> typing.Any:
+        """
+        Adds a key unless it is already there.
+
+        Returns:
+            The value of the key already there, or `None` when it was added.
+        """
+        node = self.root
+        for part in key:
+            node = node.setdefault(part, {})
+        if ArgvTrie._END in node:
+            return node[ArgvTrie._END]
+        node[ArgvTrie._END] = value
+        self.size += 1
+        return None
+
+    def _find(
+        self,
+        key: typing.Sequence[str]
+    ) -> typing.Optional[dict]:
+        node = self.root
+        for part in key:
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def __contains__(
+        self,
+        key: typing.Sequence[str]
+    ) -> bool:
+        node = self._find(key)
+        return node is not None and ArgvTrie._END in node
+
+    def __len__(self) -> int:
+        return self.size
+
+    def has_prefix(
+        self,
+        prefix: typing.Sequence[str]
+    ) -> bool:
+        """
+        Whether any key starts with `prefix`.
+        """
+        return self._find(prefix) is not None
+
+
+class ArgvCanonicalizer:
+    """
+    Strips the volatile arguments of command lines and builds their canonical keys.
+    """
+
+    GUID = re.compile(
+        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}",
+        re.IGNORECASE
+    )
+
+    def __init__(
+        self,
+        profiles: typing.Dict[str, dict] = ARGV_PROFILES,
+        volatile: dict = VOLATILE_ARGS
+    ) -> None:
+        self.profiles = profiles
+        self.volatile = volatile
+        # executable name -> (drop regex, drop_value flags, keep args), on first use
+        self._compiled = {}
+        self.temp_dirs = tuple(
+            ArgvCanonicalizer.normalize(path).rstrip("/") + "/"
+            for path in {os.environ.get("TEMP"), os.environ.get("TMP")}
+            if path
+        )
+
+    @staticmethod
+    def normalize(
+        text: str
+    ) -> str:
+        return text.strip('"').replace("\\", "/").casefold()
+
+    def _profile(
+        self,
+        exe: str
+    ) -> typing.Tuple[typing.Pattern, typing.FrozenSet[str], bool]:
+        name = PersistApplicationType.name_from_cmdline([exe]).casefold()
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            profile = self.profiles.get(name, {})
+            drop = self.volatile["drop"] + tuple(profile.get("drop", ()))
+            drop_value = self.volatile["drop_value"] + tuple(
+                profile.get("drop_value", ())
+            )
+            compiled = (
+                re.compile(
+                    "|".join(f"(?:{fnmatch.translate(glob)})" for glob in drop),
+                    re.IGNORECASE
+                ),
+                frozenset(flag.casefold() for flag in drop_value),
+                profile.get("args", True)
+            )
+            self._compiled[name] = compiled
+        return compiled
+
+    def strip(
+        self,
+        exe: str,
+        args: typing.Sequence[str]
+    ) -> typing.List[str]:
+        """
+        Drops the volatile arguments of a command line.
+
+        Args:
+            exe: The executable, picks the profile.
+            args: The arguments after it.
+
+        Returns:
+            list: The kept arguments, unchanged.
+        """
+        drop, drop_value, keep_args = self._profile(exe)
+        if not keep_args:
+            return []
+
+        kept = []
+        skip_next = False
+        for arg in args:
+            if skip_next:
+                skip_next = False
+                continue
+            if arg.casefold() in drop_value:
+                skip_next = True
+                continue
+            if drop.match(arg) or ArgvCanonicalizer.GUID.search(arg):
+                continue
+            if self.temp_dirs and ArgvCanonicalizer.normalize(arg).startswith(
+                self.temp_dirs
+            ):
+                continue
+            kept.append(arg)
+        return kept
+
+    def key(
+        self,
+        cmdline: typing.Union[str, typing.Sequence[str]]
+    ) -> typing.Tuple[str, ...]:
+        """
+        The canonical key of a command line.
+
+        A raw legacy command line is not split, its arguments are one part.
+        """
+        exe = PersistApplicationType.exe_from_cmdline(cmdline)
+        if isinstance(cmdline, str):
+            cmdline = cmdline.strip()
+            # past the quotes around the executable
+            start = len(exe) + 2 if cmdline.startswith('"') else len(exe)
+            rest = ArgvCanonicalizer.normalize(cmdline[start:].strip())
+            return (ArgvCanonicalizer.normalize(exe),) + ((rest,) if rest else ())
+        return ArgvCanonicalizer.key_of(exe, self.strip(exe, cmdline[1:]))
+
+    @staticmethod
+    def key_of(
+        exe: str,
+        kept: typing.Sequence[str]
+    ) -> typing.Tuple[str, ...]:
+        """
+        The canonical key of an executable and arguments already stripped.
+        """
+        return (ArgvCanonicalizer.normalize(exe),) + tuple(
+            ArgvCanonicalizer.normalize(arg) for arg in kept
+        )
+
+    def dedupe(
+        self,
+        items: typing.Iterable[typing.Any],
+        cmdline_of: typing.Callable[[typing.Any], typing.Union[str, typing.List[str]]]
+    ) -> typing.Tuple[typing.List[typing.Any], typing.List[typing.Any]]:
+        """
+        Keeps the first of the items whose command lines have the same key.
+
+        Returns:
+            tuple: The kept items and the dropped duplicates, both in order.
+        """
+        trie = ArgvTrie()
+        kept = []
+        dropped = []
+        for item in items:
+            if trie.insert(self.key(cmdline_of(item)), item) is None:
+                kept.append(item)
+            else:
+                dropped.append(item)
+        return kept, dropped
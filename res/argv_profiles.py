@@ -0,0 +1,80 @@
+"""
+Arguments that change from run to run without changing what is started, dropped from
+saved command lines so that the same application saved twice is one entry.
+
+`VOLATILE_ARGS` applies to every application. `ARGV_PROFILES` adds to it per
+application, keyed by its executable name, lower case:-
+
+* `drop`: case-insensitive globs matched against the whole argument.
+* `drop_value`: flags whose value is the next argument, both are dropped.
+* `args`: False when no argument of the application is worth keeping, e.g. one that
+  the shell starts through a URI.
+
+Arguments holding a GUID or a path in the temp directory are always dropped.
+"""
+# chromium and electron internals, the browser process is started without them
+CHROMIUM = {
+    "drop": (
+        "--flag-switches-begin",
+        "--flag-switches-end",
+        "--no-startup-window",
+        "--win-session-start",
+        "--from-installer",
+        "--restore-last-session",
+    ),
+}
+
+VOLATILE_ARGS = {
+    "drop": (
+        "--type=*",
+        "--field-trial-handle=*",
+        "--*client-id=*",
+        "--mojo-platform-channel-handle=*",
+        "--launch-time-ticks=*",
+        "--crashpad-handler-pid=*",
+        "--remote-debugging-port=*",
+        "--inspect=*",
+        "--inspect-brk=*",
+        "--enable-crash-reporter*",
+        "--squirrel-*",
+        "-psn_*",
+    ),
+    "drop_value": (
+        "--port",
+        "-port",
+        "--pid",
+        "-pid",
+        "--parent-pid",
+        "--remote-debugging-port",
+    ),
+}
+
+ARGV_PROFILES = {
+    # browsers, pages are restored by the browser itself
+    "chrome.exe": CHROMIUM,
+    "msedge.exe": CHROMIUM,
+    "brave.exe": CHROMIUM,
+    "vivaldi.exe": CHROMIUM,
+    "opera.exe": CHROMIUM,
+    "firefox.exe": {
+        "drop": ("-osint",),
+        # a link opened from another application
+        "drop_value": ("-url",),
+    },
+    # electron apps
+    "code.exe": CHROMIUM,
+    "slack.exe": {
+        "drop": ("--startup", "--process-start-args*"),
+    },
+    "discord.exe": {
+        "drop": ("--processstart*", "--url=*"),
+        "drop_value": ("--url",),
+    },
+    "spotify.exe": {
+        "drop": ("--autostart", "--minimized", "--uri=*"),
+    },
+    "obsidian.exe": CHROMIUM,
+    # started by the shell with a protocol URI
+    "ms-teams.exe": {"args": False},
+    "olk.exe": {"args": False},
+}
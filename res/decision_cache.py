@@ -0,0 +1,141 @@
+"""
+Persistent cache of the save / omit answers given for applications, so that later
+saves only prompt for applications that were never answered before.
+"""
+import collections
+import hashlib
+import json
+import os
+import time
+import typing
+
+
+class DecisionCache:
+    """
+    LRU cache of decisions keyed by executable path and an argv fingerprint.
+
+    Entries older than `max_age` seconds are dropped, and the least recently used
+    ones are evicted once there are more than `max_entries`.
+    """
+
+    FILENAME = "decisions.json"
+    MAX_ENTRIES = 2000
+    MAX_AGE = 90 * 24 * 60 * 60
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = MAX_ENTRIES,
+        max_age: float = MAX_AGE
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # key -> (decision, last used), least recently used first
+        self._entries = collections.OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    for key, decision, last_used in json.load(f):
+                        self._entries[key] = (decision, last_used)
+            except (OSError, ValueError) as load_err:
+                print(f"Ignoring unreadable decision cache: {load_err}")
+                self._entries.clear()
+
+    @staticmethod
+    def key(
+        path: str,
+        argv: typing.Optional[typing.List[typing.List[str]]] = None
+    ) -> str:
+        """
+        Builds the cache key of an application.
+
+        Args:
+            path: The executable path, normalized to case folded forward slashes.
+            argv: The canonical arguments after the executable of each of its
+            processes, fingerprinted in any order. An application started without
+            arguments keeps the key of its path alone.
+
+        Returns:
+            str: The key.
+        """
+        normalized = path.strip('"').replace("\\", "/").casefold()
+        fingerprint = hashlib.sha1(
+            json.dumps(sorted(args for args in argv or [] if args)).encode("utf-8")
+        ).hexdigest()[:12]
+        return f"{normalized}|{fingerprint}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        key: str
+    ) -> typing.Optional[bool]:
+        """
+        Gets a remembered decision, or `None` when it must be asked.
+        """
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[1] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[key] = (entry[0], time.time())
+        self._entries.move_to_end(key)
+        self._dirty = True
+        return entry[0]
+
+    def put(
+        self,
+        key: str,
+        decision: bool
+    ) -> None:
+        self._entries[key] = (decision, time.time())
+        self._entries.move_to_end(key)
+        self._dirty = True
+
+    def evict(self) -> int:
+        """
+        Drops expired entries, then the least recently used over the size cap.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        evicted = 0
+        oldest_allowed = time.time() - self.max_age
+        for key in [
+            key for key, (_, last_used) in self._entries.items()
+            if last_used < oldest_allowed
+        ]:
+            del self._entries[key]
+            evicted += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self._dirty = True
+        return evicted
+
+    def save(self) -> None:
+        """
+        Writes the cache back when it changed.
+        """
+        self.evict()
+        if not self._dirty:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                [
+                    [key, decision, last_used]
+                    for key, (decision, last_used) in self._entries.items()
+                ],
+                f,
+                separators=(",", ":")
+            )
+        os.replace(temp_path, self.path)
+        self._dirty = False
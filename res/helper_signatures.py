@@ -0,0 +1,35 @@
+"""
+Helper processes that multi-process applications spawn under a different executable
+or with tell-tale arguments. They are folded into the application that started them.
+
+Keyed by the executable name of the root application, lower case. A descendant folds
+when its executable name is in `names` or one of its arguments starts with one of
+`args`. Descendants running the same executable as their parent always fold.
+"""
+# chromium and electron child processes are told their role with --type=
+CHROMIUM = {"args": ("--type=",), "names": ("chrome_crashpad_handler.exe",)}
+
+HELPER_SIGNATURES = {
+    # browsers
+    "chrome.exe": CHROMIUM,
+    "msedge.exe": {
+        "args": ("--type=",),
+        "names": ("msedge_crashpad_handler.exe", "identity_helper.exe")
+    },
+    "brave.exe": CHROMIUM,
+    "vivaldi.exe": CHROMIUM,
+    "opera.exe": {"args": ("--type=",), "names": ("opera_crashreporter.exe",)},
+    "firefox.exe": {
+        "args": ("-contentproc",),
+        "names": ("crashreporter.exe", "pingsender.exe", "plugin-container.exe")
+    },
+    # electron apps
+    "code.exe": {"args": ("--type=",), "names": ("rg.exe", "winpty-agent.exe")},
+    "slack.exe": CHROMIUM,
+    "discord.exe": CHROMIUM,
+    "spotify.exe": CHROMIUM,
+    "obsidian.exe": CHROMIUM,
+    # webview2 hosted apps
+    "ms-teams.exe": {"args": ("--type=",), "names": ("msedgewebview2.exe",)},
+    "olk.exe": {"args": ("--type=",), "names": ("msedgewebview2.exe",)},
+}
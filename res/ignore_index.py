@@ -0,0 +1,248 @@
+"""
+Ignore rules layered from several sources and compiled into one matcher that is
+cached on disk.
+
+The layers, in order:-
+
+* the built-in `IGNORE_LIST`
+* the user file, `my_ignore.txt` or `--myignore`
+* the file of the session being saved, `saved-sessions/ignore/<session>.txt`
+* `--ignore` rules from the command line
+
+A later layer can also take back a rule of an earlier one with `!rule`, e.g. a
+session that wants `Code.exe` after all lists `!Code.exe`.
+
+The cache remembers the mtime, size and hash of every source. When no mtime or size
+changed the compiled matcher is loaded straight from the cache. When one did, the
+source is hashed, and only a changed hash rebuilds the matcher.
+"""
+import hashlib
+import os
+import pickle
+import typing
+
+from res.ignore_matcher import IgnoreMatcher
+
+
+class IgnoreLayer:
+    """
+    One source of ignore rules, a file or rules given directly.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: typing.Optional[str] = None,
+        rules: typing.Optional[typing.List[str]] = None,
+        loader: typing.Optional[typing.Callable[[], typing.List[str]]] = None
+    ) -> None:
+        """
+        Args:
+            name: Shown in the summary.
+            path: A rules file, one rule per line. For a `loader` the file whose
+            mtime tells whether the rules changed.
+            rules: Rules given directly.
+            loader: Gets the rules, e.g. from a module.
+        """
+        self.name = name
+        self.path = path
+        self.rules = rules
+        self.loader = loader
+
+    @classmethod
+    def builtin(cls) -> "IgnoreLayer":
+        """
+        The `IGNORE_LIST` shipped in `res/ignored_process_list.py`.
+        """
+        def load_ignore_list() -> typing.List[str]:
+            from res.ignored_process_list import IGNORE_LIST
+
+            return IGNORE_LIST
+
+        return cls(
+            "built-in",
+            path=os.path.join(os.path.dirname(__file__), "ignored_process_list.py"),
+            loader=load_ignore_list
+        )
+
+    def stat(self) -> typing.Optional[typing.Tuple[int, int]]:
+        """
+        Gets the mtime and size of a file layer, `None` when it does not exist.
+        """
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self) -> typing.Tuple[typing.List[str], str]:
+        """
+        Reads the rules of the layer.
+
+        Returns:
+            tuple: The rules and the hash of the source.
+        """
+        if self.loader is not None:
+            text = "\n".join(self.loader())
+        elif self.rules is not None:
+            text = "\n".join(self.rules)
+        elif self.path is not None and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+        else:
+            text = ""
+        return text.splitlines(), hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class IgnoreIndex:
+    """
+    Builds or loads the compiled matcher of a list of layers.
+    """
+
+    FILENAME = "ignore_index.pickle"
+    # bump when the pickled IgnoreMatcher changes shape
+    VERSION = 2
+    NEGATE_PREFIX = "!"
+
+    def __init__(
+        self,
+        cache_path: str,
+        layers: typing.List[IgnoreLayer]
+    ) -> None:
+        self.cache_path = cache_path
+        self.layers = layers
+        # layer name -> number of rules it contributed
+        self.counts = {}
+        self.cached = False
+
+    def load(self) -> IgnoreMatcher:
+        """
+        Gets the matcher, from the cache when no layer changed.
+
+        Returns:
+            IgnoreMatcher: The compiled matcher of all layers.
+        """
+        stats = [layer.stat() for layer in self.layers]
+        cache = self._read_cache()
+
+        if cache is not None and len(cache["layers"]) == len(self.layers):
+            unchanged = True
+            hashes = []
+            for layer, stat, cached in zip(self.layers, stats, cache["layers"]):
+                if layer.name != cached["name"] or layer.path != cached["path"]:
+                    unchanged = False
+                    break
+                # inline rules have no mtime, and are short enough to always hash
+                if stat is not None and stat == cached["stat"]:
+                    hashes.append(cached["hash"])
+                    continue
+                layer_hash = layer.read()[1]
+                if layer_hash != cached["hash"]:
+                    unchanged = False
+                    break
+                hashes.append(layer_hash)
+
+            if unchanged:
+                self.counts = cache["counts"]
+                self.cached = True
+                if [cached["stat"] for cached in cache["layers"]] != stats:
+                    # touched but not changed, remember the new mtimes
+                    self._write_cache(cache["matcher"], stats, hashes)
+                return cache["matcher"]
+
+        return self.build(stats)
+
+    def build(
+        self,
+        stats: typing.Optional[list] = None
+    ) -> IgnoreMatcher:
+        """
+        Compiles the layers in order and writes the cache.
+        """
+        if stats is None:
+            stats = [layer.stat() for layer in self.layers]
+
+        # case folded rule -> rule, in the order the layers added them
+        rules = {}
+        hashes = []
+        self.counts = {}
+        for layer in self.layers:
+            layer_rules, layer_hash = layer.read()
+            hashes.append(layer_hash)
+            count = 0
+            for rule in layer_rules:
+                rule = rule.strip()
+                if not rule or rule.startswith("#"):
+                    continue
+                rule_err = IgnoreMatcher.rule_error(rule)
+                if rule_err is not None:
+                    print(
+                        f"Skipping invalid ignore rule {rule!r} of "
+                        f"{layer.path or layer.name}: {rule_err}"
+                    )
+                    continue
+                if rule.startswith(IgnoreIndex.NEGATE_PREFIX):
+                    negated = rule[len(IgnoreIndex.NEGATE_PREFIX):].strip()
+                    rules.pop(negated.casefold(), None)
+                else:
+                    rules.setdefault(rule.casefold(), rule)
+                count += 1
+            self.counts[layer.name] = count
+
+        matcher = IgnoreMatcher(rules.values())
+        self.cached = False
+        self._write_cache(matcher, stats, hashes)
+        return matcher
+
+    def _read_cache(self) -> typing.Optional[dict]:
+        try:
+            with open(self.cache_path, "rb") as f:
+                cache = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get("version") != IgnoreIndex.VERSION:
+            return None
+        return cache
+
+    def _write_cache(
+        self,
+        matcher: IgnoreMatcher,
+        stats: list,
+        hashes: typing.List[str]
+    ) -> None:
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                pickle.dump(
+                    {
+                        "version": IgnoreIndex.VERSION,
+                        "layers": [
+                            {
+                                "name": layer.name,
+                                "path": layer.path,
+                                "stat": stat,
+                                "hash": layer_hash
+                            }
+                            for layer, stat, layer_hash in zip(
+                                self.layers,
+                                stats,
+                                hashes
+                            )
+                        ],
+                        "counts": self.counts,
+                        "matcher": matcher
+                    },
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(temp_path, self.cache_path)
+        except OSError as write_err:
+            print(f"Could not cache the ignore rules: {write_err}")
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{count} {name}" for name, count in self.counts.items()
+        ) + (" (cached)" if self.cached else "")
@@ -0,0 +1,238 @@
+"""
+Compiled ignore matcher, built once from `IGNORE_LIST` plus the user rules.
+
+A rule is one of:-
+
+* a bare executable name, e.g. `svchost.exe`, matched case-insensitively with a
+  single hash lookup.
+* a full executable path, e.g. `C:\\Tools\\foo.exe`, also one hash lookup.
+* a directory ending in a separator, e.g. `C:\\Windows\\System32\\`, which ignores
+  everything below it through a path-prefix trie.
+* a glob, e.g. `*Helper*.exe`, matched against the name, or against the full path
+  when the glob contains a separator.
+* a regex prefixed with `re:`, searched in the full executable path. The path is
+  case folded and uses forward slashes, e.g. `re:/jetbrains/.*64\\.exe$`.
+
+All globs and regexes are compiled into one combined pattern per target. A regex
+that does not compile is reported and skipped, so it cannot break the others.
+"""
+import fnmatch
+import re
+import typing
+
+
+class IgnoreMatcher:
+    """
+    Classifies processes against the ignore rules in roughly one lookup each.
+    """
+
+    GLOB_CHARS = "*?["
+    REGEX_PREFIX = "re:"
+    SEPARATORS = ("\\", "/")
+
+    # trie key marking the end of an ignored directory
+    _TERMINAL = None
+
+    def __init__(
+        self,
+        rules: typing.Iterable[str] = ()
+    ) -> None:
+        self.rules = []
+        self._names = set()
+        self._paths = set()
+        self._prefix_trie = {}
+        self._name_patterns = []
+        self._path_patterns = []
+        self._name_regex = None
+        self._path_regex = None
+        self.add_rules(rules)
+
+    @staticmethod
+    def normalize(
+        value: str
+    ) -> str:
+        """
+        Case folds a name or path and uses forward slashes throughout.
+        """
+        return value.replace("\\", "/").casefold()
+
+    @staticmethod
+    def basename(
+        path: str
+    ) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    @staticmethod
+    def rule_error(
+        rule: str
+    ) -> typing.Optional[str]:
+        """
+        Checks a rule before it is added.
+
+        Returns:
+            str: Why the rule is invalid, `None` when it is valid.
+        """
+        rule = rule.strip()
+        if not rule.startswith(IgnoreMatcher.REGEX_PREFIX):
+            return None
+        try:
+            # alone, and as it is embedded in the combined pattern
+            re.compile(rule[len(IgnoreMatcher.REGEX_PREFIX):])
+            re.compile(
+                IgnoreMatcher._regex_pattern(rule),
+                re.IGNORECASE
+            )
+        except re.error as regex_err:
+            return regex_err.msg
+        return None
+
+    @staticmethod
+    def _regex_pattern(
+        rule: str
+    ) -> str:
+        # searched in the path, not matched from its start
+        return ".*?(?:" + rule[len(IgnoreMatcher.REGEX_PREFIX):] + ")"
+
+    def add_rules(
+        self,
+        rules: typing.Iterable[str]
+    ) -> int:
+        """
+        Adds rules and recompiles the combined patterns once.
+
+        Args:
+            rules: The rules to add, blank lines and `#` comments are skipped, and
+            invalid rules reported and skipped.
+
+        Returns:
+            int: The number of rules that were new.
+        """
+        added = 0
+        for rule in rules:
+            if self._add_rule(rule):
+                added += 1
+        if added:
+            self._compile()
+        return added
+
+    def _add_rule(
+        self,
+        rule: str
+    ) -> bool:
+        rule = rule.strip()
+        if not rule or rule.startswith("#") or rule in self.rules:
+            return False
+
+        rule_err = IgnoreMatcher.rule_error(rule)
+        if rule_err is not None:
+            print(f"Skipping invalid ignore rule {rule!r}: {rule_err}")
+            return False
+
+        self.rules.append(rule)
+
+        if rule.startswith(IgnoreMatcher.REGEX_PREFIX):
+            self._path_patterns.append(IgnoreMatcher._regex_pattern(rule))
+            return True
+
+        normalized = IgnoreMatcher.normalize(rule)
+
+        if any(char in rule for char in IgnoreMatcher.GLOB_CHARS):
+            if "/" in normalized:
+                self._path_patterns.append(fnmatch.translate(normalized))
+            else:
+                self._name_patterns.append(fnmatch.translate(normalized))
+        elif rule.endswith(IgnoreMatcher.SEPARATORS):
+            node = self._prefix_trie
+            for part in normalized.rstrip("/").split("/"):
+                node = node.setdefault(part, {})
+            node[IgnoreMatcher._TERMINAL] = True
+        elif "/" in normalized:
+            self._paths.add(normalized)
+        else:
+            self._names.add(normalized)
+
+        return True
+
+    def _compile(self) -> None:
+        self._name_regex = IgnoreMatcher._combine(self._name_patterns)
+        self._path_regex = IgnoreMatcher._combine(self._path_patterns)
+
+    @staticmethod
+    def _combine(
+        patterns: typing.List[str]
+    ) -> typing.Optional[typing.Pattern]:
+        if not patterns:
+            return None
+        return re.compile(
+            "|".join(f"(?:{pattern})" for pattern in patterns),
+            re.IGNORECASE
+        )
+
+    def _in_prefix_trie(
+        self,
+        path: str
+    ) -> bool:
+        node = self._prefix_trie
+        if not node:
+            return False
+        for part in path.split("/")[:-1]:
+            node = node.get(part)
+            if node is None:
+                return False
+            if IgnoreMatcher._TERMINAL in node:
+                return True
+        return False
+
+    def matches(
+        self,
+        name: typing.Optional[str],
+        exe: typing.Optional[str] = None
+    ) -> bool:
+        """
+        Checks whether a process is ignored.
+
+        Args:
+            name: The process name as reported by psutil.
+            exe: The executable path when known, otherwise `None`.
+
+        Returns:
+            bool: True when any rule ignores the process.
+        """
+        name = IgnoreMatcher.normalize(name) if name else ""
+        path = IgnoreMatcher.normalize(exe) if exe else ""
+        exe_name = IgnoreMatcher.basename(path) if path else ""
+
+        if name in self._names or exe_name in self._names or path in self._paths:
+            return True
+
+        if path and self._in_prefix_trie(path):
+            return True
+
+        if self._name_regex is not None and (
+            self._name_regex.match(name) or self._name_regex.match(exe_name)
+        ):
+            return True
+
+        if self._path_regex is not None and self._path_regex.match(path or name):
+            return True
+
+        return False
+
+    def classify(
+        self,
+        processes: typing.Iterable[dict]
+    ) -> typing.Tuple[typing.List[dict], typing.List[dict]]:
+        """
+        Splits psutil info dicts into kept and ignored processes.
+
+        Returns:
+            tuple: The kept and the ignored processes.
+        """
+        kept = []
+        ignored = []
+        for process in processes:
+            if self.matches(process.get("name"), process.get("exe")):
+                ignored.append(process)
+            else:
+                kept.append(process)
+        return kept, ignored
@@ -6,7 +6,7 @@ IGNORE_LIST = [
     # This process is used by Windows to host application frames.
     "ApplicationFrameHost.exe",
     # not sure
-    "audiodg.exe"
+    "audiodg.exe",
     #  This is a process that is used by the Visual Studio Code editor.
     "Code.exe",
     # todo(matt): could be WSLv2 I dont use it
@@ -22,7 +22,7 @@ IGNORE_LIST = [
     # This is a process that is used by the Microsoft Defender Application Guard.
     "dasHost.exe",
     #
-    "DataExchangeHost.exe"
+    "DataExchangeHost.exe",
     # This is a process that is used by Windows to host dynamic-link libraries (DLLs).
     "dllhost.exe",
     #  This is a process that is used by Windows
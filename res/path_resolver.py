@@ -0,0 +1,254 @@
+"""
+Resolves the executable of every restore entry up front, so a missing or moved
+application is reported before anything is launched instead of when its launch fails.
+
+An executable saved as a bare name is looked up on the PATH, like `CreateProcess`
+does, and then in the App Paths of the registry, like the Run dialog does. A relative
+path is taken from the working directory of the entry. The resolved file must exist
+and be executable.
+
+Resolutions are cached in `path_cache.json` in the data directory, keyed on the
+executable as saved and what its lookup depends on, together with the mtime of the
+resolved file. A warm restore only stats each resolved file, and runs no PATH or
+registry lookup.
+"""
+import hashlib
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import typing
+
+from res.session_format import PersistApplicationType
+from res.tracer import Tracer
+
+if typing.TYPE_CHECKING:
+    from res.restore_engine import LaunchEntry
+
+
+class PathResolver:
+    """
+    Resolves and validates the executables of launch entries, with a stat cache.
+    """
+
+    FILENAME = "path_cache.json"
+    VERSION = 1
+    # lookups run on this many threads, they mostly wait on the disk
+    JOBS = 8
+    APP_PATHS_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths"
+    DEFAULT_PATHEXT = ".COM;.EXE;.BAT;.CMD"
+
+    def __init__(
+        self,
+        cache_path: str
+    ) -> None:
+        self.cache_path = cache_path
+        # key -> {"path": resolved path, "mtime": st_mtime_ns}
+        self.cache = {}
+        self.hits = 0
+        self.changed = False
+
+        try:
+            with open(cache_path, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == PathResolver.VERSION:
+                self.cache = cache["entries"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    @staticmethod
+    def cache_key(
+        entry: "LaunchEntry"
+    ) -> str:
+        """
+        The executable as saved, with the directory or PATH its lookup depends on.
+        """
+        exe = PersistApplicationType.exe_from_cmdline(entry.cmdline).strip('"')
+        if os.path.isabs(exe):
+            return exe
+        if os.path.dirname(exe):
+            return f"{exe}|{entry.cwd or os.getcwd()}"
+        path_env = PathResolver._path_env(entry)
+        return f"{exe}|{hashlib.sha1(path_env.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _path_env(
+        entry: "LaunchEntry"
+    ) -> str:
+        if entry.env and "PATH" in entry.env:
+            return entry.env["PATH"]
+        return os.environ.get("PATH", "")
+
+    @staticmethod
+    def _app_path(
+        name: str
+    ) -> typing.Optional[str]:
+        """
+        Looks a program up in the App Paths of the registry, Windows only.
+        """
+        if sys.platform != "win32":
+            return None
+        import winreg
+
+        if not os.path.splitext(name)[1]:
+            name += ".exe"
+        for hive in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                with winreg.OpenKey(
+                    hive,
+                    f"{PathResolver.APP_PATHS_KEY}\\{name}"
+                ) as key:
+                    value, _ = winreg.QueryValueEx(key, None)
+            except OSError:
+                continue
+            if value:
+                return os.path.expandvars(value.strip('"'))
+        return None
+
+    @staticmethod
+    def _is_executable(
+        path: str
+    ) -> bool:
+        if not os.path.isfile(path):
+            return False
+        if sys.platform == "win32":
+            # every file passes os.access there
+            extensions = os.environ.get("PATHEXT", PathResolver.DEFAULT_PATHEXT)
+            return os.path.splitext(path)[1].upper() in extensions.upper().split(";")
+        return os.access(path, os.X_OK)
+
+    @staticmethod
+    def lookup(
+        entry: "LaunchEntry"
+    ) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+        """
+        Resolves the executable of an entry without the cache.
+
+        Returns:
+            tuple: The absolute executable path and `None`, or `None` and why it
+            cannot be launched.
+        """
+        exe = PersistApplicationType.exe_from_cmdline(entry.cmdline).strip('"')
+        if not exe:
+            return None, "no executable"
+
+        if os.path.isabs(exe):
+            candidates = [exe]
+        elif os.path.dirname(exe):
+            candidates = [os.path.join(entry.cwd or os.getcwd(), exe)]
+        else:
+            candidates = [
+                candidate for candidate in (
+                    shutil.which(exe, path=PathResolver._path_env(entry)),
+                    PathResolver._app_path(exe)
+                )
+                if candidate
+            ]
+            if not candidates:
+                return None, f"{exe} is not on the PATH or in App Paths"
+
+        for candidate in candidates:
+            if PathResolver._is_executable(candidate):
+                return os.path.abspath(candidate), None
+        if not os.path.exists(candidates[0]):
+            return None, f"{candidates[0]} does not exist"
+        return None, f"{candidates[0]} is not executable"
+
+    def _cached(
+        self,
+        key: str
+    ) -> typing.Optional[str]:
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        try:
+            mtime = os.stat(cached["path"]).st_mtime_ns
+        except OSError:
+            return None
+        return cached["path"] if mtime == cached["mtime"] else None
+
+    def resolve(
+        self,
+        entries: typing.List["LaunchEntry"]
+    ) -> typing.List[typing.Tuple["LaunchEntry", str]]:
+        """
+        Sets `executable` of every entry that resolves and `invalid` of the others.
+
+        Entries the cache does not know are looked up in parallel.
+
+        Returns:
+            list: The invalid entries and why, in entry order.
+        """
+        misses = []
+        # key -> cached executable, each file is stat'ed once
+        checked = {}
+        for entry in entries:
+            key = PathResolver.cache_key(entry)
+            if key not in checked:
+                checked[key] = self._cached(key)
+            executable = checked[key]
+            if executable is None:
+                misses.append((entry, key))
+            else:
+                entry.executable = executable
+                self.hits += 1
+
+        if misses:
+            # entries of the same executable are looked up once
+            todo = queue.SimpleQueue()
+            for key, entry in {key: entry for entry, key in misses}.items():
+                todo.put((entry, key))
+            found = {}
+
+            def worker() -> None:
+                while True:
+                    try:
+                        entry, key = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    with Tracer.span("lookup", name=entry.name):
+                        found[key] = PathResolver.lookup(entry)
+
+            workers = [
+                threading.Thread(target=worker, daemon=True)
+                for _ in range(min(PathResolver.JOBS, todo.qsize()))
+            ]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+            for entry, key in misses:
+                executable, error = found[key]
+                if executable is None:
+                    # looked up again next time, it may have been fixed since
+                    entry.invalid = error
+                    if self.cache.pop(key, None) is not None:
+                        self.changed = True
+                    continue
+                entry.executable = executable
+                try:
+                    mtime = os.stat(executable).st_mtime_ns
+                except OSError:
+                    continue
+                self.cache[key] = {"path": executable, "mtime": mtime}
+                self.changed = True
+
+        return [(entry, entry.invalid) for entry in entries if entry.invalid]
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(
+                    {"version": PathResolver.VERSION, "entries": self.cache},
+                    f,
+                    separators=(",", ":")
+                )
+            os.replace(temp_path, self.cache_path)
+        except OSError as write_err:
+            print(f"Could not cache the resolved paths: {write_err}")
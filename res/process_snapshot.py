@@ -0,0 +1,615 @@
+"""
+A single pass snapshot of the process table that is shared by every stage of one
+invocation, so that the guard, the filter and the prompts never walk psutil again.
+
+The process table is walked in two passes. The first one only fetches what is cheap
+for every process, the pid, parent, name and executable, which is all the ignore
+rules and the folding of helpers need. The costly attributes, e.g. the command line,
+are fetched by a `ProcessRow` the first time they are read, so only for the
+processes that survived the filter, and kept per pid and create time.
+
+Rows are slotted `ProcessRow` records rather than dicts, with the executable paths,
+names and users that repeat across processes interned. A snapshot can also be held
+as `SnapshotColumns`, one array or list per field, for bulk operations on big
+tables.
+
+A snapshot can also be recorded to a compact file and replayed later in place of the
+live process table, e.g. to profile a user's workstation on a build box. Replaying
+does not need psutil.
+"""
+import array
+import gzip
+import json
+import math
+import os
+import sys
+import time
+import typing
+
+from res.tracer import Tracer
+
+if typing.TYPE_CHECKING:
+    from res.process_tree import ProcessTree
+
+
+# a field of a live row that is fetched on first read
+_UNFETCHED = object()
+
+
+def _intern(
+    value: typing.Any
+) -> typing.Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_cmdline(
+    cmdline: typing.Optional[typing.List[str]]
+) -> typing.Optional[typing.List[str]]:
+    # the executable repeats across helpers, the arguments mostly do not
+    if cmdline:
+        cmdline[0] = _intern(cmdline[0])
+    return cmdline
+
+
+class ProcessRow:
+    """
+    One process of a snapshot, read like the psutil `info` dict it replaces, e.g.
+    `row["cmdline"]` or `row.get("exe")`.
+
+    A live row fetches the fields it was taken without from its process the first
+    time they are read, and the other `ProcessSnapshot.LAZY_ATTRS` every time
+    through `ProcessSnapshot.DETAILS`.
+    """
+
+    FIELDS = (
+        "pid", "ppid", "name", "exe", "cmdline", "username", "create_time", "cpu",
+        "memory"
+    )
+    __slots__ = FIELDS + ("process",)
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(
+        self,
+        pid: int,
+        ppid: typing.Optional[int] = None,
+        name: typing.Optional[str] = None,
+        exe: typing.Optional[str] = None,
+        cmdline: typing.Optional[typing.List[str]] = None,
+        username: typing.Optional[str] = None,
+        create_time: typing.Optional[float] = None,
+        cpu: typing.Optional[float] = None,
+        memory: typing.Optional[int] = None,
+        process: typing.Any = None
+    ) -> None:
+        self.pid = pid
+        self.ppid = ppid
+        self.name = _intern(name)
+        self.exe = _intern(exe)
+        self.cmdline = (
+            cmdline if cmdline is _UNFETCHED else _intern_cmdline(cmdline)
+        )
+        self.username = _intern(username)
+        self.create_time = create_time
+        self.cpu = cpu
+        self.memory = memory
+        # the psutil.Process of a live row
+        self.process = process
+
+    @classmethod
+    def from_info(
+        cls,
+        info: typing.Dict[str, typing.Any],
+        process: typing.Any = None
+    ) -> "ProcessRow":
+        """
+        Builds a row from a psutil `info` dict.
+
+        Args:
+            info: The attributes fetched, by `FIELDS` name.
+            process: The `psutil.Process` the fields that are not in `info` are
+            fetched from, `None` to leave them `None`.
+        """
+        missing = None if process is None else _UNFETCHED
+        return cls(
+            info["pid"],
+            *(info.get(field, missing) for field in cls.FIELDS[1:]),
+            process=process
+        )
+
+    def __getitem__(
+        self,
+        key: str
+    ) -> typing.Any:
+        if key in ProcessRow._FIELD_SET:
+            value = getattr(self, key)
+            if value is _UNFETCHED:
+                value = ProcessSnapshot.fetch_detail(self.process, key)
+                if key == "cmdline":
+                    value = _intern_cmdline(value)
+                setattr(self, key, value)
+            return value
+        if self.process is not None and key in ProcessSnapshot.LAZY_ATTRS:
+            return ProcessSnapshot.fetch_detail(self.process, key)
+        raise KeyError(key)
+
+    def get(
+        self,
+        key: str,
+        default: typing.Any = None
+    ) -> typing.Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(
+        self,
+        key: str
+    ) -> bool:
+        return key in ProcessRow._FIELD_SET
+
+    def __repr__(self) -> str:
+        return f"ProcessRow({self.pid!r}, {self.name!r})"
+
+
+class SnapshotColumns:
+    """
+    A process table stored field by field, for bulk operations on big tables.
+
+    Numbers are kept in typed arrays, `None` as -1 or NaN, and strings interned, so
+    every field costs a machine word or a pointer per process.
+    """
+
+    # field -> array typecode, the other fields are lists
+    ARRAYS = {"pid": "q", "ppid": "q", "create_time": "d", "cpu": "d", "memory": "q"}
+
+    def __init__(self) -> None:
+        self.columns = {
+            field: (
+                array.array(SnapshotColumns.ARRAYS[field])
+                if field in SnapshotColumns.ARRAYS else []
+            )
+            for field in ProcessRow.FIELDS
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["pid"])
+
+    def append(
+        self,
+        values: typing.Sequence[typing.Any],
+        fields: typing.Sequence[str] = ProcessRow.FIELDS
+    ) -> None:
+        """
+        Adds a process.
+
+        Args:
+            values: Its fields, in the order of `fields`.
+            fields: The names of `values`, missing ones are `None`.
+        """
+        row = dict(zip(fields, values))
+        for field, column in self.columns.items():
+            value = row.get(field)
+            typecode = SnapshotColumns.ARRAYS.get(field)
+            if typecode is None:
+                column.append(
+                    _intern_cmdline(value) if field == "cmdline" else _intern(value)
+                )
+            elif value is None:
+                column.append(math.nan if typecode == "d" else -1)
+            else:
+                column.append(value)
+
+    def column(
+        self,
+        field: str
+    ) -> typing.Sequence[typing.Any]:
+        """
+        The values of one field, `None` is -1 or NaN in the number fields.
+        """
+        return self.columns[field]
+
+    def values(
+        self,
+        index: int
+    ) -> typing.List[typing.Any]:
+        """
+        The fields of one process in the order of `ProcessRow.FIELDS`.
+        """
+        values = []
+        for field, column in self.columns.items():
+            value = column[index]
+            typecode = SnapshotColumns.ARRAYS.get(field)
+            if typecode == "d" and math.isnan(value):
+                value = None
+            elif typecode == "q" and value == -1:
+                value = None
+            values.append(value)
+        return values
+
+    def rows(self) -> typing.List[ProcessRow]:
+        return [ProcessRow(*self.values(index)) for index in range(len(self))]
+
+
+class ProcessSnapshot:
+    """
+    Process table captured once with the union of the attributes any stage needs.
+
+    Each row is a `ProcessRow`. Attributes the process denied access to are `None`.
+    A snapshot replayed from a recording is held as `SnapshotColumns` until its rows
+    are first used, e.g. counting the processes does not build them.
+    """
+
+    # the fields every row has, ppid folds helper processes into their application
+    ATTRS = ["pid", "ppid", "name", "exe", "cmdline"]
+    # fetched for every process by the first pass, cheap on Windows with the
+    # limited query access that is granted for most processes
+    CHEAP_ATTRS = ["pid", "ppid", "name", "exe"]
+    # fetched on first access, the command line has to be read from the memory of
+    # the process and the user needs its token
+    LAZY_ATTRS = frozenset([
+        "cmdline", "cwd", "username", "environ", "create_time", "cpu_times",
+        "memory_info", "cpu", "memory"
+    ])
+
+    # pid -> (create time, {attribute: value}) of the attributes fetched on first
+    # access, kept across snapshots of the same process, e.g. by the agent
+    DETAILS = {}
+
+    # psutil attributes of a recording and the fields they are stored as
+    RECORD_ATTRS = [
+        "pid", "ppid", "name", "exe", "cmdline", "username", "create_time",
+        "cpu_times", "memory_info"
+    ]
+    RECORD_FIELDS = [
+        "pid", "ppid", "name", "exe", "cmdline", "username", "create_time",
+        "cpu", "memory"
+    ]
+    # fields that are stored converted from a psutil attribute, as in a recording
+    CONVERTED_FIELDS = {"cpu": "cpu_times", "memory": "memory_info"}
+
+    RECORD_FORMAT = "weorcanjan-snapshot"
+    # 2 has the header and every row on a line of its own, 1 is one JSON document
+    RECORD_VERSION = 2
+    RECORD_EXTENSION = ".json.gz"
+
+    def __init__(
+        self,
+        rows: typing.Optional[typing.List[ProcessRow]] = None,
+        columns: typing.Optional[SnapshotColumns] = None
+    ) -> None:
+        """
+        Args:
+            rows: The rows, or `None` to build them from `columns` on first use.
+            columns: The processes stored by field, when `rows` is `None`.
+        """
+        self._rows = rows
+        self._columns = columns
+        self._by_name = None
+        self._tree = None
+
+    @property
+    def rows(self) -> typing.List[ProcessRow]:
+        if self._rows is None:
+            # not kept twice
+            self._rows = self._columns.rows()
+            self._columns = None
+        return self._rows
+
+    @classmethod
+    def from_tree(
+        cls,
+        tree: "ProcessTree"
+    ) -> "ProcessSnapshot":
+        """
+        Wraps a tree kept up to date by a watch, without folding its rows again.
+        """
+        snapshot = cls(list(tree.rows.values()))
+        snapshot._tree = tree
+        return snapshot
+
+    @classmethod
+    def take(cls) -> "ProcessSnapshot":
+        """
+        Walks the process table exactly once, fetching `CHEAP_ATTRS`.
+
+        Returns:
+            ProcessSnapshot: The captured snapshot, its rows fetch the other
+            attributes on first access.
+        """
+        import psutil
+
+        with Tracer.span("enumerate") as span:
+            if Tracer.enabled():
+                rows = cls._take_traced()
+            else:
+                rows = []
+                for process in psutil.process_iter(cls.CHEAP_ATTRS, ad_value=None):
+                    try:
+                        rows.append(ProcessRow.from_info(process.info, process))
+                    except psutil.Error:
+                        pass
+            span.set(processes=len(rows))
+
+        # what was fetched for processes that exited since
+        running = {row["pid"] for row in rows}
+        for pid in cls.DETAILS.keys() - running:
+            del cls.DETAILS[pid]
+        return cls(rows)
+
+    @classmethod
+    def _take_traced(cls) -> typing.List[ProcessRow]:
+        """
+        Walks the process table with a span around every attribute fetch, and
+        counts the attributes the processes denied access to.
+        """
+        import psutil
+
+        denied = object()
+        denied_count = 0
+        rows = []
+        for process in psutil.process_iter():
+            with Tracer.span("fetch", pid=process.pid):
+                try:
+                    info = process.as_dict(cls.CHEAP_ATTRS, ad_value=denied)
+                except psutil.Error:
+                    continue
+            for attr, value in info.items():
+                if value is denied:
+                    info[attr] = None
+                    denied_count += 1
+            rows.append(ProcessRow.from_info(info, process))
+
+        Tracer.count(Tracer.PROCESSES_SCANNED, len(rows))
+        Tracer.count(Tracer.ACCESS_DENIED, denied_count)
+        return rows
+
+    @classmethod
+    def fetch(
+        cls,
+        pid: int
+    ) -> typing.Optional[ProcessRow]:
+        """
+        Fetches the row of one process, like the first pass of `take`.
+
+        Returns:
+            ProcessRow: The row, or `None` when the process is gone.
+        """
+        import psutil
+
+        try:
+            process = psutil.Process(pid)
+            return ProcessRow.from_info(
+                process.as_dict(cls.CHEAP_ATTRS, ad_value=None),
+                process
+            )
+        except psutil.Error:
+            return None
+
+    @staticmethod
+    def create_time(
+        pid: int
+    ) -> typing.Optional[float]:
+        """
+        Gets the create time of one process, `None` when it is gone.
+        """
+        import psutil
+
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+
+    @classmethod
+    def forget(
+        cls,
+        pid: int
+    ) -> None:
+        """
+        Drops what was fetched for a process that exited.
+        """
+        cls.DETAILS.pop(pid, None)
+
+    @classmethod
+    def fetch_detail(
+        cls,
+        process: typing.Any,
+        field: str
+    ) -> typing.Any:
+        """
+        Fetches one of `LAZY_ATTRS` of a process, once per pid and create time.
+
+        `cpu` and `memory` are converted like in a recording.
+
+        Returns:
+            The value, `None` when access is denied or the process is gone.
+        """
+        import psutil
+
+        try:
+            created = process.create_time()
+        except psutil.Error:
+            created = None
+        known = cls.DETAILS.get(process.pid)
+        # the pid was reused
+        if known is None or known[0] != created:
+            known = (created, {})
+            cls.DETAILS[process.pid] = known
+        details = known[1]
+
+        if field not in details:
+            attr = cls.CONVERTED_FIELDS.get(field, field)
+            try:
+                value = process.as_dict([attr], ad_value=None)[attr]
+            except psutil.Error:
+                value = None
+            if field == "cpu" and value is not None:
+                value = value.user + value.system
+            elif field == "memory" and value is not None:
+                value = value.rss
+            details[field] = value
+            Tracer.count(Tracer.DETAILS_FETCHED)
+        return details[field]
+
+    @classmethod
+    def record(
+        cls,
+        path: str
+    ) -> int:
+        """
+        Records the full process table to a gzip compressed JSON lines file.
+
+        cpu is the user plus system cpu time in seconds and memory the resident set
+        size in bytes.
+
+        Args:
+            path: The file to write.
+
+        Returns:
+            int: The number of recorded processes.
+        """
+        import psutil
+
+        with Tracer.span("enumerate"):
+            rows = []
+            for process in psutil.process_iter(cls.RECORD_ATTRS, ad_value=None):
+                try:
+                    info = process.info
+                except psutil.Error:
+                    continue
+                cpu_times = info["cpu_times"]
+                memory_info = info["memory_info"]
+                rows.append([
+                    info["pid"],
+                    info["ppid"],
+                    info["name"],
+                    info["exe"],
+                    info["cmdline"],
+                    info["username"],
+                    info["create_time"],
+                    cpu_times.user + cpu_times.system if cpu_times else None,
+                    memory_info.rss if memory_info else None
+                ])
+
+        with Tracer.span("snapshot write"):
+            cls.write(path, rows)
+        Tracer.count(Tracer.PROCESSES_SCANNED, len(rows))
+        Tracer.count(Tracer.BYTES_WRITTEN, os.path.getsize(path))
+        return len(rows)
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        rows: typing.Iterable[typing.Sequence[typing.Any]]
+    ) -> None:
+        """
+        Writes a recording, the header on the first line and then one row per line.
+
+        Args:
+            path: The file to write.
+            rows: The rows as lists in the order of `RECORD_FIELDS`.
+        """
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "format": cls.RECORD_FORMAT,
+                    "version": cls.RECORD_VERSION,
+                    "taken": time.time(),
+                    "fields": cls.RECORD_FIELDS
+                },
+                f,
+                separators=(",", ":")
+            )
+            for row in rows:
+                f.write("\n")
+                json.dump(row, f, separators=(",", ":"))
+
+    @classmethod
+    def replay(
+        cls,
+        path: str
+    ) -> "ProcessSnapshot":
+        """
+        Loads a recorded process table as if it was the live one.
+
+        Rows are read one line at a time into `SnapshotColumns`, a version 1
+        recording is read whole.
+
+        Args:
+            path: The file written by `record`.
+
+        Returns:
+            ProcessSnapshot: The recorded snapshot.
+        """
+        columns = SnapshotColumns()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+
+            if header.get("format") != cls.RECORD_FORMAT:
+                raise ValueError(f"Not a process snapshot recording: {path}")
+            if header.get("version", 0) > cls.RECORD_VERSION:
+                raise ValueError(
+                    f"Unsupported snapshot version {header['version']}: {path}"
+                )
+
+            fields = header["fields"]
+            rows = header.pop("rows", None)
+            if rows is not None:
+                # version 1, consumed from the end so each row is freed once stored
+                rows.reverse()
+                while rows:
+                    columns.append(rows.pop(), fields)
+            else:
+                for line in f:
+                    columns.append(json.loads(line), fields)
+        return cls(columns=columns)
+
+    def __len__(self) -> int:
+        if self._rows is None:
+            return len(self._columns)
+        return len(self._rows)
+
+    def __iter__(self) -> typing.Iterator[ProcessRow]:
+        return iter(self.rows)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of processes that have a name, as reported to the user.
+        """
+        if self._rows is None:
+            return sum(1 for name in self._columns.column("name") if name)
+        return sum(1 for row in self._rows if row.get("name"))
+
+    @property
+    def by_name(self) -> typing.Dict[str, typing.List[ProcessRow]]:
+        """
+        Rows grouped by process name, built on first use.
+        """
+        if self._by_name is None:
+            self._by_name = self._group_by("name")
+        return self._by_name
+
+    @property
+    def tree(self) -> "ProcessTree":
+        """
+        Processes folded into their applications, built on first use.
+        """
+        if self._tree is None:
+            from res.process_tree import ProcessTree
+
+            with Tracer.span("fold", processes=len(self.rows)):
+                self._tree = ProcessTree.build(self.rows)
+        return self._tree
+
+    def _group_by(
+        self,
+        key: str
+    ) -> typing.Dict[str, typing.List[ProcessRow]]:
+        groups = {}
+        for row in self.rows:
+            value = row.get(key)
+            if value:
+                groups.setdefault(value, []).append(row)
+        return groups
@@ -0,0 +1,142 @@
+"""
+Folds the helper processes of multi-process applications into the application that
+started them, so a browser with 40 renderers is one application.
+
+A process folds into its parent when both run the same executable, or when it matches
+the helper signature of the application at the root of its branch (see
+`res/helper_signatures.py`). Processes that do not fold are roots.
+"""
+import typing
+
+from res.helper_signatures import HELPER_SIGNATURES
+
+
+class ProcessTree:
+    """
+    Root application of every process, built from the ppid of the rows.
+
+    Rows can be added as they appear, which is how the watch keeps it up to date. A
+    process only folds into a parent that is known when it is added.
+    """
+
+    def __init__(
+        self,
+        signatures: typing.Dict[str, dict] = HELPER_SIGNATURES
+    ) -> None:
+        self.signatures = signatures
+        # pid -> row
+        self.rows = {}
+        # pid -> pid of the root it folds into, itself for a root
+        self.root_of = {}
+
+    @classmethod
+    def build(
+        cls,
+        rows: typing.Iterable[dict]
+    ) -> "ProcessTree":
+        """
+        Builds the tree of a whole process table in one pass.
+        """
+        tree = cls()
+        tree.extend(rows)
+        return tree
+
+    def extend(
+        self,
+        rows: typing.Iterable[dict]
+    ) -> typing.List[int]:
+        """
+        Adds processes, in any order.
+
+        Each process is resolved once, walking up only through parents that are not
+        resolved yet, so the whole table is O(n).
+
+        Returns:
+            list: The pids of the added processes that are roots.
+        """
+        pids = []
+        for row in rows:
+            self.rows[row["pid"]] = row
+            self.root_of.pop(row["pid"], None)
+            pids.append(row["pid"])
+        return [pid for pid in pids if self._resolve(pid) == pid]
+
+    def remove(
+        self,
+        pid: int
+    ) -> typing.List[int]:
+        """
+        Drops a process that exited.
+
+        The processes that folded into it are resolved again, e.g. the real
+        browser started by a launcher stub that exited becomes a root.
+
+        Returns:
+            list: The pids of the processes that became roots.
+        """
+        self.rows.pop(pid, None)
+        if self.root_of.pop(pid, None) != pid:
+            return []
+        orphans = [child for child, root in self.root_of.items() if root == pid]
+        for child in orphans:
+            del self.root_of[child]
+        return [child for child in orphans if self._resolve(child) == child]
+
+    def roots(self) -> typing.List[dict]:
+        return [self.rows[pid] for pid, root in self.root_of.items() if pid == root]
+
+    def _resolve(
+        self,
+        pid: int
+    ) -> int:
+        # walk up to the first resolved process, or one whose parent is unknown
+        path = []
+        on_path = set()
+        current = pid
+        while current not in self.root_of:
+            parent = self.rows.get(self.rows[current].get("ppid"))
+            # a ppid can point at a reused pid and form a cycle
+            if parent is None or parent["pid"] == current or parent["pid"] in on_path:
+                self.root_of[current] = current
+                break
+            path.append(current)
+            on_path.add(current)
+            current = parent["pid"]
+
+        # then down again, from the process closest to the resolved one
+        for child in reversed(path):
+            row = self.rows[child]
+            parent = self.rows[row["ppid"]]
+            parent_root = self.root_of[parent["pid"]]
+            if self._same_executable(row, parent) or self._is_helper(
+                row,
+                self.rows[parent_root]
+            ):
+                self.root_of[child] = parent_root
+            else:
+                self.root_of[child] = child
+        return self.root_of[pid]
+
+    @staticmethod
+    def _same_executable(
+        row: dict,
+        parent: dict
+    ) -> bool:
+        if row.get("exe") and parent.get("exe"):
+            return row["exe"].casefold() == parent["exe"].casefold()
+        return bool(row.get("name")) and row["name"] == parent.get("name")
+
+    def _is_helper(
+        self,
+        row: dict,
+        root: dict
+    ) -> bool:
+        signature = self.signatures.get((root.get("name") or "").casefold())
+        if signature is None:
+            return False
+        if (row.get("name") or "").casefold() in signature["names"]:
+            return True
+        return any(
+            arg.startswith(signature["args"])
+            for arg in (row.get("cmdline") or [])[1:]
+        )
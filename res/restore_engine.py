@@ -0,0 +1,385 @@
+"""
+Parallel, dependency aware restore of a saved session.
+
+An application may list other applications of the session, by executable name, that
+it must start `after`. It then waits until those applications have been launched.
+Everything else is launched concurrently on a bounded worker pool, with an optional
+stagger between two launches. With a restore history the ready applications that start
+the slowest chain until the session is usable are launched first.
+"""
+import os
+import queue
+import subprocess
+import threading
+import time
+import typing
+
+from res.session_format import PersistApplicationType
+from res.tracer import Tracer
+
+if typing.TYPE_CHECKING:
+    from res.admission import AdmissionController
+    from res.restore_history import RestoreHistory, SettleMonitor
+
+
+class LaunchEntry:
+    """
+    One application to launch and the applications it must start after.
+    """
+
+    __slots__ = (
+        "cmdline", "after", "name", "cwd", "env", "memory_cost", "running",
+        "executable", "invalid"
+    )
+
+    def __init__(
+        self,
+        cmdline: typing.Union[str, typing.List[str]],
+        after: typing.Optional[typing.List[str]] = None,
+        name: typing.Optional[str] = None,
+        cwd: typing.Optional[str] = None,
+        env: typing.Optional[typing.Dict[str, str]] = None
+    ) -> None:
+        self.cmdline = cmdline
+        self.after = after or []
+        self.name = name or PersistApplicationType.name_from_cmdline(cmdline)
+        self.cwd = cwd
+        # overrides on top of the current environment
+        self.env = env
+        # estimated bytes used once started, for admission control
+        self.memory_cost = 0.0
+        # already running, counts as launched without starting it again
+        self.running = False
+        # the absolute executable and why there is none, see res/path_resolver.py
+        self.executable = None
+        self.invalid = None
+
+    @staticmethod
+    def normalize_path(
+        path: str
+    ) -> str:
+        return path.strip('"').replace("\\", "/").casefold()
+
+    @property
+    def key(self) -> str:
+        """
+        Canonical key of the application, its case folded executable path.
+        """
+        return LaunchEntry.normalize_path(
+            PersistApplicationType.exe_from_cmdline(self.cmdline)
+        )
+
+    @property
+    def args(self) -> typing.Optional[typing.List[str]]:
+        """
+        The arguments, `None` for a raw legacy command line.
+        """
+        if isinstance(self.cmdline, list):
+            return self.cmdline[1:]
+        return None
+
+    def popen_kwargs(self) -> dict:
+        kwargs = {}
+        if self.executable:
+            # no second search of the PATH at launch
+            kwargs["executable"] = self.executable
+        if self.cwd:
+            kwargs["cwd"] = self.cwd
+        if self.env:
+            kwargs["env"] = {**os.environ, **self.env}
+        return kwargs
+
+    def __repr__(self) -> str:
+        return f"LaunchEntry({self.name!r}, after={self.after!r})"
+
+
+class LaunchResult:
+    """
+    Outcome of one launch.
+    """
+
+    def __init__(
+        self,
+        entry: LaunchEntry,
+        latency: typing.Optional[float] = None,
+        error: typing.Optional[str] = None,
+        process: typing.Any = None
+    ) -> None:
+        self.entry = entry
+        self.latency = latency
+        self.error = error
+        self.process = process
+        # seconds from launch until idle, when it was watched
+        self.settle = None
+        # seconds it was watched without going idle
+        self.busy = None
+        # resident bytes once idle, when it was watched
+        self.memory = None
+        # why it was not launched although nothing failed
+        self.skipped = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RestoreEngine:
+    """
+    Launches the entries of a session as a DAG on a bounded worker pool.
+    """
+
+    DEFAULT_JOBS = 4
+    DEFAULT_STAGGER = 0.0
+
+    def __init__(
+        self,
+        entries: typing.List[LaunchEntry],
+        jobs: int = DEFAULT_JOBS,
+        stagger: float = DEFAULT_STAGGER,
+        launcher: typing.Callable = subprocess.Popen,
+        history: typing.Optional["RestoreHistory"] = None,
+        monitor: typing.Optional["SettleMonitor"] = None,
+        admission: typing.Optional["AdmissionController"] = None
+    ) -> None:
+        self.entries = entries
+        self.jobs = max(1, jobs)
+        self.stagger = max(0.0, stagger)
+        self.launcher = launcher
+        self.history = history
+        self.monitor = monitor
+        self.admission = admission
+        self._stagger_lock = threading.Lock()
+        self._next_launch = 0.0
+
+    @staticmethod
+    def entries_from_session(
+        session: typing.Iterable[typing.Any]
+    ) -> typing.List[LaunchEntry]:
+        """
+        Builds launch entries from the applications of an opened session.
+
+        Args:
+            session: The `PersistApplicationType` entries of a session reader.
+
+        Returns:
+            list: The entries in session order.
+        """
+        return [
+            LaunchEntry(
+                app.cmdline,
+                after=list(app.after),
+                name=app.name,
+                cwd=app.cwd,
+                env=app.env
+            )
+            for app in session
+        ]
+
+    def _resolve_dependencies(
+        self
+    ) -> typing.Dict[int, typing.List[int]]:
+        """
+        Maps each entry index to the indexes it depends on.
+        """
+        index_by_key = {}
+        for index, entry in enumerate(self.entries):
+            for key in (entry.name, entry.cmdline):
+                if isinstance(key, str):
+                    index_by_key.setdefault(key.casefold(), index)
+
+        depends_on = {}
+        for index, entry in enumerate(self.entries):
+            depends_on[index] = []
+            for dependency in entry.after:
+                found = index_by_key.get(dependency.casefold())
+                if found is None or found == index:
+                    print(f"Unknown dependency {dependency!r} of {entry.name}, ignored")
+                else:
+                    depends_on[index].append(found)
+        return depends_on
+
+    def _wait_for_stagger(self) -> None:
+        if not self.stagger:
+            return
+        with self._stagger_lock:
+            now = time.monotonic()
+            start = max(now, self._next_launch)
+            self._next_launch = start + self.stagger
+        if start > now:
+            time.sleep(start - now)
+
+    def _launch(
+        self,
+        index: int
+    ) -> LaunchResult:
+        entry = self.entries[index]
+        if entry.running:
+            result = LaunchResult(entry, latency=0.0)
+            result.skipped = "already running"
+            return result
+        if entry.invalid is not None:
+            return LaunchResult(entry, error=entry.invalid)
+        self._wait_for_stagger()
+        if self.admission is not None:
+            refused = self.admission.admit(entry.name, entry.memory_cost)
+            if refused is not None:
+                return LaunchResult(entry, error=refused)
+        started = time.perf_counter()
+        try:
+            with Tracer.span("launch", name=entry.name):
+                process = self.launcher(entry.cmdline, **entry.popen_kwargs())
+        except Exception as popen_err:
+            return LaunchResult(
+                entry,
+                time.perf_counter() - started,
+                error=str(popen_err)
+            )
+        latency = time.perf_counter() - started
+        if self.monitor is not None and getattr(process, "pid", None):
+            self.monitor.watch(index, process.pid, started)
+        return LaunchResult(entry, latency, process=process)
+
+    def run(self) -> typing.List[LaunchResult]:
+        """
+        Launches every entry once all of its dependencies have launched.
+
+        Ready entries are launched highest history rank first. With a settle
+        monitor this waits until the launched applications are idle as well.
+
+        An entry whose dependency failed, or which sits on a dependency cycle, is
+        reported as failed without being launched.
+
+        Returns:
+            list: The launch results in entry order.
+        """
+        with Tracer.span("resolve dependencies", entries=len(self.entries)):
+            depends_on = self._resolve_dependencies()
+        dependents = {index: [] for index in depends_on}
+        waiting = {}
+        for index, dependencies in depends_on.items():
+            waiting[index] = len(dependencies)
+            for dependency in dependencies:
+                dependents[dependency].append(index)
+
+        results = {}
+
+        def skip(index: int, reason: str) -> None:
+            results[index] = LaunchResult(self.entries[index], error=reason)
+            for dependent in dependents[index]:
+                if dependent not in results:
+                    skip(dependent, f"dependency {self.entries[index].name} failed")
+
+        ranks = {}
+        if self.history is not None:
+            with Tracer.span("rank"):
+                ranks = self.history.priorities(
+                    [entry.key for entry in self.entries],
+                    dependents
+                )
+
+        # a plain thread pool, concurrent.futures costs too much import time for a
+        # command that runs at every login
+        ready = queue.PriorityQueue()
+        done = queue.SimpleQueue()
+        stop = (float("inf"), -1)
+
+        def submit(index: int) -> None:
+            ready.put((-ranks.get(index, 0.0), index))
+
+        def worker() -> None:
+            while True:
+                _, index = ready.get()
+                if index == -1:
+                    return
+                done.put((index, self._launch(index)))
+
+        # queue the first entries before the workers start so they are taken by rank
+        pending = 0
+        for index, count in waiting.items():
+            if count == 0:
+                submit(index)
+                pending += 1
+
+        # the whole window, the launch spans of the workers overlap
+        with Tracer.span("launch", entries=len(self.entries)):
+            if self.monitor is not None:
+                self.monitor.start()
+
+            workers = [
+                threading.Thread(target=worker, daemon=True)
+                for _ in range(min(self.jobs, len(self.entries)))
+            ]
+            for thread in workers:
+                thread.start()
+
+            while pending:
+                index, result = done.get()
+                pending -= 1
+                results[index] = result
+                if not result.ok:
+                    reason = f"dependency {result.entry.name} failed"
+                    for dependent in dependents[index]:
+                        if dependent not in results:
+                            skip(dependent, reason)
+                    continue
+                for dependent in dependents[index]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0 and dependent not in results:
+                        submit(dependent)
+                        pending += 1
+
+            for _ in workers:
+                ready.put(stop)
+            for thread in workers:
+                thread.join()
+
+        if self.monitor is not None:
+            with Tracer.span("settle"):
+                settled = self.monitor.finish()
+            for index, settle in settled.items():
+                results[index].settle = settle
+            for index, busy in self.monitor.busy.items():
+                results[index].busy = busy
+            for index, memory in self.monitor.memory.items():
+                results[index].memory = memory
+
+        for index in range(len(self.entries)):
+            if index not in results:
+                results[index] = LaunchResult(
+                    self.entries[index],
+                    error="dependency cycle"
+                )
+
+        return [results[index] for index in range(len(self.entries))]
+
+    @staticmethod
+    def print_report(
+        results: typing.List[LaunchResult]
+    ) -> None:
+        """
+        Prints the launch latency of every application and the failures.
+        """
+        print("")
+        print("Restore report:")
+        for result in results:
+            if result.skipped is not None:
+                print(f"  {result.entry.name}: {result.skipped}")
+            elif result.ok:
+                line = (
+                    f"  {result.entry.name}: "
+                    f"launched in {result.latency * 1000:.1f} ms"
+                )
+                if result.settle is not None:
+                    line += f", idle after {result.settle:.1f} s"
+                elif result.busy is not None:
+                    line += f", still busy after {result.busy:.1f} s"
+                print(line)
+        failures = [result for result in results if not result.ok]
+        for result in failures:
+            print(f"  {result.entry.name}: FAILED ({result.error})")
+        skipped = [result for result in results if result.skipped is not None]
+        launched = len(results) - len(failures) - len(skipped)
+        print(f"Launched {launched} of {len(results)} applications")
+        if skipped:
+            print(f"Skipped {len(skipped)} applications that were already running")
+        print("")
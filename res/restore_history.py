@@ -0,0 +1,281 @@
+"""
+Launch and settle timings of earlier restores, used to start the applications that
+take longest to become usable first.
+
+An application has settled once its CPU use drops back to idle after launch. Timings,
+and the memory an application uses once settled, are kept per application as
+exponentially weighted moving averages in `restore_history.json` in the data
+directory.
+
+Every restore watches its applications for a short `SettleMonitor.DEFAULT_TIMEOUT`
+after their launch. An application still busy by then is kept with the time it was
+watched, a lower bound that still ranks it among the slow ones, and
+`--settle-timeout` waits longer for the exact time.
+"""
+import json
+import os
+import threading
+import time
+import typing
+
+
+class RestoreHistory:
+    """
+    Per application timing history.
+    """
+
+    FILENAME = "restore_history.json"
+    # weight of the newest run in the moving averages
+    ALPHA = 0.3
+
+    def __init__(
+        self,
+        path: str
+    ) -> None:
+        self.path = path
+        # key -> {"launch": seconds, "settle": seconds, "memory": bytes,
+        # "runs": count}
+        self.apps = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.apps = json.load(f)
+            except (OSError, ValueError) as load_err:
+                print(f"Ignoring unreadable restore history: {load_err}")
+
+    def expected(
+        self,
+        key: str
+    ) -> typing.Optional[float]:
+        """
+        Gets the expected seconds from launch until an application is usable.
+        """
+        timings = self.apps.get(key)
+        if timings is None:
+            return None
+        if timings.get("settle") is not None:
+            return timings["settle"]
+        return timings.get("launch")
+
+    def expected_memory(
+        self,
+        key: str
+    ) -> typing.Optional[float]:
+        """
+        Gets the expected resident bytes of an application once it is idle.
+        """
+        return self.apps.get(key, {}).get("memory")
+
+    def update(
+        self,
+        key: str,
+        launch: typing.Optional[float],
+        settle: typing.Optional[float],
+        memory: typing.Optional[float] = None
+    ) -> None:
+        timings = self.apps.setdefault(
+            key,
+            {"launch": None, "settle": None, "memory": None, "runs": 0}
+        )
+        for field, value in (
+            ("launch", launch),
+            ("settle", settle),
+            ("memory", memory)
+        ):
+            if value is None:
+                continue
+            if timings.get(field) is None:
+                timings[field] = value
+            else:
+                timings[field] += RestoreHistory.ALPHA * (value - timings[field])
+        timings["runs"] += 1
+
+    def record(
+        self,
+        results: typing.Iterable[typing.Any]
+    ) -> None:
+        """
+        Adds the timings of the successful launches of a restore.
+        """
+        for result in results:
+            if result.ok and result.skipped is None:
+                self.update(
+                    result.entry.key,
+                    result.latency,
+                    result.settle if result.settle is not None else result.busy,
+                    result.memory
+                )
+
+    def save(self) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.apps, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def priorities(
+        self,
+        keys: typing.List[str],
+        dependents: typing.Dict[int, typing.List[int]]
+    ) -> typing.Dict[int, float]:
+        """
+        Ranks entries by the length of the slowest chain they start.
+
+        The rank of an entry is its own expected time plus the highest rank among
+        the entries that wait for it, so the critical path is launched first.
+        Applications without history get the average of the known ones.
+
+        Args:
+            keys: The application key of every entry.
+            dependents: The entries waiting on each entry.
+
+        Returns:
+            dict: The rank of every entry index.
+        """
+        weights = [self.expected(key) for key in keys]
+        known = [weight for weight in weights if weight is not None]
+        default = sum(known) / len(known) if known else 0.0
+        weights = [default if weight is None else weight for weight in weights]
+
+        # walk from the entries nobody waits for back to the roots
+        depends_on = {index: [] for index in range(len(keys))}
+        remaining = {}
+        for index in range(len(keys)):
+            remaining[index] = len(dependents[index])
+            for dependent in dependents[index]:
+                depends_on[dependent].append(index)
+
+        slowest_dependent = [0.0] * len(keys)
+        ranks = {}
+        stack = [index for index, count in remaining.items() if count == 0]
+        while stack:
+            index = stack.pop()
+            ranks[index] = weights[index] + slowest_dependent[index]
+            for dependency in depends_on[index]:
+                slowest_dependent[dependency] = max(
+                    slowest_dependent[dependency],
+                    ranks[index]
+                )
+                remaining[dependency] -= 1
+                if remaining[dependency] == 0:
+                    stack.append(dependency)
+
+        # entries on a cycle, reported by the engine
+        for index in range(len(keys)):
+            if index not in ranks:
+                ranks[index] = weights[index] + slowest_dependent[index]
+        return ranks
+
+
+class SettleMonitor:
+    """
+    Watches launched processes on a background thread until their CPU use drops
+    back to idle.
+    """
+
+    IDLE_PERCENT = 2.0
+    # consecutive idle samples needed to count as settled
+    IDLE_SAMPLES = 2
+    INTERVAL = 0.25
+    # short, a restore at login should not wait, longer with --settle-timeout
+    DEFAULT_TIMEOUT = 2.0
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        self.timeout = timeout
+        # entry index -> seconds from launch start until settled
+        self.settled = {}
+        # entry index -> seconds watched of the ones still busy at the timeout
+        self.busy = {}
+        # entry index -> resident bytes once settled or timed out
+        self.memory = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._launching_done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def watch(
+        self,
+        index: int,
+        pid: int,
+        started: float
+    ) -> None:
+        """
+        Starts watching a launched process, safe to call from any thread.
+
+        Args:
+            index: The entry index.
+            pid: The launched process.
+            started: The `time.perf_counter()` the launch started at.
+        """
+        with self._lock:
+            self._pending.append((index, pid, started))
+
+    def finish(self) -> typing.Dict[int, float]:
+        """
+        Waits until every watched process settled, exited or timed out.
+
+        Returns:
+            dict: Entry index -> seconds until settled. Entries that timed out,
+            see `busy`, or exited first are missing.
+        """
+        self._launching_done.set()
+        self._thread.join()
+        return self.settled
+
+    def _run(self) -> None:
+        import psutil
+
+        watched = {}
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for index, pid, started in pending:
+                try:
+                    process = psutil.Process(pid)
+                    # the first call only primes the counter
+                    process.cpu_percent(None)
+                    watched[index] = (process, started, 0)
+                except psutil.Error:
+                    pass
+
+            if not watched:
+                if self._launching_done.is_set():
+                    with self._lock:
+                        if not self._pending:
+                            return
+                else:
+                    self._launching_done.wait(SettleMonitor.INTERVAL)
+                continue
+
+            time.sleep(SettleMonitor.INTERVAL)
+            now = time.perf_counter()
+            for index, (process, started, idle) in list(watched.items()):
+                try:
+                    busy = process.cpu_percent(None) > SettleMonitor.IDLE_PERCENT
+                    # an exited child that was not waited for yet is idle too
+                    if not busy and process.status() == psutil.STATUS_ZOMBIE:
+                        raise psutil.ZombieProcess(process.pid)
+                except psutil.Error:
+                    # exited, e.g. crashed or handed over to a running instance,
+                    # which is not the time it takes to be usable
+                    del watched[index]
+                    continue
+                idle = 0 if busy else idle + 1
+                if idle >= SettleMonitor.IDLE_SAMPLES or now - started > self.timeout:
+                    if idle >= SettleMonitor.IDLE_SAMPLES:
+                        self.settled[index] = now - started
+                    else:
+                        self.busy[index] = now - started
+                    try:
+                        self.memory[index] = process.memory_info().rss
+                    except psutil.Error:
+                        pass
+                    del watched[index]
+                else:
+                    watched[index] = (process, started, idle)
@@ -0,0 +1,235 @@
+"""
+Every save and restore, recorded in `run_history.sqlite3` in the data directory, to
+tell when an application update or a new ignore rule made them slower.
+
+A run keeps its total and phase durations, the processes it saw, its applications
+and errors, and for a restore the launch and settle time of every application.
+`stats` reports the p50, p95 and p99 of the phases and applications over the last
+runs, and the runs that took more than a factor of the usual time. The usual time is
+the p50 of the runs before it, so one slow run does not hide the next one.
+"""
+import sqlite3
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from res.restore_engine import LaunchResult
+
+
+class RunHistory:
+    """
+    The run history database.
+    """
+
+    FILENAME = "run_history.sqlite3"
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            started REAL NOT NULL,
+            action TEXT NOT NULL,
+            session TEXT,
+            seconds REAL NOT NULL,
+            processes INTEGER,
+            applications INTEGER,
+            errors INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS runs_by_action ON runs (action, id);
+        CREATE TABLE IF NOT EXISTS phases (
+            run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+            phase TEXT NOT NULL,
+            seconds REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS phases_by_run ON phases (run);
+        CREATE TABLE IF NOT EXISTS launches (
+            run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+            application TEXT NOT NULL,
+            seconds REAL,
+            settle REAL,
+            ok INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS launches_by_run ON launches (run);
+    """
+
+    DEFAULT_WINDOW = 50
+    DEFAULT_SLOW_FACTOR = 1.5
+    # runs needed before one is compared with the usual time
+    MIN_BASELINE_RUNS = 5
+    # the other process writing waits this long for the lock
+    TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        path: str
+    ) -> None:
+        self.connection = sqlite3.connect(path, timeout=RunHistory.TIMEOUT)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != RunHistory.SCHEMA_VERSION:
+            with self.connection:
+                self.connection.executescript(RunHistory.SCHEMA)
+                self.connection.execute(
+                    f"PRAGMA user_version = {RunHistory.SCHEMA_VERSION}"
+                )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record(
+        self,
+        action: str,
+        session: typing.Optional[str],
+        seconds: float,
+        phases: typing.Dict[str, float],
+        processes: typing.Optional[int] = None,
+        applications: typing.Optional[int] = None,
+        errors: int = 0,
+        launches: typing.Iterable["LaunchResult"] = ()
+    ) -> int:
+        """
+        Appends a run.
+
+        Args:
+            action: `save` or `restore`.
+            session: The session name.
+            seconds: The duration of the whole run.
+            phases: Seconds per phase, see `Tracer.collect_phases`.
+            processes: The processes in the snapshot, when one was taken.
+            applications: The applications saved or in the restored session.
+            errors: The applications that failed.
+            launches: The results of a restore, skipped ones are left out.
+
+        Returns:
+            int: The id of the run.
+        """
+        with self.connection:
+            run = self.connection.execute(
+                "INSERT INTO runs (started, action, session, seconds, processes, "
+                "applications, errors) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(), action, session, seconds, processes,
+                    applications, errors
+                )
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO phases (run, phase, seconds) VALUES (?, ?, ?)",
+                [(run, phase, value) for phase, value in phases.items()]
+            )
+            self.connection.executemany(
+                "INSERT INTO launches (run, application, seconds, settle, ok) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (run, result.entry.name, result.latency, result.settle, result.ok)
+                    for result in launches
+                    if result.skipped is None
+                ]
+            )
+        return run
+
+    def runs(
+        self,
+        action: str,
+        window: int = DEFAULT_WINDOW,
+        session: typing.Optional[str] = None
+    ) -> typing.List[dict]:
+        """
+        Gets the last runs of an action, oldest first.
+        """
+        query = (
+            "SELECT id, started, session, seconds, errors FROM runs WHERE action = ?"
+        )
+        params = [action]
+        if session is not None:
+            query += " AND session = ?"
+            params.append(session)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(window)
+        rows = self.connection.execute(query, params).fetchall()
+        return [
+            {
+                "id": run,
+                "started": started,
+                "session": run_session,
+                "seconds": seconds,
+                "errors": errors
+            }
+            for run, started, run_session, seconds, errors in reversed(rows)
+        ]
+
+    def _grouped(
+        self,
+        query: str,
+        runs: typing.List[dict]
+    ) -> typing.Dict[str, typing.List[float]]:
+        grouped = {}
+        if not runs:
+            return grouped
+        # a range, not a list of ids, stays under the variable limit of sqlite
+        ids = {run["id"] for run in runs}
+        for run, name, seconds in self.connection.execute(
+            query,
+            (runs[0]["id"], runs[-1]["id"])
+        ):
+            if run in ids and seconds is not None:
+                grouped.setdefault(name, []).append(seconds)
+        return grouped
+
+    def phases(
+        self,
+        runs: typing.List[dict]
+    ) -> typing.Dict[str, typing.List[float]]:
+        """
+        Gets the seconds of every phase in the runs, by phase.
+        """
+        return self._grouped(
+            "SELECT run, phase, seconds FROM phases WHERE run BETWEEN ? AND ?",
+            runs
+        )
+
+    def launches(
+        self,
+        runs: typing.List[dict]
+    ) -> typing.Dict[str, typing.List[float]]:
+        """
+        Gets the launch seconds of every application in the runs, by application.
+        """
+        return self._grouped(
+            "SELECT run, application, seconds FROM launches "
+            "WHERE run BETWEEN ? AND ? AND ok",
+            runs
+        )
+
+    @staticmethod
+    def percentile(
+        values: typing.List[float],
+        percent: float
+    ) -> float:
+        """
+        The nearest rank percentile.
+        """
+        ordered = sorted(values)
+        rank = max(1, -(-len(ordered) * percent // 100))
+        return ordered[int(rank) - 1]
+
+    @staticmethod
+    def slow_runs(
+        runs: typing.List[dict],
+        factor: float = DEFAULT_SLOW_FACTOR
+    ) -> typing.List[typing.Tuple[dict, float]]:
+        """
+        Finds the runs that took more than `factor` times the p50 of the runs
+        before them in the window.
+
+        Returns:
+            list: The slow runs and how many times the usual time they took.
+        """
+        slow = []
+        for index in range(RunHistory.MIN_BASELINE_RUNS, len(runs)):
+            baseline = RunHistory.percentile(
+                [run["seconds"] for run in runs[:index]],
+                50
+            )
+            ratio = runs[index]["seconds"] / baseline if baseline else 0.0
+            if ratio > factor:
+                slow.append((runs[index], ratio))
+        return slow
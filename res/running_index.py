@@ -0,0 +1,120 @@
+"""
+Hash index of the running applications, so that restore only launches the entries of
+a session that are not running yet and can be run at every login or unlock.
+
+Applications are keyed on their canonical command line, the normalized executable
+path and the arguments left after dropping the volatile ones, see
+`res/argv_canonicalizer.py`. An entry saved without arguments is running when any
+process runs its executable.
+
+Given the entries, only the processes whose executable or name is the name of an
+entry's executable are indexed, so the command line of every other process is never
+fetched.
+"""
+import os
+import typing
+
+from res.argv_canonicalizer import ArgvCanonicalizer, ArgvTrie
+from res.restore_engine import LaunchEntry
+
+
+class RunningIndex:
+    """
+    Trie of the canonical command lines of the running processes.
+    """
+
+    def __init__(
+        self,
+        rows: typing.Iterable[dict],
+        canonicalizer: typing.Optional[ArgvCanonicalizer] = None,
+        entries: typing.Optional[typing.Iterable[LaunchEntry]] = None
+    ) -> None:
+        """
+        Args:
+            rows: Every process of a snapshot.
+            canonicalizer: Defaults to one with the built-in profiles.
+            entries: The entries that will be looked up, all processes are indexed
+            when `None`.
+        """
+        self.canonicalizer = canonicalizer or ArgvCanonicalizer()
+        self.trie = ArgvTrie()
+        stems = None
+        if entries is not None:
+            stems = {RunningIndex.stem(entry.key) for entry in entries}
+        for row in rows:
+            # the name too, the exe of a link is the file it points at
+            known = [path for path in (row.get("exe"), row.get("name")) if path]
+            if stems is not None and known and not any(
+                RunningIndex.stem(path) in stems for path in known
+            ):
+                continue
+            cmdline = row.get("cmdline") or []
+            # save keeps cmdline[0], which can be relative or a link to the exe
+            for exe in {row.get("exe"), cmdline[0] if cmdline else None}:
+                if exe:
+                    self.trie.insert(self.canonicalizer.key([exe, *cmdline[1:]]))
+
+    @staticmethod
+    def stem(
+        path: str
+    ) -> str:
+        """
+        The executable name without extension, `chrome` for a saved `chrome` and
+        a running `.../Application/chrome.exe` alike.
+        """
+        path = LaunchEntry.normalize_path(path)
+        return os.path.splitext(path.rsplit("/", 1)[-1])[0]
+
+    def is_running(
+        self,
+        entry: LaunchEntry
+    ) -> bool:
+        if entry.args is None:
+            # a raw legacy command line, matched on its executable
+            return self.trie.has_prefix((entry.key,))
+        key = self.canonicalizer.key(entry.cmdline)
+        if len(key) == 1:
+            # no arguments, or only volatile ones
+            return self.trie.has_prefix(key)
+        return key in self.trie
+
+    def mark_running(
+        self,
+        entries: typing.List[LaunchEntry]
+    ) -> int:
+        """
+        Flags the entries that are already running.
+
+        Returns:
+            int: The number of running entries.
+        """
+        running = 0
+        for entry in entries:
+            entry.running = self.is_running(entry)
+            running += entry.running
+        return running
+
+    @staticmethod
+    def reconcile(
+        entries: typing.List[LaunchEntry],
+        running_applications: typing.Iterable[str]
+    ) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        Compares a session with the running applications.
+
+        Args:
+            entries: The entries of the session, flagged by `mark_running`.
+            running_applications: The executables a save would offer.
+
+        Returns:
+            tuple: The names of the missing entries and the paths of the running
+            applications the session does not have.
+        """
+        missing = sorted(entry.name for entry in entries if not entry.running)
+        session_keys = {entry.key for entry in entries}
+        running = {
+            LaunchEntry.normalize_path(application): application
+            for application in running_applications
+        }
+        extra = sorted(running[key] for key in running.keys() - session_keys)
+        return missing, extra
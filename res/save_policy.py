@@ -0,0 +1,274 @@
+"""
+Declarative include / exclude policy that decides which applications a save keeps,
+without asking, e.g. for a logon or logoff hook.
+
+A policy is a JSON file:-
+
+    {
+        "default": "exclude",
+        "rules": [
+            {"id": "no-updaters", "action": "exclude", "name": "*update*.exe"},
+            {"id": "ide", "action": "include", "exe": "C:/Program Files/JetBrains/*"},
+            {"id": "consoles", "action": "include", "console": true, "min_uptime": 60},
+            {"action": "include", "username": "*\\\\matt", "max_rss_mb": 4096}
+        ]
+    }
+
+Every condition of a rule must hold, and the first rule that matches an application
+decides it. Applications no rule matches get `default`, which defaults to exclude.
+
+Conditions:-
+
+* `exe`, `name`, `username`, `argv`: a case-insensitive glob, or a regex prefixed with
+  `re:` that is searched for. `exe` is matched with forward slashes and `argv`
+  against the arguments after the executable joined by spaces.
+* `min_uptime`, `max_uptime`: seconds since the process started.
+* `min_cpu`, `max_cpu`: CPU seconds used since the process started.
+* `min_rss_mb`, `max_rss_mb`: resident memory in MiB.
+* `console`: whether the process owns a console, i.e. has a console host child.
+
+A threshold on a value the process denied access to does not match.
+"""
+import fnmatch
+import json
+import re
+import time
+import typing
+
+
+class PolicyRule:
+    """
+    One compiled rule of a policy.
+    """
+
+    ACTIONS = ("include", "exclude")
+    PATTERN_CONDITIONS = ("exe", "name", "username", "argv")
+    # condition -> (snapshot field, scale, compare)
+    THRESHOLD_CONDITIONS = {
+        "min_uptime": ("create_time", 1, "min"),
+        "max_uptime": ("create_time", 1, "max"),
+        "min_cpu": ("cpu", 1, "min"),
+        "max_cpu": ("cpu", 1, "max"),
+        "min_rss_mb": ("memory", 1024 * 1024, "min"),
+        "max_rss_mb": ("memory", 1024 * 1024, "max"),
+    }
+    REGEX_PREFIX = "re:"
+
+    def __init__(
+        self,
+        spec: dict,
+        index: int
+    ) -> None:
+        """
+        Args:
+            spec: The rule from the policy file.
+            index: Its position, names rules without an `id`.
+
+        Raises:
+            ValueError: When the rule is malformed.
+        """
+        if not isinstance(spec, dict):
+            raise ValueError(f"rule {index + 1}: a rule must be an object")
+        self.id = str(spec.get("id", f"rule {index + 1}"))
+        self.action = spec.get("action")
+        if self.action not in PolicyRule.ACTIONS:
+            raise ValueError(f"{self.id}: action must be include or exclude")
+
+        self.patterns = []
+        self.thresholds = []
+        self.console = None
+        for condition, value in spec.items():
+            if condition in ("id", "action"):
+                continue
+            if condition in PolicyRule.PATTERN_CONDITIONS:
+                if not isinstance(value, str):
+                    raise ValueError(f"{self.id}: {condition} must be a string")
+                if condition == "exe":
+                    value = value.replace("\\", "/")
+                self.patterns.append((condition, self._compile(value)))
+            elif condition in PolicyRule.THRESHOLD_CONDITIONS:
+                # true and false are ints to Python but not thresholds
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f"{self.id}: {condition} must be a number")
+                self.thresholds.append((condition, value))
+            elif condition == "console":
+                if not isinstance(value, bool):
+                    raise ValueError(f"{self.id}: console must be true or false")
+                self.console = value
+            else:
+                raise ValueError(f"{self.id}: unknown condition {condition!r}")
+
+    def _compile(
+        self,
+        pattern: str
+    ) -> typing.Pattern:
+        if not pattern.startswith(PolicyRule.REGEX_PREFIX):
+            return re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+        try:
+            # searched, like the regexes of the ignore rules
+            return re.compile(
+                ".*?(?:" + pattern[len(PolicyRule.REGEX_PREFIX):] + ")",
+                re.IGNORECASE
+            )
+        except re.error as regex_err:
+            raise ValueError(f"{self.id}: invalid regex {pattern!r}: {regex_err.msg}")
+
+    def matches(
+        self,
+        values: dict,
+        row: dict,
+        now: float,
+        consoles: typing.Set[int]
+    ) -> bool:
+        for condition, pattern in self.patterns:
+            value = values[condition]
+            if value is None or not pattern.match(value):
+                return False
+
+        for condition, limit in self.thresholds:
+            field, scale, compare = PolicyRule.THRESHOLD_CONDITIONS[condition]
+            value = row.get(field)
+            if value is None:
+                return False
+            if field == "create_time":
+                value = now - value
+            value /= scale
+            if value < limit if compare == "min" else value > limit:
+                return False
+
+        if self.console is not None and (row["pid"] in consoles) != self.console:
+            return False
+        return True
+
+
+class PolicyDecision:
+    """
+    What the policy decided for one application and which rule decided it.
+    """
+
+    def __init__(
+        self,
+        application: str,
+        included: bool,
+        rule: typing.Optional[str],
+        row: dict
+    ) -> None:
+        self.application = application
+        self.included = included
+        # None when the default decided
+        self.rule = rule
+        self.row = row
+
+    def to_dict(self) -> dict:
+        return {
+            "application": self.application,
+            "included": self.included,
+            "rule": self.rule,
+            "pid": self.row.get("pid"),
+            "name": self.row.get("name")
+        }
+
+
+class SavePolicy:
+    """
+    A loaded policy file.
+    """
+
+    # processes that host the console of their parent
+    CONSOLE_HOSTS = ("conhost.exe", "openconsole.exe")
+
+    def __init__(
+        self,
+        spec: dict
+    ) -> None:
+        """
+        Raises:
+            ValueError: When the policy is malformed.
+        """
+        if not isinstance(spec, dict) or not isinstance(spec.get("rules"), list):
+            raise ValueError("a policy needs a list of rules")
+        default = spec.get("default", "exclude")
+        if default not in PolicyRule.ACTIONS:
+            raise ValueError("default must be include or exclude")
+        self.include_by_default = default == "include"
+        self.rules = [
+            PolicyRule(rule, index) for index, rule in enumerate(spec["rules"])
+        ]
+        # the user of a process is costly to fetch, and only fetched for these
+        self.reads_username = any(
+            condition == "username"
+            for rule in self.rules
+            for condition, _ in rule.patterns
+        )
+
+    @classmethod
+    def load(
+        cls,
+        path: str
+    ) -> "SavePolicy":
+        """
+        Raises:
+            OSError: When the file cannot be read.
+            ValueError: When it is not a valid policy.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def evaluate(
+        self,
+        roots: typing.Iterable[dict],
+        rows: typing.Iterable[dict],
+        application_of: typing.Callable[[dict], typing.Optional[str]]
+    ) -> typing.List[PolicyDecision]:
+        """
+        Decides every application in one pass over the snapshot.
+
+        Args:
+            roots: The processes left after folding helpers.
+            rows: Every process, to find the ones owning a console.
+            application_of: Maps a process to its application, `None` if ignored.
+
+        Returns:
+            list: One decision per application, included ones first. An
+            application with several processes is included when any is.
+        """
+        now = time.time()
+        consoles = set()
+        if any(rule.console is not None for rule in self.rules):
+            consoles = {
+                row.get("ppid") for row in rows
+                if (row.get("name") or "").casefold() in SavePolicy.CONSOLE_HOSTS
+            }
+
+        decisions = {}
+        for row in roots:
+            application = application_of(row)
+            if application is None:
+                continue
+            previous = decisions.get(application)
+            if previous is not None and previous.included:
+                continue
+
+            cmdline = row.get("cmdline") or []
+            values = {
+                "exe": (row.get("exe") or application).replace("\\", "/"),
+                "name": row.get("name"),
+                "username": row.get("username") if self.reads_username else None,
+                "argv": " ".join(cmdline[1:])
+            }
+            decision = PolicyDecision(application, self.include_by_default, None, row)
+            for rule in self.rules:
+                if rule.matches(values, row, now, consoles):
+                    decision = PolicyDecision(
+                        application,
+                        rule.action == "include",
+                        rule.id,
+                        row
+                    )
+                    break
+            decisions[application] = decision
+
+        return sorted(
+            decisions.values(),
+            key=lambda decision: (not decision.included, decision.application)
+        )
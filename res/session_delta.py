@@ -0,0 +1,98 @@
+"""
+Difference between the running applications and the previously saved session, used
+by `save --incremental` so that only what changed needs a decision.
+"""
+import typing
+
+from res.session_format import PersistApplicationType
+
+
+class SessionDelta:
+    """
+    Set based diff on canonical application keys.
+
+    * `new`: running now, but neither saved nor seen at the previous save.
+    * `vanished`: saved in the previous session and running at the previous save,
+      but no longer running.
+
+    Every other application keeps its previous decision, so a vanished application
+    that was kept is not asked about again.
+    """
+
+    def __init__(
+        self,
+        previous: typing.List[PersistApplicationType],
+        running: typing.Iterable[str],
+        seen: typing.Iterable[str]
+    ) -> None:
+        self.previous = previous
+        self.running = {SessionDelta.key(path): path for path in running}
+
+        saved_keys = {SessionDelta.key(app.path): app for app in previous}
+        seen_keys = {SessionDelta.key(path) for path in seen} or set(saved_keys)
+        running_keys = set(self.running)
+
+        self._saved = saved_keys
+        self.new = sorted(
+            self.running[key]
+            for key in running_keys - seen_keys - saved_keys.keys()
+        )
+        self.vanished = [
+            app.path
+            for key, app in saved_keys.items()
+            if key in seen_keys and key not in running_keys
+        ]
+
+    @staticmethod
+    def key(
+        path: str
+    ) -> str:
+        """
+        Canonical key of an application, its case folded executable path.
+        """
+        return path.strip('"').replace("\\", "/").casefold()
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.new or self.vanished)
+
+    def apply(
+        self,
+        added: typing.Iterable[str],
+        kept: typing.Iterable[str],
+        application_args: typing.Optional[
+            typing.Dict[str, typing.List[typing.List[str]]]
+        ] = None
+    ) -> typing.List[PersistApplicationType]:
+        """
+        Builds the new session on top of the previous one.
+
+        Args:
+            added: The new applications that were selected.
+            kept: The vanished applications that stay in the session.
+            application_args: The canonical argument lists of the added
+            applications, one entry is added for each.
+
+        Returns:
+            list: The previous applications in their order, minus the dropped
+            vanished ones, followed by the added ones.
+        """
+        dropped = {SessionDelta.key(path) for path in self.vanished}
+        dropped -= {SessionDelta.key(path) for path in kept}
+
+        apps = [
+            app for app in self.previous
+            if SessionDelta.key(app.path) not in dropped
+        ]
+        application_args = application_args or {}
+        apps.extend(
+            PersistApplicationType(
+                name=PersistApplicationType.name_from_cmdline([path]),
+                path=path,
+                args=list(args)
+            )
+            for path in added
+            if SessionDelta.key(path) not in self._saved
+            for args in application_args.get(path) or [[]]
+        )
+        return apps
@@ -0,0 +1,325 @@
+"""
+Versioned session file format.
+
+Layout, all integers little endian:-
+
+* header: magic `WJSN`, format version (u16), reserved (u16), entry count (u32).
+* offset table: one (offset u64, length u32) pair per entry.
+* entries: one compact JSON object per application.
+
+The reader memory-maps the file and only decodes the entries it is asked for, so
+opening a big session costs the same as opening a small one. Legacy `.txt` sessions,
+one command line per line with optional `after:` lines, are still readable.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import typing
+
+
+class PersistApplicationType:
+    """
+    Type to represent data stored for each persisted application
+    """
+
+    __slots__ = ("name", "path", "args", "cwd", "env", "after")
+
+    def __init__(
+        self,
+        name: str = None,
+        path: str = None,
+        args: typing.Optional[typing.List[str]] = None,
+        cwd: typing.Optional[str] = None,
+        env: typing.Optional[typing.Dict[str, str]] = None,
+        after: typing.Optional[typing.List[str]] = None
+    ) -> None:
+        # the same applications come back in every session
+        self.name = sys.intern(name) if name else name
+        self.path = sys.intern(path) if path else path
+        # None means `path` is a raw legacy command line
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.after = after or []
+
+    @staticmethod
+    def exe_from_cmdline(
+        cmdline: typing.Union[str, typing.List[str]]
+    ) -> str:
+        """
+        Gets the executable path of a command line.
+
+        Raw command lines are cut after a quoted path or the first `.exe`.
+        """
+        if isinstance(cmdline, list):
+            return cmdline[0] if cmdline else ""
+        if cmdline.startswith('"'):
+            return cmdline[1:].split('"', 1)[0]
+        end = cmdline.lower().find(".exe")
+        return cmdline[:end + 4] if end != -1 else cmdline.split(" ", 1)[0]
+
+    @staticmethod
+    def name_from_cmdline(
+        cmdline: typing.Union[str, typing.List[str]]
+    ) -> str:
+        """
+        Gets the executable name of a command line, e.g. `chrome.exe`.
+        """
+        exe = PersistApplicationType.exe_from_cmdline(cmdline)
+        return exe.replace("\\", "/").rsplit("/", 1)[-1]
+
+    @property
+    def cmdline(self) -> typing.Union[str, typing.List[str]]:
+        """
+        The command line to launch, a raw string for legacy entries.
+        """
+        if self.args is None:
+            return self.path
+        return [self.path, *self.args]
+
+    def to_dict(self) -> dict:
+        data = {"name": self.name, "path": self.path, "args": self.args}
+        if self.cwd:
+            data["cwd"] = self.cwd
+        if self.env:
+            data["env"] = self.env
+        if self.after:
+            data["after"] = self.after
+        return data
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: dict
+    ) -> "PersistApplicationType":
+        return cls(
+            name=data.get("name"),
+            path=data.get("path"),
+            args=data.get("args"),
+            cwd=data.get("cwd"),
+            env=data.get("env"),
+            after=data.get("after")
+        )
+
+    def __repr__(self) -> str:
+        return f"PersistApplicationType({self.name!r}, {self.path!r})"
+
+
+class SessionFormat:
+    """
+    Reads and writes session files.
+    """
+
+    MAGIC = b"WJSN"
+    VERSION = 1
+    EXTENSION = ".wjs"
+    LEGACY_EXTENSION = ".txt"
+
+    HEADER = struct.Struct("<4sHHI")
+    TABLE_ENTRY = struct.Struct("<QI")
+
+    @staticmethod
+    def write(
+        path: str,
+        entries: typing.Iterable[PersistApplicationType]
+    ) -> int:
+        """
+        Writes entries in the versioned format.
+
+        Args:
+            path: The session file to write.
+            entries: The applications to persist.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        return SessionFormat.write_blobs(path, [
+            SessionFormat.encode(entry)
+            for entry in entries
+        ])
+
+    @staticmethod
+    def encode(
+        entry: PersistApplicationType
+    ) -> bytes:
+        return json.dumps(
+            entry.to_dict(),
+            separators=(",", ":"),
+            sort_keys=True
+        ).encode("utf-8")
+
+    @staticmethod
+    def write_blobs(
+        path: str,
+        blobs: typing.List[bytes]
+    ) -> int:
+        """
+        Writes already encoded entries in the versioned format.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        offset = (
+            SessionFormat.HEADER.size + SessionFormat.TABLE_ENTRY.size * len(blobs)
+        )
+        table = bytearray()
+        for blob in blobs:
+            table += SessionFormat.TABLE_ENTRY.pack(offset, len(blob))
+            offset += len(blob)
+
+        with open(path, "wb") as f:
+            f.write(SessionFormat.HEADER.pack(
+                SessionFormat.MAGIC,
+                SessionFormat.VERSION,
+                0,
+                len(blobs)
+            ))
+            f.write(table)
+            for blob in blobs:
+                f.write(blob)
+
+        return offset
+
+    @staticmethod
+    def is_versioned(
+        path: str
+    ) -> bool:
+        with open(path, "rb") as f:
+            return f.read(len(SessionFormat.MAGIC)) == SessionFormat.MAGIC
+
+    @staticmethod
+    def open(
+        path: str
+    ) -> typing.Union["SessionReader", "LegacySessionReader"]:
+        """
+        Opens a session file with the reader matching its format.
+        """
+        if SessionFormat.is_versioned(path):
+            return SessionReader(path)
+        return LegacySessionReader(path)
+
+
+class SessionReader:
+    """
+    Memory-mapped reader that decodes entries on demand.
+    """
+
+    def __init__(
+        self,
+        path: str
+    ) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = None
+        self._count = 0
+
+        if os.fstat(self._file.fileno()).st_size < SessionFormat.HEADER.size:
+            self.close()
+            raise ValueError(f"Truncated session file: {path}")
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self._count = SessionFormat.HEADER.unpack_from(self._map)
+        if magic != SessionFormat.MAGIC:
+            self.close()
+            raise ValueError(f"Not a session file: {path}")
+        if version > SessionFormat.VERSION:
+            self.close()
+            raise ValueError(f"Unsupported session version {version}: {path}")
+
+    def __enter__(self) -> "SessionReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def raw(
+        self,
+        index: int
+    ) -> bytes:
+        """
+        Gets the encoded bytes of one entry without decoding them.
+        """
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        offset, length = SessionFormat.TABLE_ENTRY.unpack_from(
+            self._map,
+            SessionFormat.HEADER.size + SessionFormat.TABLE_ENTRY.size * index
+        )
+        return self._map[offset:offset + length]
+
+    def __getitem__(
+        self,
+        index: int
+    ) -> PersistApplicationType:
+        return PersistApplicationType.from_dict(json.loads(self.raw(index)))
+
+    def __iter__(self) -> typing.Iterator[PersistApplicationType]:
+        for index in range(self._count):
+            yield self[index]
+
+
+class LegacySessionReader:
+    """
+    Reader for the original `.txt` sessions, one command line per line.
+    """
+
+    AFTER_PREFIX = "after:"
+
+    def __init__(
+        self,
+        path: str
+    ) -> None:
+        self.path = path
+        self.entries = []
+
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.lower().startswith(LegacySessionReader.AFTER_PREFIX):
+                    if self.entries:
+                        self.entries[-1].after.extend(
+                            dependency.strip()
+                            for dependency in line[
+                                len(LegacySessionReader.AFTER_PREFIX):
+                            ].split(",")
+                            if dependency.strip()
+                        )
+                    continue
+                self.entries.append(PersistApplicationType(
+                    name=PersistApplicationType.name_from_cmdline(line),
+                    path=line
+                ))
+
+    def __enter__(self) -> "LegacySessionReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(
+        self,
+        index: int
+    ) -> PersistApplicationType:
+        return self.entries[index]
+
+    def __iter__(self) -> typing.Iterator[PersistApplicationType]:
+        return iter(self.entries)
@@ -0,0 +1,344 @@
+"""
+Store for many named sessions under the data directory.
+
+`catalog.json` records name, entry count, created/modified time and content hash of
+every saved session, so listing and resolving sessions never opens a session file.
+The application entries themselves are content addressed: each distinct entry is
+stored once in an object pack, written in the versioned session format, however many
+sessions use it. A save only writes a new small pack holding the entries that were
+not stored yet, and the packs are compacted into one once there are too many.
+"""
+import hashlib
+import json
+import os
+import time
+import typing
+
+from res.session_format import PersistApplicationType, SessionFormat, SessionReader
+from res.tracer import Tracer
+
+
+class SessionStore:
+    """
+    Named sessions resolved through an on-disk catalog index.
+    """
+
+    CATALOG_FILENAME = "catalog.json"
+    PACK_PREFIX = "objects-"
+    SEEN_DIR_SEGMENT = "seen"
+    POLICY_DIR_SEGMENT = "policy"
+    CATALOG_VERSION = 2
+    MAX_PACKS = 8
+
+    def __init__(
+        self,
+        root: str
+    ) -> None:
+        self.root = root
+        self._catalog = None
+        # mtime and size of the catalog file as last read or written
+        self._catalog_stat = None
+        # packs dropped by the next catalog write
+        self._old_packs = []
+
+    @property
+    def catalog_path(self) -> str:
+        return os.path.join(self.root, SessionStore.CATALOG_FILENAME)
+
+    @property
+    def catalog(self) -> dict:
+        """
+        The catalog index, loaded on first use.
+        """
+        if self._catalog is None:
+            if os.path.exists(self.catalog_path):
+                with open(self.catalog_path, "r") as f:
+                    self._catalog = json.load(f)
+                self._catalog_stat = self._stat_catalog()
+            if (
+                self._catalog is None
+                or self._catalog.get("version") != SessionStore.CATALOG_VERSION
+            ):
+                self._catalog = {
+                    "version": SessionStore.CATALOG_VERSION,
+                    "generation": 0,
+                    "packs": [],
+                    # digest -> [pack, index]
+                    "objects": {},
+                    "sessions": {}
+                }
+        return self._catalog
+
+    def _stat_catalog(self) -> typing.Optional[typing.Tuple[int, int]]:
+        try:
+            stat = os.stat(self.catalog_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> None:
+        """
+        Drops the loaded catalog when another process wrote it since, for a store
+        that is kept open, e.g. by the agent.
+        """
+        if self._catalog is not None and self._stat_catalog() != self._catalog_stat:
+            self._catalog = None
+
+    @staticmethod
+    def hash_blob(
+        blob: bytes
+    ) -> str:
+        return hashlib.sha256(blob).hexdigest()
+
+    def names(self) -> typing.List[str]:
+        return sorted(self.catalog["sessions"])
+
+    def __contains__(
+        self,
+        name: str
+    ) -> bool:
+        return name in self.catalog["sessions"]
+
+    def info(
+        self,
+        name: str
+    ) -> typing.Optional[dict]:
+        """
+        Gets the catalog record of a session without opening anything else.
+        """
+        return self.catalog["sessions"].get(name)
+
+    def _pack_path(
+        self,
+        pack: typing.Optional[str]
+    ) -> typing.Optional[str]:
+        return os.path.join(self.root, pack) if pack else None
+
+    def save(
+        self,
+        name: str,
+        apps: typing.Iterable[PersistApplicationType],
+        parent: typing.Optional[str] = None
+    ) -> dict:
+        """
+        Saves or replaces a named session.
+
+        Args:
+            name: The session name.
+            apps: The applications of the session, in launch order.
+            parent: The hash of the session this one is a delta of, if any.
+
+        Returns:
+            dict: The catalog record of the session.
+        """
+        catalog = self.catalog
+        new_blobs = {}
+        hashes = []
+        for app in apps:
+            blob = SessionFormat.encode(app)
+            digest = SessionStore.hash_blob(blob)
+            if digest not in catalog["objects"]:
+                new_blobs[digest] = blob
+            hashes.append(digest)
+
+        now = time.time()
+        previous = catalog["sessions"].get(name)
+        record = {
+            "entries": len(hashes),
+            "created": previous["created"] if previous else now,
+            "modified": now,
+            "hash": hashlib.sha256("".join(hashes).encode("ascii")).hexdigest(),
+            "objects": hashes
+        }
+        if parent:
+            record["parent"] = parent
+        catalog["sessions"][name] = record
+
+        if new_blobs:
+            self._write_pack(new_blobs)
+        if len(catalog["packs"]) > SessionStore.MAX_PACKS:
+            self.compact()
+        self._write_catalog()
+        return record
+
+    def _write_pack(
+        self,
+        blobs: typing.Dict[str, bytes]
+    ) -> str:
+        """
+        Writes a new generation of object pack holding the given entries.
+
+        The catalog is switched to the new pack afterwards, so a crash leaves the
+        previous packs and catalog untouched.
+        """
+        catalog = self.catalog
+        generation = catalog["generation"] + 1
+        pack = f"{SessionStore.PACK_PREFIX}{generation}{SessionFormat.EXTENSION}"
+        Tracer.count(
+            Tracer.BYTES_WRITTEN,
+            SessionFormat.write_blobs(self._pack_path(pack), list(blobs.values()))
+        )
+
+        catalog["generation"] = generation
+        catalog["packs"].append(pack)
+        for index, digest in enumerate(blobs):
+            catalog["objects"][digest] = [pack, index]
+        return pack
+
+    def compact(self) -> None:
+        """
+        Rewrites every entry still referenced by a session into a single pack.
+        """
+        catalog = self.catalog
+        referenced = {}
+        for record in catalog["sessions"].values():
+            for digest in record["objects"]:
+                referenced.setdefault(digest, catalog["objects"][digest])
+
+        readers = {}
+        blobs = {}
+        try:
+            for digest, (pack, index) in referenced.items():
+                if pack not in readers:
+                    readers[pack] = SessionReader(self._pack_path(pack))
+                blobs[digest] = readers[pack].raw(index)
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+        self._old_packs.extend(catalog["packs"])
+        catalog["packs"] = []
+        catalog["objects"] = {}
+        if blobs:
+            self._write_pack(blobs)
+
+    def _write_catalog(self) -> None:
+        temp_path = self.catalog_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.catalog, f, separators=(",", ":"))
+            Tracer.count(Tracer.BYTES_WRITTEN, f.tell())
+        os.replace(temp_path, self.catalog_path)
+        self._catalog_stat = self._stat_catalog()
+
+        for pack in self._old_packs:
+            if pack not in self.catalog["packs"]:
+                try:
+                    os.remove(self._pack_path(pack))
+                except OSError:
+                    pass
+        self._old_packs = []
+
+    def _seen_path(
+        self,
+        name: str,
+        segment: str = SEEN_DIR_SEGMENT
+    ) -> str:
+        return os.path.join(self.root, segment, name + ".json")
+
+    def save_seen(
+        self,
+        name: str,
+        paths: typing.Iterable[str]
+    ) -> None:
+        """
+        Records the candidate applications that were running when a session was
+        saved, so the next incremental save can tell what is new.
+        """
+        seen_path = self._seen_path(name)
+        os.makedirs(os.path.dirname(seen_path), exist_ok=True)
+        with open(seen_path, "w") as f:
+            json.dump(sorted(paths), f)
+            Tracer.count(Tracer.BYTES_WRITTEN, f.tell())
+
+    def save_decisions(
+        self,
+        name: str,
+        decisions: typing.List[dict]
+    ) -> str:
+        """
+        Records which policy rule included or excluded each application of the
+        last unattended save.
+
+        Returns:
+            str: The file written.
+        """
+        decisions_path = self._seen_path(name, SessionStore.POLICY_DIR_SEGMENT)
+        os.makedirs(os.path.dirname(decisions_path), exist_ok=True)
+        with open(decisions_path, "w") as f:
+            json.dump({"saved": time.time(), "decisions": decisions}, f, indent=1)
+            Tracer.count(Tracer.BYTES_WRITTEN, f.tell())
+        return decisions_path
+
+    def load_seen(
+        self,
+        name: str
+    ) -> typing.List[str]:
+        seen_path = self._seen_path(name)
+        if not os.path.exists(seen_path):
+            return []
+        with open(seen_path, "r") as f:
+            return json.load(f)
+
+    def open(
+        self,
+        name: str
+    ) -> "StoredSessionReader":
+        """
+        Opens a stored session, decoding only its own entries from the pack.
+        """
+        record = self.info(name)
+        if record is None:
+            raise KeyError(name)
+        return StoredSessionReader(
+            self.root,
+            [self.catalog["objects"][digest] for digest in record["objects"]]
+        )
+
+
+class StoredSessionReader:
+    """
+    View of the entries of one session inside the shared object packs.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        locations: typing.List[typing.List]
+    ) -> None:
+        self.root = root
+        # [pack, index] of every entry
+        self.locations = locations
+        self._packs = {}
+
+    def __enter__(self) -> "StoredSessionReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for pack in self._packs.values():
+            pack.close()
+        self._packs = {}
+
+    def _pack(
+        self,
+        pack: str
+    ) -> SessionReader:
+        if pack not in self._packs:
+            self._packs[pack] = SessionReader(os.path.join(self.root, pack))
+        return self._packs[pack]
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __getitem__(
+        self,
+        index: int
+    ) -> PersistApplicationType:
+        pack, pack_index = self.locations[index]
+        return self._pack(pack)[pack_index]
+
+    def __iter__(self) -> typing.Iterator[PersistApplicationType]:
+        for pack, pack_index in self.locations:
+            yield self._pack(pack)[pack_index]
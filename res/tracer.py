@@ -0,0 +1,199 @@
+"""
+Timed spans and counters around the save and restore stages, written with `--profile`
+as a Chrome trace that chrome://tracing and https://ui.perfetto.dev open.
+
+Tracing is off unless `Tracer.enable()` was called. While off `Tracer.span()` hands
+out one shared no-op context manager and `Tracer.count()` returns straight away, so
+the calls can stay in the hot paths.
+
+`Tracer.collect_phases()` only sums the seconds of every span name, without keeping
+events, for the run history of every save and restore. Only the spans of the thread
+that called it are summed, the spans of worker threads overlap its own.
+"""
+import os
+import time
+import typing
+
+
+class _NullSpan:
+    """
+    The span handed out while tracing is off.
+    """
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def set(
+        self,
+        **args: typing.Any
+    ) -> None:
+        pass
+
+
+class _Span:
+    """
+    A complete (`ph: X`) trace event, recorded when the block exits.
+    """
+
+    __slots__ = ("name", "args", "started")
+
+    def __init__(
+        self,
+        name: str,
+        args: dict
+    ) -> None:
+        self.name = name
+        self.args = args
+        self.started = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        Tracer.record(self, time.perf_counter())
+
+    def set(
+        self,
+        **args: typing.Any
+    ) -> None:
+        """
+        Adds arguments that are only known inside the block.
+        """
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Process wide trace recorder.
+    """
+
+    NULL_SPAN = _NullSpan()
+    CATEGORY = "weorcanjan"
+
+    # None while tracing is off
+    EVENTS = None
+    COUNTERS = None
+    STARTED = 0.0
+    _get_ident = None
+
+    # span name -> seconds, None while not collected
+    PHASES = None
+    _phases_thread = None
+
+    # counter names
+    PROCESSES_SCANNED = "processes scanned"
+    ACCESS_DENIED = "access denied"
+    DETAILS_FETCHED = "details fetched"
+    BYTES_WRITTEN = "bytes written"
+
+    @staticmethod
+    def enable() -> None:
+        import threading
+
+        Tracer.EVENTS = []
+        Tracer.COUNTERS = {}
+        Tracer.STARTED = time.perf_counter()
+        Tracer._get_ident = threading.get_ident
+
+    @staticmethod
+    def enabled() -> bool:
+        return Tracer.EVENTS is not None
+
+    @staticmethod
+    def collect_phases(
+        enabled: bool = True
+    ) -> None:
+        """
+        Starts summing the span durations of the calling thread again, e.g. for
+        the next run, or stops when `enabled` is False.
+        """
+        import threading
+
+        Tracer._get_ident = threading.get_ident
+        Tracer._phases_thread = threading.get_ident() if enabled else None
+        Tracer.PHASES = {} if enabled else None
+
+    @staticmethod
+    def span(
+        name: str,
+        /,
+        **args: typing.Any
+    ) -> typing.Union[_Span, _NullSpan]:
+        """
+        Opens a timed span, use as `with Tracer.span("stage"):`.
+
+        Args:
+            name: The stage.
+            args: Shown with the span, `name` can be one of them.
+        """
+        if Tracer.EVENTS is None and Tracer.PHASES is None:
+            return Tracer.NULL_SPAN
+        return _Span(name, args)
+
+    @staticmethod
+    def record(
+        span: _Span,
+        ended: float
+    ) -> None:
+        if Tracer.PHASES is not None and Tracer._get_ident() == Tracer._phases_thread:
+            Tracer.PHASES[span.name] = (
+                Tracer.PHASES.get(span.name, 0.0) + ended - span.started
+            )
+        if Tracer.EVENTS is None:
+            return
+        # list.append is atomic, restore launches record from worker threads
+        Tracer.EVENTS.append({
+            "name": span.name,
+            "cat": Tracer.CATEGORY,
+            "ph": "X",
+            "ts": (span.started - Tracer.STARTED) * 1e6,
+            "dur": (ended - span.started) * 1e6,
+            "pid": os.getpid(),
+            "tid": Tracer._get_ident(),
+            "args": span.args
+        })
+
+    @staticmethod
+    def count(
+        name: str,
+        value: int = 1
+    ) -> None:
+        """
+        Adds to a counter, shown as a track of its running total.
+        """
+        if Tracer.EVENTS is None:
+            return
+        total = Tracer.COUNTERS.get(name, 0) + value
+        Tracer.COUNTERS[name] = total
+        Tracer.EVENTS.append({
+            "name": name,
+            "ph": "C",
+            "ts": (time.perf_counter() - Tracer.STARTED) * 1e6,
+            "pid": os.getpid(),
+            "args": {"value": total}
+        })
+
+    @staticmethod
+    def write(
+        path: str
+    ) -> None:
+        """
+        Writes the recorded events in the Chrome trace event format.
+        """
+        import json
+
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": Tracer.EVENTS or [],
+                    "displayTimeUnit": "ms",
+                    "otherData": {"counters": Tracer.COUNTERS or {}}
+                },
+                f,
+                separators=(",", ":")
+            )
+        print(f"Wrote profile to {path}")
@@ -0,0 +1,200 @@
+"""
+Low overhead watch of the running applications.
+
+Each poll only lists the pids and their create times, which is cheap, and fetches
+the attributes of the pids that are new since the previous poll. A pid whose create
+time changed was reused by another process, which replaces the one that exited.
+
+The poll interval doubles while nothing changes, up to `MAX_INTERVAL`, and drops
+back to `MIN_INTERVAL` on a change. The CPU cost is roughly the poll time divided
+by the interval, `doc/test/bench.py` measures the poll time on the process table of
+the machine and on synthetic ones.
+"""
+import time
+import typing
+
+from res.process_tree import ProcessTree
+
+
+class ProcessWatcher:
+    """
+    Keeps the filtered set of running applications up to date.
+    """
+
+    MIN_INTERVAL = 1.0
+    MAX_INTERVAL = 16.0
+    BACKOFF = 2.0
+
+    def __init__(
+        self,
+        application_of: typing.Callable[[dict], typing.Optional[str]],
+        list_pids: typing.Optional[typing.Callable[[], typing.Iterable[int]]] = None,
+        fetch: typing.Optional[typing.Callable[[int], typing.Optional[dict]]] = None,
+        create_time: typing.Optional[
+            typing.Callable[[int], typing.Optional[float]]
+        ] = None
+    ) -> None:
+        """
+        Args:
+            application_of: Maps a process row to its application, or `None` when
+            it is ignored. The same filter `save_session` uses.
+            list_pids: Lists the running pids. Defaults to `psutil.pids`.
+            fetch: Fetches the row of one pid, `None` when it is gone. Defaults to
+            `ProcessSnapshot.fetch`, which leaves the command line until the filter
+            reads it.
+            create_time: Gets the create time of one pid, `None` when it is gone,
+            to tell a reused pid. Defaults to `ProcessSnapshot.create_time` with
+            psutil, and to no check with `list_pids` and `fetch` given.
+        """
+        self.application_of = application_of
+        self.list_pids = list_pids
+        self.fetch = fetch
+        self.create_time = create_time or (lambda pid: None)
+        # drops what was fetched for a pid that is gone
+        self.forget = lambda pid: None
+        if list_pids is None or fetch is None:
+            import psutil
+
+            from res.process_snapshot import ProcessSnapshot
+
+            self.list_pids = list_pids or psutil.pids
+            self.fetch = fetch or ProcessSnapshot.fetch
+            self.create_time = create_time or ProcessSnapshot.create_time
+            self.forget = ProcessSnapshot.forget
+
+        # pid -> create time of every known process, including ignored ones so they
+        # are not fetched again
+        self.known = {}
+        # helpers fold into their application, only roots become candidates
+        self.tree = ProcessTree()
+        # pid -> application of the roots that passed the filter
+        self.candidates = {}
+        self.interval = ProcessWatcher.MIN_INTERVAL
+        self.polls = 0
+        self.fetched = 0
+        self.errors = 0
+
+    @property
+    def applications(self) -> typing.Set[str]:
+        return set(self.candidates.values())
+
+    def seed(
+        self,
+        rows: typing.Iterable[dict]
+    ) -> None:
+        """
+        Starts from an already taken snapshot instead of fetching every pid.
+        """
+        rows = list(rows)
+        self.known.update((row["pid"], self.create_time(row["pid"])) for row in rows)
+        self._add(rows)
+
+    def _add(
+        self,
+        rows: typing.List[dict]
+    ) -> None:
+        self._add_roots(self.tree.extend(rows))
+
+    def _add_roots(
+        self,
+        pids: typing.List[int]
+    ) -> None:
+        for pid in pids:
+            application = self.application_of(self.tree.rows[pid])
+            if application is not None:
+                self.candidates[pid] = application
+
+    def poll(self) -> bool:
+        """
+        Updates the applications from the pids that appeared or vanished.
+
+        A pid only becomes known or forgotten once it was added to or removed from
+        the tree, so a poll that raises is retried by the next one.
+
+        Returns:
+            bool: True when the set of applications changed.
+        """
+        before = self.applications
+        pids = set(self.list_pids())
+
+        vanished = [
+            pid for pid, created in self.known.items()
+            if pid not in pids or self.create_time(pid) != created
+        ]
+        for pid in vanished:
+            self.candidates.pop(pid, None)
+            # the processes that folded into it, e.g. after a launcher stub exited
+            roots = self.tree.remove(pid)
+            del self.known[pid]
+            self.forget(pid)
+            self._add_roots(roots)
+
+        # fetched together so that a parent and child that appeared in the same
+        # poll still fold
+        created = {}
+        rows = []
+        for pid in pids - self.known.keys():
+            created[pid] = self.create_time(pid)
+            self.fetched += 1
+            row = self.fetch(pid)
+            if row is not None:
+                rows.append(row)
+        self._add(rows)
+        self.known.update(created)
+
+        self.polls += 1
+        return self.applications != before
+
+    def try_poll(self) -> bool:
+        """
+        Polls, printing an error instead of raising it, so that one bad poll does
+        not end a watch or the agent.
+
+        Returns:
+            bool: True when the set of applications changed, False after an error.
+        """
+        try:
+            return self.poll()
+        except Exception as poll_err:
+            self.errors += 1
+            print(
+                f"{time.strftime('%H:%M:%S')} poll failed, keeping the previous "
+                f"applications: {poll_err!r}"
+            )
+            return False
+
+    def next_interval(
+        self,
+        changed: bool
+    ) -> float:
+        if changed:
+            self.interval = ProcessWatcher.MIN_INTERVAL
+        else:
+            self.interval = min(
+                self.interval * ProcessWatcher.BACKOFF,
+                ProcessWatcher.MAX_INTERVAL
+            )
+        return self.interval
+
+    def run(
+        self,
+        on_change: typing.Callable[["ProcessWatcher"], None],
+        should_stop: typing.Callable[[], bool] = lambda: False
+    ) -> None:
+        """
+        Polls with an adaptive interval until `should_stop` or Ctrl+C.
+
+        Args:
+            on_change: Called after every poll that changed the applications.
+            should_stop: Checked before every poll.
+        """
+        on_change(self)
+        try:
+            while not should_stop():
+                time.sleep(self.interval)
+                changed = self.try_poll()
+                if changed:
+                    on_change(self)
+                self.next_interval(changed)
+        except KeyboardInterrupt:
+            pass
@@ -20,20 +20,24 @@ test session file.
 """
 
 # core
-import argparse
-from itertools import chain
+# keep module level imports to what every command needs, this runs at every login
+# and the rest is imported by the commands that use it
+# (see doc/test/importtime_budget.py)
 import os
-import pathlib
-# from pprint import pprint
-import pprint
-import platform
-import psutil
-import subprocess
+import sys
 import typing
-# user land
-import questionary
 # local-res
-from res.ignored_process_list import IGNORE_LIST
+from res.session_format import PersistApplicationType, SessionFormat
+from res.tracer import Tracer
+
+if typing.TYPE_CHECKING:
+    from res.argv_canonicalizer import ArgvCanonicalizer
+    from res.decision_cache import DecisionCache
+    from res.ignore_matcher import IgnoreMatcher
+    from res.process_snapshot import ProcessSnapshot
+    from res.save_policy import SavePolicy
+    from res.session_store import SessionStore
+    from res.watcher import ProcessWatcher
 
 """
 too complicated:-
@@ -50,17 +54,52 @@ class Weorcanjan:
     # static class attributes
     DATA_DIR_SEGMENT = "weorcanjan"
     SESSION_DIR_SEGMENT = "saved-sessions"
+    SNAPSHOT_DIR_SEGMENT = "snapshots"
+    IGNORE_DIR_SEGMENT = "ignore"
     DEFAULT_EXTENSION = ".txt"
     TEST_SESSION_FILENAME = f"test_session{DEFAULT_EXTENSION}"
     MYIGNORE_FILENAME = f"my_ignore{DEFAULT_EXTENSION}"
     MANY_PROCESS = 190
 
-    IGNORE_SET = set(IGNORE_LIST)
+    # built from IGNORE_LIST on first use
+    IGNORE_MATCHER = None
+
+    # built from ARGV_PROFILES on first use
+    ARGV_CANONICALIZER = None
+    # application -> its distinct canonical argument lists, filled with the
+    # applications by get_open_applications and get_live_applications
+    APPLICATION_ARGS = {}
 
     DEFAULT_UI = "questionary"
 
     ARGS = None
 
+    # commands that never prompt, skip the version report and the process count,
+    # restore only walks the process table once to skip running applications
+    FAST_ACTIONS = ("restore", "list", "show", "status", "stats")
+
+    # one process table walk shared by every stage of the invocation
+    SNAPSHOT = None
+
+    STORE = None
+
+    DECISION_CACHE = None
+
+    # written by watch for save to use
+    LIVE_FILENAME = "live_session.json"
+
+    # commands a running agent serves, see res/agent.py
+    AGENT_ACTIONS = ("save", "restore", "list", "status")
+    # the AgentServer and ProcessWatcher, only set in the agent process
+    AGENT = None
+    AGENT_WATCHER = None
+    # False while the agent serves a command, which cannot prompt
+    INTERACTIVE = True
+
+    # perf_counter when the action started, saves and restores are recorded in
+    # the run history, see res/run_history.py
+    RUN_STARTED = None
+
     @classmethod
     def factory_method(cls):
         pass
@@ -69,6 +108,8 @@ class Weorcanjan:
     def open_explorer(
         path: str
     ) -> None:
+        import subprocess
+
         try:
             proc = subprocess.Popen(
                 ["explorer.exe", path],
@@ -88,67 +129,176 @@ class Weorcanjan:
             Weorcanjan.DATA_DIR_SEGMENT,
             *paths
         )
-        if Weorcanjan.ARGS.debug:
+        if getattr(Weorcanjan.ARGS, "debug", False):
             print(__name__, f"get_data_path: {root_path}")
             print(root_path)
         return root_path
 
+    @staticmethod
+    def get_ignore_matcher() -> "IgnoreMatcher":
+        """
+        Gets the ignore matcher, compiling `IGNORE_LIST` on first use.
+        """
+        if Weorcanjan.IGNORE_MATCHER is None:
+            from res.ignore_matcher import IgnoreMatcher
+            from res.ignored_process_list import IGNORE_LIST
+
+            Weorcanjan.IGNORE_MATCHER = IgnoreMatcher(IGNORE_LIST)
+        return Weorcanjan.IGNORE_MATCHER
+
+    @staticmethod
+    def get_argv_canonicalizer() -> "ArgvCanonicalizer":
+        """
+        Gets the canonicalizer of saved command lines, built on first use.
+        """
+        if Weorcanjan.ARGV_CANONICALIZER is None:
+            from res.argv_canonicalizer import ArgvCanonicalizer
+
+            Weorcanjan.ARGV_CANONICALIZER = ArgvCanonicalizer()
+        return Weorcanjan.ARGV_CANONICALIZER
+
     # use the questionary to put to ignore
     @staticmethod
     def merge_user_ignore(
-        myignore_filename = None
+        myignore_filename: typing.Optional[str] = None,
+        session_name: typing.Optional[str] = None,
+        rules: typing.Optional[typing.List[str]] = None
     ) -> None:
+        """
+        Loads the ignore rules layered from the built-in list, the user file, the
+        file of the session and the command line.
+
+        The compiled rules are cached in the data directory and only rebuilt when
+        one of the layers changed, see `res/ignore_index.py`.
+
+        Args:
+            myignore_filename: The user file in the saved session's directory.
+            Defaults to `MYIGNORE_FILENAME`.
+            session_name: Adds `saved-sessions/ignore/<session_name>.txt`.
+            rules: Rules from the command line, applied last.
+        """
+        from res.ignore_index import IgnoreIndex, IgnoreLayer
 
         if myignore_filename is None:
             myignore_filename = Weorcanjan.MYIGNORE_FILENAME
+        elif not os.path.splitext(myignore_filename)[1]:
+            myignore_filename += Weorcanjan.DEFAULT_EXTENSION
+
+        layers = [
+            IgnoreLayer.builtin(),
+            IgnoreLayer(
+                "user",
+                path=Weorcanjan.get_data_path(
+                    Weorcanjan.SESSION_DIR_SEGMENT,
+                    myignore_filename
+                )
+            )
+        ]
+        if session_name:
+            layers.append(IgnoreLayer(
+                "session",
+                path=Weorcanjan.get_data_path(
+                    Weorcanjan.SESSION_DIR_SEGMENT,
+                    Weorcanjan.IGNORE_DIR_SEGMENT,
+                    session_name + Weorcanjan.DEFAULT_EXTENSION
+                )
+            ))
+        if rules:
+            layers.append(IgnoreLayer("command line", rules=list(rules)))
 
-        # get expected my ignore file name
-        full_path = Weorcanjan.get_data_path(
-            Weorcanjan.SESSION_DIR_SEGMENT,
-            myignore_filename
-        )
+        Weorcanjan.ensure_data_dir()
+        index = IgnoreIndex(Weorcanjan.get_data_path(IgnoreIndex.FILENAME), layers)
+        with Tracer.span("ignore merge") as span:
+            Weorcanjan.IGNORE_MATCHER = index.load()
+            span.set(cached=index.cached)
 
-        # merge in the users choices that are not part of the repository
-        if os.path.exists(full_path):
-            print("Found user my ignore list")
+        print(f"Ignore rules: {index.summary()}")
+        if Weorcanjan.ARGS.debug:
+            import pprint
 
-            with open(full_path) as f:
-                for process in f.read().splitlines():
-                    if tuple(process) not in Weorcanjan.IGNORE_SET:
-                        Weorcanjan.IGNORE_SET.add(process)
+            pprint.pprint(Weorcanjan.IGNORE_MATCHER.rules)
 
-            print("Completed merge of user ignore script")
-            print("--> merged list:")
-            pprint.pprint(Weorcanjan.IGNORE_SET)
-            print("")
-        else:
-            print("")
-            print("Could not find user ignore list..")
-            print("")
+    @staticmethod
+    def get_snapshot() -> "ProcessSnapshot":
+        """
+        Gets the process snapshot for this invocation, taking it on first use.
+
+        With `--replay` the snapshot is a recorded process table instead.
+
+        Returns:
+            ProcessSnapshot: The shared snapshot.
+        """
+        if Weorcanjan.SNAPSHOT is None:
+            from res.process_snapshot import ProcessSnapshot
+
+            replay_path = getattr(Weorcanjan.ARGS, "replay", None)
+            if replay_path:
+                print(f"Replaying recorded process table: {replay_path}")
+                Weorcanjan.SNAPSHOT = ProcessSnapshot.replay(replay_path)
+            else:
+                Weorcanjan.SNAPSHOT = ProcessSnapshot.take()
+        return Weorcanjan.SNAPSHOT
+
+    @staticmethod
+    def load_policy(
+        policy_path: str
+    ) -> "SavePolicy":
+        """
+        Loads a save policy, exiting when it is invalid.
+
+        The fields its rules read, e.g. `username`, are fetched by the snapshot
+        rows on first access, only for the applications the rules decide.
+        """
+        from res.save_policy import SavePolicy
+
+        try:
+            policy = SavePolicy.load(policy_path)
+        except (OSError, ValueError) as policy_err:
+            print(f"Invalid policy {policy_path}: {policy_err}")
+            exit(1)
+        return policy
+
+    @staticmethod
+    def record_snapshot(
+        out_path: typing.Optional[str] = None
+    ) -> None:
+        """
+        Records the full process table for replaying it elsewhere with `--replay`.
+
+        Args:
+            out_path: The file to write. Defaults to a time stamped file in the
+            snapshots folder of the data directory.
+        """
+        from res.process_snapshot import ProcessSnapshot
+
+        if out_path is None:
+            import time
+
+            snapshots_dir = Weorcanjan.get_data_path(
+                Weorcanjan.SNAPSHOT_DIR_SEGMENT
+            )
+            os.makedirs(snapshots_dir, exist_ok=True)
+            out_path = os.path.join(
+                snapshots_dir,
+                time.strftime("snapshot-%Y%m%d-%H%M%S")
+                + ProcessSnapshot.RECORD_EXTENSION
+            )
+
+        count = ProcessSnapshot.record(out_path)
+        print(f"Recorded {count} processes to {out_path}")
 
     @staticmethod
     def get_number_of_processes() -> int:
         """
         Gets the number of processes that are running on Windows.
 
-        This function uses the `psutil` library to get a list of all the processes that
-        are currently running on Windows. It then iterates over the list of processes
-        and counts the number of processes that have a name. The number of processes
-        with a name is returned as the result of the function.
+        This function counts the processes that have a name in the shared process
+        snapshot, so it does not walk the process table itself.
 
         Returns:
             int: The number of processes that are running on Windows.
         """
-        processes = psutil.process_iter(["name"])
-        number_of_processes = 0
-        for process in processes:
-            try:
-                name = process.info["name"]  # noqa
-                if name:
-                    number_of_processes += 1
-            except psutil.Error:
-                pass
-        return number_of_processes
+        return Weorcanjan.get_snapshot().count
 
     @staticmethod
     def ensure_data_dir() -> None:
@@ -158,9 +308,42 @@ class Weorcanjan:
         )
 
         if False is os.path.isdir(saved_sessions_dir):
+            import pathlib
+
             (pathlib.Path(saved_sessions_dir)
              .mkdir(parents=True, exist_ok=True))
 
+    @staticmethod
+    def get_store() -> "SessionStore":
+        """
+        Gets the session store of the saved session's directory.
+
+        Returns:
+            SessionStore: The shared store.
+        """
+        if Weorcanjan.STORE is None:
+            from res.session_store import SessionStore
+
+            Weorcanjan.ensure_data_dir()
+            Weorcanjan.STORE = SessionStore(
+                Weorcanjan.get_data_path(Weorcanjan.SESSION_DIR_SEGMENT)
+            )
+        return Weorcanjan.STORE
+
+    @staticmethod
+    def get_decision_cache() -> "DecisionCache":
+        """
+        Gets the remembered save / omit answers from the data directory.
+        """
+        if Weorcanjan.DECISION_CACHE is None:
+            from res.decision_cache import DecisionCache
+
+            Weorcanjan.ensure_data_dir()
+            Weorcanjan.DECISION_CACHE = DecisionCache(
+                Weorcanjan.get_data_path(DecisionCache.FILENAME)
+            )
+        return Weorcanjan.DECISION_CACHE
+
     @staticmethod
     def create_test_session() -> None:
         """
@@ -181,24 +364,25 @@ class Weorcanjan:
         chrome_path = None
         firefox_path = None
 
-        for process in psutil.process_iter([
-            "name",
-            "cmdline"
-        ]):
-            try:
-                name = process.info["name"]  # noqa
-                cmdline = process.info["cmdline"]  # noqa
-                print(f"name: {name}")
-                print(f"cmdline: {cmdline}")
+        snapshot = Weorcanjan.get_snapshot()
+
+        if Weorcanjan.ARGS.debug:
+            for process in snapshot:
+                print(f"name: {process['name']}")
+                print(f"cmdline: {process['cmdline']}")
                 print("")
-                if name == "chrome.exe":
-                    print("Found Chrome running")
-                    chrome_path = cmdline[0]
-                if name == "firefox.exe":
-                    print("Found Firefox running")
-                    firefox_path = cmdline[0]
-            except psutil.Error as psutil_err:
-                print(psutil_err)
+
+        for process in snapshot.by_name.get("chrome.exe", []):
+            if process["cmdline"]:
+                print("Found Chrome running")
+                chrome_path = process["cmdline"][0]
+                break
+
+        for process in snapshot.by_name.get("firefox.exe", []):
+            if process["cmdline"]:
+                print("Found Firefox running")
+                firefox_path = process["cmdline"][0]
+                break
 
         if None is chrome_path and None is firefox_path:
             print("You must run either chrome and/or firefox for this to work")
@@ -221,30 +405,55 @@ class Weorcanjan:
     # 1) ask for each application
     # 2) ask for args for each selected
 
-    class PersistApplicationType:
-        """
-        Type to represent data stored for each persisted application
-        """
-        name: str = None,
-        path: str = None,
-        args: typing.Optional[str] = None
+    PersistApplicationType = PersistApplicationType
+
+    SAVE_QUESTION = "Do you want to save {app}? (y/n): "
+    KEEP_QUESTION = "{app} is no longer running, keep it in the session? (y/n): "
 
     @staticmethod
     def basic_input_questions(
-        open_applications
-    ):
+        open_applications,
+        question: str = SAVE_QUESTION,
+        cache: typing.Optional["DecisionCache"] = None,
+        ask_cached: bool = False
+    ) -> typing.List[str]:
         save_applications = []
+        remembered = 0
 
         # used when input == basic
-        for app in open_applications:
-            print(f"Applications: {app}")
-            response = input("Do you want to save " + app + "? (y/n): ")
-            if response == "y":
-                save_applications.append(app)
-            else:
-                print(f"Omitted {app}")
-
-        pass
+        with Tracer.span("prompt", applications=len(open_applications)) as span:
+            for app in open_applications:
+                key = None
+                if cache is not None:
+                    key = cache.key(app, Weorcanjan.APPLICATION_ARGS.get(app))
+                    decision = None if ask_cached else cache.get(key)
+                    if decision is not None:
+                        remembered += 1
+                        if decision:
+                            save_applications.append(app)
+                        continue
+
+                if not Weorcanjan.INTERACTIVE:
+                    from res.agent import AgentClient
+
+                    # the CLI asks, running the save itself
+                    exit(AgentClient.FALLBACK)
+
+                print(f"Applications: {app}")
+                response = input(question.format(app=app))
+                if response == "y":
+                    save_applications.append(app)
+                else:
+                    print(f"Omitted {app}")
+
+                if cache is not None:
+                    cache.put(key, response == "y")
+            span.set(remembered=remembered, saved=len(save_applications))
+
+        if remembered:
+            print(f"Used {remembered} remembered answers, --ask-all to ask again")
+
+        return save_applications
 
     class QuestionaryChecklistQuestions:
         # questionary.select(
@@ -258,9 +467,476 @@ class Weorcanjan:
 
     # todo(matt): or class GUIInputSession thing
 
+    @staticmethod
+    def get_open_applications() -> typing.Set[str]:
+        """
+        Gets the executable of every running application that is not ignored.
+
+        Helper processes are folded into the application that started them first,
+        so only the applications themselves are filtered and asked about. Their
+        canonical arguments are kept in `APPLICATION_ARGS`.
+
+        Returns:
+            set: The executable paths taken from the shared snapshot.
+        """
+        processes = []
+
+        roots = Weorcanjan.get_snapshot().tree.roots()
+        with Tracer.span("match", roots=len(roots)) as span:
+            for process in roots:
+                application = Weorcanjan.application_of(process)
+                if application is not None:
+                    processes.append((application, process))
+            Weorcanjan.APPLICATION_ARGS = Weorcanjan.collect_application_args(
+                processes
+            )
+            span.set(applications=len(Weorcanjan.APPLICATION_ARGS))
+
+        return set(Weorcanjan.APPLICATION_ARGS)
+
+    @staticmethod
+    def collect_application_args(
+        processes: typing.Iterable[typing.Tuple[str, dict]]
+    ) -> typing.Dict[str, typing.List[typing.List[str]]]:
+        """
+        Gets the distinct argument lists every application runs with.
+
+        Volatile arguments are dropped, and command lines that are the same once
+        canonical collapse, see `res/argv_canonicalizer.py`.
+
+        Args:
+            processes: The application of each process and its snapshot row.
+
+        Returns:
+            dict: Application -> its argument lists, sorted.
+        """
+        from res.argv_canonicalizer import ArgvTrie
+
+        canonicalizer = Weorcanjan.get_argv_canonicalizer()
+        trie = ArgvTrie()
+        application_args = {}
+        for application, process in processes:
+            args = canonicalizer.strip(application, process["cmdline"][1:])
+            found = application_args.setdefault(application, [])
+            if trie.insert(canonicalizer.key_of(application, args)) is None:
+                found.append(args)
+        for found in application_args.values():
+            found.sort()
+        return application_args
+
+    @staticmethod
+    def persist_applications(
+        applications: typing.Iterable[str]
+    ) -> typing.List[PersistApplicationType]:
+        """
+        Builds the session entries of the selected applications, one for each
+        argument list in `APPLICATION_ARGS`.
+        """
+        return [
+            Weorcanjan.PersistApplicationType(
+                name=PersistApplicationType.name_from_cmdline([app]),
+                path=app,
+                args=list(args)
+            )
+            for app in applications
+            for args in Weorcanjan.APPLICATION_ARGS.get(app) or [[]]
+        ]
+
+    @staticmethod
+    def application_of(
+        process: dict
+    ) -> typing.Optional[str]:
+        """
+        Gets the application of a process row, shared by save and watch.
+
+        Args:
+            process: A snapshot row.
+
+        Returns:
+            str: The executable from the command line, or `None` when the process
+            has no command line or is ignored.
+        """
+        matcher = Weorcanjan.get_ignore_matcher()
+        # matched on the cheap fields first, the command line of an ignored
+        # process is never fetched
+        if process["exe"] and matcher.matches(process["name"], process["exe"]):
+            return None
+        cmdline = process["cmdline"]
+        if not cmdline:
+            return None
+        if not process["exe"] and matcher.matches(process["name"], cmdline[0]):
+            return None
+        return cmdline[0]
+
+    @staticmethod
+    def get_live_applications() -> typing.Optional[typing.Set[str]]:
+        """
+        Gets the applications kept up to date by a running `watch`.
+
+        The ignore rules are applied again, as they may have changed since the
+        watch started.
+
+        Returns:
+            set: The executable paths, or `None` when no watch is running.
+        """
+        import json
+
+        live_path = Weorcanjan.get_data_path(Weorcanjan.LIVE_FILENAME)
+        try:
+            with open(live_path, "r") as f:
+                live = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        import psutil
+
+        # the watch may have been killed, and its pid reused since
+        try:
+            watcher_process = psutil.Process(live["pid"])
+            if abs(watcher_process.create_time() - live["started"]) > 1:
+                return None
+        except psutil.Error:
+            return None
+
+        matcher = Weorcanjan.get_ignore_matcher()
+        applications = {
+            app for app in live["applications"]
+            if not matcher.matches(matcher.basename(matcher.normalize(app)), app)
+        }
+        live_args = live.get("args", {})
+        Weorcanjan.APPLICATION_ARGS = {
+            app: live_args.get(app, []) for app in applications
+        }
+        return applications
+
+    @staticmethod
+    def watched_application_args(
+        watcher: "ProcessWatcher"
+    ) -> typing.Dict[str, typing.List[typing.List[str]]]:
+        """
+        Gets the argument lists of the applications a watch keeps, for save.
+        """
+        return Weorcanjan.collect_application_args(
+            (application, watcher.tree.rows[pid])
+            for pid, application in watcher.candidates.items()
+        )
+
+    @staticmethod
+    def write_live_applications(
+        applications: typing.Set[str],
+        started: float,
+        application_args: typing.Optional[dict] = None
+    ) -> None:
+        import json
+
+        live_path = Weorcanjan.get_data_path(Weorcanjan.LIVE_FILENAME)
+        temp_path = live_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {
+                    "pid": os.getpid(),
+                    "started": started,
+                    "applications": sorted(applications),
+                    "args": application_args or {}
+                },
+                f,
+                separators=(",", ":")
+            )
+        os.replace(temp_path, live_path)
+
+    @staticmethod
+    def watch_session() -> None:
+        """
+        Keeps the running applications up to date until Ctrl+C, so that `save`
+        does not have to walk the process table.
+
+        The watch starts from the snapshot of this invocation, then only fetches
+        the processes that appear. Its CPU use is reported on exit.
+        """
+        import time
+
+        import psutil
+
+        from res.watcher import ProcessWatcher
+
+        Weorcanjan.ensure_data_dir()
+        started = psutil.Process().create_time()
+        watcher = ProcessWatcher(Weorcanjan.application_of)
+        watcher.seed(Weorcanjan.get_snapshot())
+        previous = set()
+
+        def on_change(changed_watcher: ProcessWatcher) -> None:
+            nonlocal previous
+            applications = changed_watcher.applications
+            Weorcanjan.write_live_applications(
+                applications,
+                started,
+                Weorcanjan.watched_application_args(changed_watcher)
+            )
+            print(
+                f"{time.strftime('%H:%M:%S')} {len(applications)} applications "
+                f"(+{len(applications - previous)} -{len(previous - applications)})"
+            )
+            previous = applications
+
+        print("Watching, save uses the live applications... Ctrl+C to stop")
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            watcher.run(on_change)
+        finally:
+            try:
+                os.remove(Weorcanjan.get_data_path(Weorcanjan.LIVE_FILENAME))
+            except OSError:
+                pass
+
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        print(
+            f"Watched for {wall:.0f} s with {watcher.polls} polls and "
+            f"{watcher.fetched} fetched processes, "
+            f"{cpu / wall * 100 if wall else 0:.3f}% of one core"
+        )
+
+    @staticmethod
+    def agent_session() -> None:
+        """
+        Runs the resident agent until Ctrl+C, see `res/agent.py`.
+
+        The agent watches the running applications like `watch` does, and between
+        two polls serves `save`, `restore`, `list` and `status` from the process
+        tree, ignore rules and session catalog it keeps in memory.
+        """
+        import time
+
+        import psutil
+
+        from res.agent import AgentClient, AgentServer
+        from res.watcher import ProcessWatcher
+
+        info_path = Weorcanjan.get_data_path(AgentServer.FILENAME)
+        if AgentClient.request(info_path, ["status"]) is not None:
+            print("An agent is already running, see `status`")
+            exit(1)
+
+        Weorcanjan.ensure_data_dir()
+        started = psutil.Process().create_time()
+        watcher = ProcessWatcher(Weorcanjan.application_of)
+        watcher.seed(Weorcanjan.get_snapshot())
+        Weorcanjan.write_live_applications(
+            watcher.applications,
+            started,
+            Weorcanjan.watched_application_args(watcher)
+        )
+
+        # the rules of the agent's invocation, requests may layer their own
+        matcher = Weorcanjan.get_ignore_matcher()
+        parser = Weorcanjan.build_parser()
+        Weorcanjan.get_store().catalog
+
+        server = AgentServer(info_path, started)
+        Weorcanjan.AGENT = server
+        Weorcanjan.AGENT_WATCHER = watcher
+        server.publish()
+        print(f"Agent listening on port {server.port}... Ctrl+C to stop")
+
+        def poll() -> bool:
+            changed = watcher.try_poll()
+            if changed:
+                Weorcanjan.write_live_applications(
+                    watcher.applications,
+                    started,
+                    Weorcanjan.watched_application_args(watcher)
+                )
+            return changed
+
+        try:
+            while True:
+                request = server.accept(watcher.interval)
+                if request is None:
+                    watcher.next_interval(poll())
+                    continue
+
+                conn, argv, context = request
+                served = time.perf_counter()
+                # a handful of new pids at most, the request sees them
+                poll()
+                try:
+                    with AgentServer.caller_context(context["cwd"], context["env"]):
+                        exit_code, output = Weorcanjan.serve_agent_request(
+                            parser,
+                            argv
+                        )
+                except OSError:
+                    # the directory of the CLI is gone, it runs the command itself
+                    exit_code, output = AgentClient.FALLBACK, ""
+                Weorcanjan.IGNORE_MATCHER = matcher
+                server.reply(conn, exit_code, output)
+                server.requests += 1
+                server.busy += time.perf_counter() - served
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            try:
+                os.remove(Weorcanjan.get_data_path(Weorcanjan.LIVE_FILENAME))
+            except OSError:
+                pass
+
+        print(f"Served {server.requests} requests")
+
+    @staticmethod
+    def serve_agent_request(
+        parser: "argparse.ArgumentParser",
+        argv: typing.List[str]
+    ) -> typing.Tuple[int, str]:
+        """
+        Runs a forwarded command line in the agent, capturing what it prints.
+
+        Args:
+            parser: The parser of the CLI.
+            argv: The command line, without the program.
+
+        Returns:
+            tuple: The exit code and the output. `AgentClient.FALLBACK` for the
+            commands the CLI runs itself, e.g. a save that has to ask something.
+        """
+        import contextlib
+        import io
+
+        from res.agent import AgentClient
+        from res.process_snapshot import ProcessSnapshot
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                args = parser.parse_args(argv)
+            except SystemExit:
+                # usage errors and --help are printed by the CLI
+                return AgentClient.FALLBACK, ""
+
+        served = any(
+            Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get(key),
+                args.action
+            )
+            for key in Weorcanjan.AGENT_ACTIONS
+        )
+        if (
+            not served
+            or args.no_agent
+            or args.debug
+            or args.replay
+            or args.profile_path
+        ):
+            return AgentClient.FALLBACK, ""
+
+        # per request state, what other processes may have changed is reloaded
+        Weorcanjan.ARGS = args
+        Weorcanjan.SNAPSHOT = ProcessSnapshot.from_tree(Weorcanjan.AGENT_WATCHER.tree)
+        Weorcanjan.DECISION_CACHE = None
+        Weorcanjan.get_store().refresh()
+
+        exit_code = 0
+        Weorcanjan.INTERACTIVE = False
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                Weorcanjan.run(parser, args)
+            except SystemExit as exit_err:
+                if isinstance(exit_err.code, int):
+                    exit_code = exit_err.code
+                elif exit_err.code is not None:
+                    print(exit_err.code)
+                    exit_code = 1
+            except Exception:
+                import traceback
+
+                # the agent keeps serving
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                Weorcanjan.INTERACTIVE = True
+        return exit_code, output.getvalue()
+
+    @staticmethod
+    def forward_to_agent(
+        argv: typing.List[str]
+    ) -> typing.Optional[int]:
+        """
+        Runs a command line in the agent when one is running, printing its output.
+
+        Only `socket` and `json` are imported, so a served command costs the
+        interpreter start and one localhost round trip.
+
+        Args:
+            argv: The command line, without the program.
+
+        Returns:
+            int: The exit code, or `None` to run the command in this process.
+        """
+        appdata = os.getenv("APPDATA")
+        if not appdata or "--no-agent" in argv:
+            return None
+        names = {
+            name
+            for key in Weorcanjan.AGENT_ACTIONS
+            for name in (
+                Weorcanjan.ARGDEF_ACTIONS[key]["long"],
+                Weorcanjan.ARGDEF_ACTIONS[key]["short"]
+            )
+        }
+        # the agent parses the command line, this only skips the round trip
+        if names.isdisjoint(argv):
+            return None
+
+        from res.agent import AgentClient, AgentServer
+
+        response = AgentClient.request(
+            os.path.join(appdata, Weorcanjan.DATA_DIR_SEGMENT, AgentServer.FILENAME),
+            argv
+        )
+        if response is None or response["exit"] == AgentClient.FALLBACK:
+            return None
+        sys.stdout.write(response["output"])
+        sys.stdout.flush()
+        return response["exit"]
+
+    @staticmethod
+    def agent_status() -> None:
+        """
+        Reports the agent this runs in, or that none is running.
+        """
+        import time
+
+        server = Weorcanjan.AGENT
+        if server is None:
+            print("No agent is running, start one with `agent`")
+            return
+
+        watcher = Weorcanjan.AGENT_WATCHER
+        print(
+            f"Agent {os.getpid()} on port {server.port}, "
+            f"up for {time.time() - server.started:.0f} s"
+        )
+        print(
+            f"{len(watcher.applications)} running applications in "
+            f"{len(watcher.known)} processes, {watcher.polls} polls"
+            + (f", {watcher.errors} failed" if watcher.errors else "")
+        )
+        print(f"{len(Weorcanjan.get_store().names())} saved sessions")
+        if server.requests:
+            print(
+                f"Served {server.requests} requests in "
+                f"{server.busy / server.requests * 1000:.1f} ms on average"
+            )
+
     @staticmethod
     def save_session(
-        session_filename: str = typing.Union[str, None]
+        session_filename: str = typing.Union[str, None],
+        incremental: bool = False,
+        ask_all: bool = False,
+        policy: typing.Optional["SavePolicy"] = None,
+        live_applications: typing.Optional[typing.Set[str]] = None
     ) -> None:
         """
         Saves the state of all the open applications.
@@ -269,95 +945,553 @@ class Weorcanjan:
         creates a set of open applications. The function then asks the user which
         applications they want to save, and saves the list of applications to a file.
 
+        With `incremental` the previous save of the session is the starting point,
+        and only the applications that appeared or vanished since are asked about.
+        Answers are remembered, so applications answered before are not asked
+        about again unless `ask_all` is set.
+
+        While a `watch` is running its live applications are used instead of
+        walking the process table.
+
+        With a `policy` nothing is asked, the policy rules decide every running
+        application and the deciding rules are recorded next to the session.
+
         Args:
             session_filename: The name of the session to save. Defaults
             to `TEST_SESSION_FILENAME`.
+            incremental: Only ask about what changed since the previous save.
+            ask_all: Ask about every application, ignoring remembered answers.
+            policy: Decides without asking, see `res/save_policy.py`.
+            live_applications: The applications of a running watch, see
+            `get_live_applications`, `None` to use the shared snapshot.
 
         Returns:
             None: None.
         """
 
-        # todo(matt): we need the saving args part next
-
         assert None is not session_filename
 
-        # Get a list of all the processes for the current user.
-        processes = psutil.process_iter([
-            "username",
-            "name",
-            "cmdline"
-        ])
+        # Create a set of open applications, from a running watch when there is
+        # one, otherwise from the shared snapshot.
+        open_applications = live_applications
+        if open_applications is None:
+            open_applications = Weorcanjan.get_open_applications()
+        else:
+            print("Using the applications kept up to date by watch")
+
+        store = Weorcanjan.get_store()
+        cache = Weorcanjan.get_decision_cache()
+        parent = None
+
+        if policy is not None:
+            if incremental:
+                print("--incremental is not used with --policy, which decides "
+                      "every application")
+
+            snapshot = Weorcanjan.get_snapshot()
+            with Tracer.span("policy") as span:
+                decisions = policy.evaluate(
+                    snapshot.tree.roots(),
+                    snapshot,
+                    Weorcanjan.application_of
+                )
+                span.set(applications=len(decisions))
 
-        # Create a set of open applications.
-        open_applications = set()
+            for decision in decisions:
+                print(
+                    f"{'+' if decision.included else '-'} {decision.application} "
+                    f"({decision.rule or 'default'})"
+                )
+            decisions_path = store.save_decisions(
+                session_filename,
+                [decision.to_dict() for decision in decisions]
+            )
+            print(f"Recorded the policy decisions in {decisions_path}")
+
+            save_applications = Weorcanjan.persist_applications(sorted(
+                decision.application for decision in decisions
+                if decision.included
+            ))
+        elif incremental and session_filename in store:
+            from res.session_delta import SessionDelta
+
+            with store.open(session_filename) as session:
+                delta = SessionDelta(
+                    list(session),
+                    open_applications,
+                    store.load_seen(session_filename)
+                )
 
-        for process in processes:
-            try:
-                name = process.info["name"]  # noqa
-                cmdline = process.info["cmdline"]  # noqa
-                if cmdline and tuple(cmdline) not in Weorcanjan.IGNORE_SET:
-                    open_applications.add(cmdline[0])
-            except psutil.Error as psutil_err:
-                print(psutil_err)
-
-        saved_sessions_filename = Weorcanjan.get_data_path(
-            Weorcanjan.DATA_DIR_SEGMENT,
+            print(
+                f"{len(delta.new)} new and {len(delta.vanished)} vanished "
+                "applications since the last save"
+            )
+            if not delta.changed:
+                store.save_seen(session_filename, open_applications)
+                print("Nothing changed... exiting")
+                exit(0)
+
+            save_applications = delta.apply(
+                Weorcanjan.basic_input_questions(
+                    delta.new,
+                    cache=cache,
+                    ask_cached=ask_all
+                ),
+                Weorcanjan.basic_input_questions(
+                    delta.vanished,
+                    Weorcanjan.KEEP_QUESTION
+                ),
+                Weorcanjan.APPLICATION_ARGS
+            )
+            parent = store.info(session_filename)["hash"]
+        else:
+            if incremental:
+                print(f"No previous save of {session_filename}, saving everything")
+
+            # a list of applications to save
+            save_applications = Weorcanjan.persist_applications(
+                Weorcanjan.basic_input_questions(
+                    sorted(open_applications),
+                    cache=cache,
+                    ask_cached=ask_all
+                )
+            )
+
+        cache.save()
+
+        if len(save_applications) == 0:
+            print("Nothing to do... exiting")
+            exit(0)
+
+        # Save the list of open applications to the session store.
+        with Tracer.span("session write", entries=len(save_applications)):
+            record = store.save(session_filename, save_applications, parent=parent)
+            store.save_seen(session_filename, open_applications)
+        print(f"Saved {record['entries']} applications to {session_filename}")
+
+        Weorcanjan.record_run("save", session_filename, record["entries"])
+
+    @staticmethod
+    def find_session_file(
+        session_filename: str
+    ) -> str:
+        """
+        Finds a saved session, preferring the versioned format over legacy `.txt`.
+
+        Args:
+            session_filename: The session name, with or without extension.
+
+        Returns:
+            str: The full path of the session file.
+        """
+        full_path = Weorcanjan.get_data_path(
+            Weorcanjan.SESSION_DIR_SEGMENT,
             session_filename
         )
+        if os.path.splitext(session_filename)[1]:
+            return full_path
+        for extension in (SessionFormat.EXTENSION, SessionFormat.LEGACY_EXTENSION):
+            if os.path.exists(full_path + extension):
+                return full_path + extension
+        return full_path + SessionFormat.EXTENSION
 
-        Weorcanjan.ensure_data_dir()
+    @staticmethod
+    def open_session(
+        session_filename: str
+    ) -> typing.Any:
+        """
+        Opens a session through the catalog, falling back to a session file.
 
-        # a list of applications as dicts to save
-        save_applications = []
+        Args:
+            session_filename: The session name, or a session file name.
+
+        Returns:
+            A session reader yielding `PersistApplicationType` entries.
+        """
+        store = Weorcanjan.get_store()
+        if session_filename in store:
+            return store.open(session_filename)
 
-        # old get the minimum...
-        Weorcanjan.basic_input_questions(open_applications)
+        session_file = Weorcanjan.find_session_file(session_filename)
+        if not os.path.exists(session_file):
+            print(f"No saved session named {session_filename}, see `list`")
+            exit(1)
+        return SessionFormat.open(session_file)
 
-        if len(save_applications) == 0:
-            print("Nothing to do... exiting")
-            exit(0)
+    @staticmethod
+    def list_sessions() -> None:
+        """
+        Lists the saved sessions from the catalog index.
+        """
+        import time
+
+        store = Weorcanjan.get_store()
+        names = store.names()
+        if not names:
+            print("No saved sessions")
+            return
+        for name in names:
+            info = store.info(name)
+            modified = time.strftime(
+                "%Y-%m-%d %H:%M",
+                time.localtime(info["modified"])
+            )
+            print(f"{name}: {info['entries']} applications, modified {modified}")
 
-        # Save the list of open applications to a file.
-        with open(saved_sessions_filename, "w") as f:
-            for app in save_applications:
-                f.write(app + "\n")
+    @staticmethod
+    def show_session(
+        session_filename: str
+    ) -> None:
+        """
+        Prints the applications of a saved session.
+        """
+        with Weorcanjan.open_session(session_filename) as session:
+            print(f"{session_filename}: {len(session)} applications")
+            for app in session:
+                line = f"  {app.name}: {app.cmdline}"
+                if app.after:
+                    line += f" (after: {', '.join(app.after)})"
+                print(line)
 
     @staticmethod
     def restore_session(
-        session_filename: str = typing.Union[str, None]
+        session_filename: str = typing.Union[str, None],
+        jobs: typing.Optional[int] = None,
+        stagger: typing.Optional[float] = None,
+        launcher: typing.Optional[typing.Callable] = None,
+        settle_timeout: typing.Optional[float] = None,
+        adaptive: bool = False,
+        cpu_target: typing.Optional[float] = None,
+        disk_target: typing.Optional[float] = None,
+        memory_reserve: typing.Optional[float] = None,
+        reconcile: bool = False,
+        resolve_paths: bool = True
     ) -> None:
         """
         Restores the state of all the applications from the saved session.
 
         This function gets the list of saved applications from a file, and
-        then restores the state of each application.
+        then launches the ones that are not running yet concurrently, honouring
+        any `after:` dependencies.
+        The launch and settle times of every application are kept, and later
+        restores start the applications that took longest first.
+        Every executable is resolved and checked first, and the entries that
+        cannot be launched are reported before anything starts.
 
         Args:
             session_filename: The name of the session to restore. Defaults
             to `SESSION_DEFAULT_FILENAME`.
+            jobs: The maximum number of applications launched at the same time.
+            Defaults to `RestoreEngine.DEFAULT_JOBS`.
+            stagger: The minimum delay in seconds between two launches.
+            Defaults to `RestoreEngine.DEFAULT_STAGGER`.
+            launcher: Replaces `subprocess.Popen`, e.g. a fake one for benchmarks.
+            settle_timeout: The seconds to wait for launched applications to go
+            idle, 0 to not watch them. Defaults to the short
+            `SettleMonitor.DEFAULT_TIMEOUT`.
+            adaptive: Only launch the next application while the machine has room
+            for it, see `res/admission.py`.
+            cpu_target: System CPU percent adaptive launches stay under.
+            disk_target: Disk MiB per second adaptive launches stay under.
+            memory_reserve: MiB of memory adaptive launches leave available.
+            reconcile: Only report the missing applications and the running ones
+            the session does not have, launching nothing.
+            resolve_paths: Resolve and check the executables before launching,
+            off for a `launcher` that starts nothing real, e.g. in benchmarks.
 
         Returns:
             None: None.
         """
         assert None is not session_filename
 
-        session_filename = Weorcanjan.get_data_path(
-            Weorcanjan.SESSION_DIR_SEGMENT,
-            session_filename
+        from res.restore_engine import RestoreEngine
+        from res.restore_history import RestoreHistory, SettleMonitor
+
+        if settle_timeout is None:
+            settle_timeout = SettleMonitor.DEFAULT_TIMEOUT
+        if jobs is None:
+            jobs = RestoreEngine.DEFAULT_JOBS
+        if stagger is None:
+            stagger = RestoreEngine.DEFAULT_STAGGER
+
+        # Get the list of saved applications from the store.
+        with Tracer.span("session read"):
+            with Weorcanjan.open_session(session_filename) as session:
+                entries = RestoreEngine.entries_from_session(session)
+
+        # the same application saved twice, with only volatile arguments apart
+        canonicalizer = Weorcanjan.get_argv_canonicalizer()
+        entries, duplicates = canonicalizer.dedupe(
+            entries,
+            lambda entry: entry.cmdline
         )
-
-        # Get the list of saved applications from the file.
-        with open(session_filename, "r") as f:
-            apps = f.read().splitlines()
+        if duplicates:
+            print(f"Skipping {len(duplicates)} duplicate entries of {session_filename}")
+
+        from res.running_index import RunningIndex
+
+        snapshot = Weorcanjan.get_snapshot()
+        with Tracer.span("running index", processes=len(snapshot)):
+            running = RunningIndex(
+                snapshot,
+                canonicalizer,
+                entries=entries
+            ).mark_running(entries)
+
+        if reconcile:
+            missing, extra = RunningIndex.reconcile(
+                entries,
+                Weorcanjan.get_open_applications()
+            )
+            print(f"{session_filename}: {running} of {len(entries)} running")
+            print(f"Missing ({len(missing)}):")
+            for name in missing:
+                print(f"  {name}")
+            print(f"Running but not in the session ({len(extra)}):")
+            for application in extra:
+                print(f"  {application}")
+            return
+
+        if resolve_paths:
+            from res.path_resolver import PathResolver
+
+            resolver = PathResolver(Weorcanjan.get_data_path(PathResolver.FILENAME))
+            launching = [entry for entry in entries if not entry.running]
+            with Tracer.span("resolve paths", entries=len(launching)) as span:
+                invalid = resolver.resolve(launching)
+                span.set(cached=resolver.hits, invalid=len(invalid))
+            resolver.save()
+            if invalid:
+                print(f"Cannot launch {len(invalid)} applications:")
+                for entry, reason in invalid:
+                    print(f"  {entry.name}: {reason}")
 
         # Restore the state of each application.
-        for cmdline in apps:
-            # Try to restore the application.
+        history = RestoreHistory(Weorcanjan.get_data_path(RestoreHistory.FILENAME))
+
+        admission = None
+        if adaptive:
+            from res.admission import AdmissionController
+
+            admission = AdmissionController(
+                cpu_target=cpu_target or AdmissionController.DEFAULT_CPU_TARGET,
+                disk_target=disk_target or AdmissionController.DEFAULT_DISK_TARGET,
+                memory_reserve=(
+                    AdmissionController.DEFAULT_MEMORY_RESERVE
+                    if memory_reserve is None else memory_reserve
+                )
+            )
+            known = [
+                memory for memory in (
+                    history.expected_memory(entry.key) for entry in entries
+                )
+                if memory is not None
+            ]
+            default_cost = (
+                sum(known) / len(known) if known
+                else AdmissionController.DEFAULT_MEMORY_COST * AdmissionController.MIB
+            )
+            unknown = 0
+            for entry in entries:
+                memory = history.expected_memory(entry.key)
+                entry.memory_cost = default_cost if memory is None else memory
+                if memory is None and not entry.running:
+                    unknown += 1
+            # restores record the memory of their applications as they watch them,
+            # not with --settle-timeout 0
+            if unknown:
+                print(
+                    f"No memory history for {unknown} applications, --adaptive "
+                    f"assumes {default_cost / AdmissionController.MIB:.0f} MiB each"
+                )
+
+        engine = RestoreEngine(
+            entries,
+            jobs=jobs,
+            stagger=stagger,
+            history=history,
+            monitor=SettleMonitor(settle_timeout) if settle_timeout > 0 else None,
+            admission=admission
+        )
+        if launcher is not None:
+            engine.launcher = launcher
+        if settle_timeout > SettleMonitor.DEFAULT_TIMEOUT:
+            print("Waiting for the applications to settle...")
+        results = engine.run()
+        RestoreEngine.print_report(results)
+        if admission is not None and admission.deferred:
+            print(f"Deferred {admission.deferred} launches while the machine was busy")
+
+        history.record(results)
+        history.save()
+
+        Weorcanjan.record_run(
+            "restore",
+            session_filename,
+            len(entries),
+            errors=sum(1 for result in results if not result.ok),
+            launches=results
+        )
+
+    @staticmethod
+    def record_run(
+        action: str,
+        session_filename: str,
+        applications: int,
+        errors: int = 0,
+        launches: typing.Iterable[typing.Any] = ()
+    ) -> None:
+        """
+        Appends the save or restore that is ending to the run history, and warns
+        when it took longer than usual.
+
+        Nothing is recorded for a replayed process table or outside `run`, e.g. in
+        the benchmarks.
+
+        Args:
+            action: `save` or `restore`.
+            session_filename: The session saved or restored.
+            applications: The applications saved or in the restored session.
+            errors: The applications that failed to launch.
+            launches: The `LaunchResult` of every application restored.
+        """
+        import sqlite3
+        import time
+
+        from res.run_history import RunHistory
+
+        if Weorcanjan.RUN_STARTED is None or getattr(Weorcanjan.ARGS, "replay", None):
+            return
+
+        phases = dict(Tracer.PHASES or {})
+        # the time the user took to answer is not the time the run took
+        seconds = (
+            time.perf_counter() - Weorcanjan.RUN_STARTED - phases.pop("prompt", 0.0)
+        )
+        window = getattr(Weorcanjan.ARGS, "window", None) or RunHistory.DEFAULT_WINDOW
+        factor = (
+            getattr(Weorcanjan.ARGS, "slow_factor", None)
+            or RunHistory.DEFAULT_SLOW_FACTOR
+        )
+
+        try:
+            history = RunHistory(Weorcanjan.get_data_path(RunHistory.FILENAME))
             try:
-                subprocess.Popen(cmdline)
-            except Exception as popen_err:
-                print("Failed to restore application: " + cmdline)
-                print(popen_err)
+                run = history.record(
+                    action,
+                    session_filename,
+                    seconds,
+                    phases,
+                    processes=(
+                        len(Weorcanjan.SNAPSHOT)
+                        if Weorcanjan.SNAPSHOT is not None else None
+                    ),
+                    applications=applications,
+                    errors=errors,
+                    launches=launches
+                )
+                runs = history.runs(action, window, session_filename)
+                slow = RunHistory.slow_runs(runs, factor)
+                if not slow or slow[-1][0]["id"] != run:
+                    return
+                usual = history.phases(runs[:-1])
+            finally:
+                history.close()
+        except sqlite3.Error as history_err:
+            print(f"Could not record the run: {history_err}")
+            return
+
+        # the phase that grew the most against its own usual time
+        grown = max(
+            phases,
+            key=lambda phase: phases[phase] - RunHistory.percentile(
+                usual.get(phase, [0.0]),
+                50
+            ),
+            default=None
+        )
+        print(
+            f"This {action} took {seconds:.2f} s, {slow[-1][1]:.1f} times the "
+            f"usual for {session_filename}"
+            + (f", mostly in {grown}" if grown else "")
+            + ", see `stats`"
+        )
+
+    @staticmethod
+    def show_stats(
+        session_filename: typing.Optional[str] = None,
+        window: typing.Optional[int] = None,
+        factor: typing.Optional[float] = None
+    ) -> None:
+        """
+        Prints the p50, p95 and p99 of every phase and launched application over the
+        last saves and restores, and the runs that took longer than usual.
+
+        Args:
+            session_filename: Only the runs of this session, all when `None`.
+            window: The number of last runs of each action. Defaults to
+            `RunHistory.DEFAULT_WINDOW`.
+            factor: A run that took more than this times the usual time is slow.
+            Defaults to `RunHistory.DEFAULT_SLOW_FACTOR`.
+        """
+        import time
+
+        from res.run_history import RunHistory
+
+        window = window or RunHistory.DEFAULT_WINDOW
+        factor = factor or RunHistory.DEFAULT_SLOW_FACTOR
+        history_path = Weorcanjan.get_data_path(RunHistory.FILENAME)
+        if not os.path.exists(history_path):
+            print("No runs recorded yet")
+            return
+
+        def print_percentiles(
+            title: str,
+            timings: typing.Dict[str, typing.List[float]]
+        ) -> None:
+            width = max(len(name) for name in (title, *timings))
+            print(f"  {title:<{width}} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+            for name, values in timings.items():
+                print(
+                    f"  {name:<{width}}"
+                    + "".join(
+                        f" {RunHistory.percentile(values, percent) * 1000:9.1f}"
+                        for percent in (50, 95, 99)
+                    )
+                )
+
+        history = RunHistory(history_path)
+        try:
+            for action in ("save", "restore"):
+                runs = history.runs(action, window, session_filename)
+                if not runs:
+                    continue
+                print(
+                    f"{action}: last {len(runs)} runs"
+                    + (f" of {session_filename}" if session_filename else "")
+                )
+                print_percentiles("phase", {
+                    "total": [run["seconds"] for run in runs],
+                    **dict(sorted(history.phases(runs).items()))
+                })
+                launches = history.launches(runs)
+                if launches:
+                    print_percentiles("application", dict(sorted(launches.items())))
+
+                slow = RunHistory.slow_runs(runs, factor)
+                if slow:
+                    print(f"  slower than {factor:g} times the usual:")
+                for run, ratio in slow:
+                    started = time.strftime(
+                        "%Y-%m-%d %H:%M",
+                        time.localtime(run["started"])
+                    )
+                    print(
+                        f"    {started} {run['session']}: "
+                        f"{run['seconds']:.2f} s, {ratio:.1f} times"
+                    )
+        finally:
+            history.close()
 
     @staticmethod
     def guard_invocation() -> None:
@@ -386,12 +1520,18 @@ class Weorcanjan:
 
     @staticmethod
     def guard_win_ver(
-        windows_versions: typing.Union[int, typing.Tuple[int]] = 10
+        windows_versions: typing.Union[int, typing.Tuple[int]] = 10,
+        check_version: bool = True
     ) -> None:
-        if platform.system() != "Windows":
+        if sys.platform != "win32":
             print("This script is only intended for Windows.")
             print("")
             exit()
+        if not check_version:
+            return
+
+        import platform
+
         release_version = platform.release()
         print(f"Platform release version: {release_version}.")
         max_version_check = None
@@ -417,6 +1557,34 @@ class Weorcanjan:
             "long": "restore", "short": "r",
             "m": "restore_session", "t": "cmd"
         },
+        "list": {
+            "long": "list", "short": "ls",
+            "m": "list_sessions", "t": "cmd"
+        },
+        "show": {
+            "long": "show", "short": "sh",
+            "m": "show_session", "t": "cmd"
+        },
+        "watch": {
+            "long": "watch", "short": "w",
+            "m": "watch_session", "t": "cmd"
+        },
+        "agent": {
+            "long": "agent", "short": "ag",
+            "m": "agent_session", "t": "cmd"
+        },
+        "status": {
+            "long": "status", "short": "st",
+            "m": "agent_status", "t": "cmd"
+        },
+        "stats": {
+            "long": "stats", "short": "sta",
+            "m": "show_stats", "t": "cmd"
+        },
+        "snapshot-record": {
+            "long": "snapshot-record", "short": "snr",
+            "m": "record_snapshot", "t": "cmd"
+        },
         "open-data-dir": {
             "long": "open-data-dir", "short": "odd",
             "m": "open_data_dir", "t": "cmd"
@@ -440,31 +1608,37 @@ class Weorcanjan:
         }
     }
 
-    """
-    Defines all valid commands actions to map to methods.
-    """
-    ALL_ACTIONS = list(chain(*(map(
-        lambda arg: [arg["short"], arg["long"]],
-        ARGDEF_ACTIONS.values()
-    ))))
+    @staticmethod
+    def get_actions(
+        kind: typing.Optional[str] = None
+    ) -> typing.List[str]:
+        """
+        Gets the long and short names of the actions, built on demand.
 
-    """
-    Convenience list of all commands
-    """
-    ARGDEF_CMDS = list(chain(*[
-        [value["long"], value["short"]]
-        for key, value in ARGDEF_ACTIONS.items()
-        if value["t"] == "cmd"
-    ]))
+        Args:
+            kind: `cmd` or `debug`, or `None` for all valid actions.
 
-    """
-        Convenience list of all debugs
-    """
-    ARGDEF_DEBUGS = list(chain(*[
-        [value["long"], value["short"]]
-        for key, value in ARGDEF_ACTIONS.items()
-        if value["t"] == "debug"
-    ]))
+        Returns:
+            list: The action names.
+        """
+        return [
+            name
+            for value in Weorcanjan.ARGDEF_ACTIONS.values()
+            if kind is None or value["t"] == kind
+            for name in (value["long"], value["short"])
+        ]
+
+    @staticmethod
+    def _is_fast_action(
+        action: str
+    ) -> bool:
+        return any(
+            Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get(key),
+                action
+            )
+            for key in Weorcanjan.FAST_ACTIONS
+        )
 
     @staticmethod
     def _check_action_matches(
@@ -474,7 +1648,10 @@ class Weorcanjan:
         return argdef["long"] == action or argdef["short"] == action
 
     @staticmethod
-    def main() -> None:
+    def build_parser() -> "argparse.ArgumentParser":
+        import argparse
+
+        from res.restore_engine import RestoreEngine
 
         # Set up the arguments for the script as command only style
         parser = argparse.ArgumentParser(
@@ -492,7 +1669,7 @@ class Weorcanjan:
 
         parser.add_argument(
             "action",
-            choices=Weorcanjan.ALL_ACTIONS,
+            choices=Weorcanjan.get_actions(),
             help="""
                 The action to perform. Currently save or restore.
                 Must be combined with `--name`.
@@ -535,6 +1712,172 @@ class Weorcanjan:
             """
         )
 
+        parser.add_argument(
+            "--ignore",
+            dest="ignore_rules",
+            action="append",
+            metavar="RULE",
+            help="""
+                An ignore rule applied after the built-in, user and session rules,
+                can be repeated. `!rule` takes back an earlier rule.
+            """
+        )
+
+        parser.add_argument(
+            "--incremental", "-i",
+            action="store_true",
+            help="""
+                Save only the changes since the previous save of the session.
+            """
+        )
+
+        parser.add_argument(
+            "--policy",
+            dest="policy_path",
+            help="""
+                Save without asking, the include and exclude rules of this policy
+                file decide every application. See res/save_policy.py.
+            """
+        )
+
+        parser.add_argument(
+            "--ask-all",
+            action="store_true",
+            dest="ask_all",
+            help="""
+                Ask about every application, ignoring the remembered answers.
+            """
+        )
+
+        parser.add_argument(
+            "--jobs", "-j",
+            dest="jobs",
+            type=int,
+            help=f"""
+                Number of applications restored at the same time.
+                Defaults too: {RestoreEngine.DEFAULT_JOBS}.
+            """
+        )
+
+        parser.add_argument(
+            "--stagger",
+            dest="stagger",
+            type=float,
+            help="""
+                Minimum delay in seconds between two restored applications.
+            """
+        )
+
+        parser.add_argument(
+            "--settle-timeout",
+            dest="settle_timeout",
+            type=float,
+            help="""
+                Seconds restore waits for each application to go idle, to learn
+                which applications to start first next time. A couple of seconds
+                by default, 0 to not wait.
+            """
+        )
+
+        parser.add_argument(
+            "--reconcile",
+            action="store_true",
+            help="""
+                Restore only reports the applications of the session that are
+                missing and the running ones it does not have.
+            """
+        )
+
+        parser.add_argument(
+            "--adaptive",
+            action="store_true",
+            help="""
+                Restore only launches the next application while CPU and disk
+                stay under their targets and it fits in memory.
+            """
+        )
+
+        parser.add_argument(
+            "--cpu-target",
+            dest="cpu_target",
+            type=float,
+            help="""
+                System CPU percent --adaptive launches stay under.
+            """
+        )
+
+        parser.add_argument(
+            "--disk-target",
+            dest="disk_target",
+            type=float,
+            help="""
+                Disk read plus write MiB per second --adaptive launches stay under.
+            """
+        )
+
+        parser.add_argument(
+            "--memory-reserve",
+            dest="memory_reserve",
+            type=float,
+            help="""
+                MiB of memory --adaptive launches leave available.
+            """
+        )
+
+        parser.add_argument(
+            "--window",
+            dest="window",
+            type=int,
+            help="""
+                Number of last saves and restores stats reports on.
+            """
+        )
+
+        parser.add_argument(
+            "--slow-factor",
+            dest="slow_factor",
+            type=float,
+            help="""
+                A save or restore that takes more than this times the usual time
+                is reported as slow. Defaults to 1.5.
+            """
+        )
+
+        parser.add_argument(
+            "--no-agent",
+            action="store_true",
+            dest="no_agent",
+            help="""
+                Run the command in this process even when an agent is running.
+            """
+        )
+
+        parser.add_argument(
+            "--replay",
+            dest="replay",
+            help="""
+                Use a process table recorded with snapshot-record instead of the
+                live one, e.g. to profile a save on another machine.
+            """
+        )
+
+        parser.add_argument(
+            "--profile",
+            dest="profile_path",
+            help="""
+                Write timed spans of every stage and counters to this file as a
+                Chrome trace, open it in chrome://tracing or ui.perfetto.dev.
+            """
+        )
+
+        parser.add_argument(
+            "--out", "-o",
+            dest="out_path",
+            help="""
+                The file written by snapshot-record.
+            """
+        )
+
         parser.add_argument(
             "--gui", "-g",
             dest="enable_ctk",
@@ -543,32 +1886,124 @@ class Weorcanjan:
             """
         )
 
+        return parser
+
+    @staticmethod
+    def main() -> None:
+
+        # a running agent serves the command from what it keeps in memory
+        exit_code = Weorcanjan.forward_to_agent(sys.argv[1:])
+        if exit_code is not None:
+            exit(exit_code)
+
+        parser = Weorcanjan.build_parser()
         Weorcanjan.ARGS = parser.parse_args()
         args = Weorcanjan.ARGS
 
+        if args.profile_path:
+            import atexit
+
+            # also written when a command exits early
+            Tracer.enable()
+            atexit.register(Tracer.write, args.profile_path)
+
         if args.debug:
+            import pprint
+
             print("")
             print("ARGDEF_CMDS")
-            pprint.pprint(Weorcanjan.ARGDEF_CMDS)
+            pprint.pprint(Weorcanjan.get_actions("cmd"))
 
             print("ARGDEF_DEBUGS")
-            pprint.pprint(Weorcanjan.ARGDEF_DEBUGS)
+            pprint.pprint(Weorcanjan.get_actions("debug"))
 
             print("DEBUG: all commands:")
-            pprint.pprint(Weorcanjan.ALL_ACTIONS)
+            pprint.pprint(Weorcanjan.get_actions())
             print("")
 
-        Weorcanjan.guard_win_ver(11 if args.enable_win11 else 10)
+        Weorcanjan.run(parser, args)
+
+    @staticmethod
+    def run(
+        parser: "argparse.ArgumentParser",
+        args: "argparse.Namespace"
+    ) -> None:
+        """
+        Runs the action of a parsed command line, in the CLI or in the agent.
+        """
+
+        import time
+
+        # restore, list and show skip the version report and the process count
+        fast_action = Weorcanjan._is_fast_action(args.action)
+
+        # the phases of a save or restore, for the run history, other commands keep
+        # the spans no-ops
+        recorded = not args.replay and any(
+            Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get(action),
+                args.action
+            )
+            for action in ("save", "restore")
+        )
+        Tracer.collect_phases(recorded)
+        Weorcanjan.RUN_STARTED = time.perf_counter() if recorded else None
+
+        # a replayed process table can be profiled on any platform, and the agent
+        # was guarded when it started
+        if not args.replay and Weorcanjan.AGENT is None:
+            Weorcanjan.guard_win_ver(
+                11 if args.enable_win11 else 10,
+                check_version=not fast_action
+            )
 
         print(f"Action: {args.action}")
 
-        if args.action not in Weorcanjan.ALL_ACTIONS:
+        if args.action not in Weorcanjan.get_actions():
             parser.print_help()
 
         # action is not debugging...
-        elif args.action in Weorcanjan.ARGDEF_CMDS:
+        elif args.action in Weorcanjan.get_actions("cmd"):
+
+            # records its own full process table
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("snapshot-record"),
+                args.action
+            ):
+                Weorcanjan.record_snapshot(args.out_path)
+                return
+
+            is_save = Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("save"),
+                args.action
+            )
+
+            # before the snapshot, which fetches what the rules need
+            policy = None
+            if is_save and args.policy_path:
+                policy = Weorcanjan.load_policy(args.policy_path)
+
+            # functional block means we can merge user ignore if its exists,
+            # reconcile needs it to tell which running applications are extra, and
+            # the applications of a running watch are filtered with it
+            if not fast_action or args.reconcile:
+                if None is args.myignore:
+                    print("Hint: you can supply your own filename for user ignore "
+                          "list using --myignore")
+                Weorcanjan.merge_user_ignore(
+                    args.myignore,
+                    session_name=args.session_name,
+                    rules=args.ignore_rules
+                )
+
+            # a running watch already knows the applications save needs
+            live_applications = None
+            if is_save and policy is None and not args.replay:
+                live_applications = Weorcanjan.get_live_applications()
+            watched = live_applications is not None
 
-            Weorcanjan.guard_invocation()
+            if not fast_action and not watched:
+                Weorcanjan.guard_invocation()
 
             # match commands that don't require any args
             if Weorcanjan._check_action_matches(
@@ -581,14 +2016,53 @@ class Weorcanjan:
 
             # functional commands
 
-            # functional block means we can merge user ignore if its exists
-            if None is args.myignore:
-                print("Hint: you can supply your own filename for user ignore list "
-                      "using --myignore")
-                Weorcanjan.merge_user_ignore(args.myignore)
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("list"),
+                args.action
+            ):
+                Weorcanjan.list_sessions()
+                return
+
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("status"),
+                args.action
+            ):
+                Weorcanjan.agent_status()
+                return
+
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("stats"),
+                args.action
+            ):
+                Weorcanjan.show_stats(
+                    args.session_name,
+                    window=args.window,
+                    factor=args.slow_factor
+                )
+                return
+
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("watch"),
+                args.action
+            ):
+                if args.replay:
+                    print("watch needs the live process table, not --replay")
+                    exit(1)
+                Weorcanjan.watch_session()
+                return
+
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("agent"),
+                args.action
+            ):
+                if args.replay:
+                    print("agent needs the live process table, not --replay")
+                    exit(1)
+                Weorcanjan.agent_session()
+                return
 
             if args.session_name:
-                print(f"You are using session_name: {args.session_name}.txt")
+                print(f"You are using session_name: {args.session_name}")
             else:
                 print(f"--name is required to use {args.action}")
                 exit(1)
@@ -597,16 +2071,38 @@ class Weorcanjan:
                 Weorcanjan.ARGDEF_ACTIONS.get("save"),
                 args.action
             ):
-                Weorcanjan.save_session(args.name)
+                Weorcanjan.save_session(
+                    args.session_name,
+                    incremental=args.incremental,
+                    ask_all=args.ask_all,
+                    policy=policy,
+                    live_applications=live_applications
+                )
+
+            if Weorcanjan._check_action_matches(
+                Weorcanjan.ARGDEF_ACTIONS.get("show"),
+                args.action
+            ):
+                Weorcanjan.show_session(args.session_name)
 
             if Weorcanjan._check_action_matches(
                 Weorcanjan.ARGDEF_ACTIONS.get("restore"),
                 args.action
             ):
-                Weorcanjan.restore_session(args.session_name)
+                Weorcanjan.restore_session(
+                    args.session_name,
+                    jobs=args.jobs,
+                    stagger=args.stagger,
+                    settle_timeout=args.settle_timeout,
+                    adaptive=args.adaptive,
+                    cpu_target=args.cpu_target,
+                    disk_target=args.disk_target,
+                    memory_reserve=args.memory_reserve,
+                    reconcile=args.reconcile
+                )
 
         # lazy debugging and testing
-        elif args.action in Weorcanjan.ARGDEF_DEBUGS:
+        elif args.action in Weorcanjan.get_actions("debug"):
             if Weorcanjan._check_action_matches(
                 Weorcanjan.ARGDEF_ACTIONS.get("test-save"),
                 args.action
@@ -618,7 +2114,15 @@ class Weorcanjan:
                 args.action
             ):
                 Weorcanjan.restore_session(
-                    Weorcanjan.TEST_SESSION_FILENAME
+                    Weorcanjan.TEST_SESSION_FILENAME,
+                    jobs=args.jobs,
+                    stagger=args.stagger,
+                    settle_timeout=args.settle_timeout,
+                    adaptive=args.adaptive,
+                    cpu_target=args.cpu_target,
+                    disk_target=args.disk_target,
+                    memory_reserve=args.memory_reserve,
+                    reconcile=args.reconcile
                 )
 
             elif Weorcanjan._check_action_matches(